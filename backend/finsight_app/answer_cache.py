@@ -0,0 +1,284 @@
+"""
+FinSight Copilot - Semantic Answer Cache
+Reuses answers for paraphrased questions by matching query embeddings
+"""
+
+import glob
+import json
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from finsight_app.path_utils import DATA_DIR, get_faiss_index_dir
+
+# Numbers (years, amounts, percentages), fiscal periods and form types: "2023", "3.5", "q3", "fy2024", "10-k"
+_NUMBER_RE = re.compile(r"(?<![a-z0-9])(?:10-?[kq]|q[1-4]|h[12]|fy\s?\d{2,4}|\d+(?:[.,]\d+)*)(?![a-z0-9])")
+# Tickers and company names: all-caps tokens ("AAPL") and capitalized words ("Apple", "Microsoft's")
+_NAME_RE = re.compile(r"(?<![A-Za-z0-9\-])([A-Z][A-Za-z&.\-]*?)(?:'s|’s)?(?![A-Za-z0-9])")
+# Capitalized only because they start a question
+_QUESTION_WORDS = frozenset(
+    "what which who whom whose when where why how is are was were do does did can could should would will "
+    "has have had the a an in on for of and or to from by show tell give list compare summarize explain "
+    "describe find please i".split()
+)
+_WORD_RE = re.compile(r"[a-z][a-z&\-]*")
+
+
+def company_names(data_dir: str = DATA_DIR) -> FrozenSet[str]:
+    """
+    Lower-cased tickers and short company names ("aapl", "apple") from the *_company_info.json files
+
+    key_terms matches these in any casing, so "apple revenue" and
+    "microsoft revenue" are told apart even when typed in lower case.
+    """
+    names = set()
+    for path in glob.glob(os.path.join(data_dir, "*_company_info.json")):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not isinstance(info, dict):
+            continue  # combined_company_info.json repeats the per-company files
+        ticker = info.get("ticker") or os.path.basename(path).split("_", 1)[0]
+        names.add(str(ticker).lower())
+        words = [word for word in _WORD_RE.findall(str(info.get("name") or "").lower()) if word not in _QUESTION_WORDS]
+        if words:
+            names.add(words[0])
+    return frozenset(names)
+
+
+def key_terms(question: str, names: FrozenSet[str] = frozenset()) -> FrozenSet[str]:
+    """
+    Terms two questions must share for one's answer to serve the other
+
+    Query embeddings barely move when only a year, an amount or a company
+    changes ("AAPL revenue in 2023" vs "... in 2022"), so the cache requires
+    the same numbers, fiscal periods, form types and names on top of the
+    cosine threshold.
+
+    Args:
+        question: Raw question text
+        names: Known tickers / company names (lower case), matched in any casing
+
+    Returns:
+        Lower-cased numbers (thousands separators dropped), periods, forms and names
+    """
+    terms = {match.replace(",", "").replace(" ", "").replace("-", "") for match in _NUMBER_RE.findall(question.lower())}
+    for name in _NAME_RE.findall(question):
+        name = name.rstrip(".").lower()
+        if name and name not in _QUESTION_WORDS and not name[0].isdigit():
+            terms.add(name)
+    terms.update(word for word in _WORD_RE.findall(question.lower()) if word in names)
+    return frozenset(terms)
+
+
+@dataclass
+class CachedAnswer:
+    """A cached pipeline answer."""
+    answer: str
+    sources: List[str]
+    scope: str
+    terms: FrozenSet[str] = frozenset()
+    created_at: float = field(default_factory=time.time)
+    similarity: float = 0.0
+
+
+class SemanticAnswerCache:
+    """
+    In-memory answer cache keyed on query embeddings.
+
+    Recent question embeddings live in a small inner-product FAISS index
+    (vectors are L2-normalised, so scores are cosine similarities). A lookup
+    returns the most similar live entry above `threshold` with the same
+    scope and the same key_terms (numbers, periods, tickers, names). Entries expire after `ttl_seconds`, the least recently used entry
+    is evicted beyond `max_entries`, and everything is dropped when the
+    document index under get_faiss_index_dir() is rebuilt.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        ttl_seconds: float = 3600.0,
+        max_entries: int = 512,
+        index_dir: Optional[str] = None,
+        version_check_interval: float = 5.0,
+        names: Optional[Iterable[str]] = None,
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            threshold: Minimum cosine similarity for a cache hit
+            ttl_seconds: Lifetime of an entry
+            max_entries: LRU capacity
+            index_dir: FAISS index directory whose version invalidates the cache
+            version_check_interval: Seconds between index version checks
+            names: Tickers / company names key_terms matches in any casing (default: company_names())
+        """
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.index_dir = index_dir
+        self.version_check_interval = version_check_interval
+        self.names = frozenset(name.lower() for name in names) if names is not None else company_names()
+
+        self._lock = threading.Lock()
+        self._index = None
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_id = 0
+        self._version = self._index_version()
+        self._version_checked_at = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.term_mismatches = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # ---- Index version tracking ----
+    def _index_version(self) -> Tuple:
+        """mtime/size of the on-disk index files; changes whenever the index is rebuilt."""
+        index_dir = self.index_dir or get_faiss_index_dir()
+        version = [index_dir]
+        for name in ("index.faiss", "index.pkl"):
+            try:
+                st = os.stat(os.path.join(index_dir, name))
+                version.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                version.append(None)
+        return tuple(version)
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+        version = self._index_version()
+        if version != self._version:
+            print("♻️ FAISS index changed, clearing semantic answer cache")
+            self._version = version
+            self._clear_locked()
+            self.invalidations += 1
+
+    # ---- Helpers ----
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def _remove_locked(self, entry_id: int):
+        self._entries.pop(entry_id, None)
+        self._index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    def _clear_locked(self):
+        self._entries.clear()
+        if self._index is not None:
+            self._index.reset()
+
+    # ---- Public API ----
+    def lookup(self, embedding: Sequence[float], scope: str = "", question: str = "") -> Optional[CachedAnswer]:
+        """
+        Find a cached answer for a semantically similar question
+
+        Args:
+            embedding: Query embedding
+            scope: Pipeline configuration key; only entries with the same scope match
+            question: Question text; only entries with the same key_terms match
+
+        Returns:
+            CachedAnswer (with `similarity` set) or None
+        """
+        with self._lock:
+            self._check_version()
+            if self._index is None or self._index.ntotal == 0:
+                self.misses += 1
+                return None
+
+            vector = self._normalize(embedding)
+            if vector.shape[1] != self._index.d:
+                self.misses += 1
+                return None
+
+            scores, ids = self._index.search(vector, min(8, self._index.ntotal))
+            terms = key_terms(question, self.names)
+            now = time.time()
+            for score, entry_id in zip(scores[0], ids[0]):
+                if entry_id < 0 or score < self.threshold:
+                    break
+                entry = self._entries.get(int(entry_id))
+                if entry is None:
+                    continue
+                if now - entry.created_at > self.ttl_seconds:
+                    self._remove_locked(int(entry_id))
+                    continue
+                if entry.scope != scope:
+                    continue
+                if entry.terms != terms:
+                    # Same wording, different year / amount / company: a different answer
+                    self.term_mismatches += 1
+                    continue
+                self._entries.move_to_end(int(entry_id))
+                self.hits += 1
+                entry.similarity = float(score)
+                return entry
+
+            self.misses += 1
+            return None
+
+    def store(self, embedding: Sequence[float], answer: str, sources: List[str], scope: str = "",
+              question: str = ""):
+        """
+        Cache an answer under its query embedding
+
+        Args:
+            embedding: Query embedding
+            answer: Final answer text
+            sources: Source ids returned with the answer
+            scope: Pipeline configuration key
+            question: Question text, whose key_terms a later lookup must match
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._index is None or self._index.d != vector.shape[1]:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+                self._entries.clear()
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = CachedAnswer(answer=answer, sources=list(sources), scope=scope,
+                                                   terms=key_terms(question, self.names))
+
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove_locked(oldest_id)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached answer."""
+        with self._lock:
+            self._clear_locked()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for health and metrics endpoints."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "term_mismatches": self.term_mismatches,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
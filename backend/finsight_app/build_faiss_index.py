@@ -1,27 +1,41 @@
 import os
+import argparse
 import numpy as np
 import faiss
-from backend.finsight_app.path_utils import get_faiss_index_dir, EMBEDDINGS_DIR
+from backend.finsight_app.path_utils import get_faiss_index_root, EMBEDDINGS_DIR
+from backend.finsight_app.index_specs import IndexSpec, build_index, save_index_params
 
-EMBEDDINGS_PATH = get_faiss_index_dir()
+EMBEDDINGS_PATH = get_faiss_index_root()
 
 embeddings_file = os.path.join(EMBEDDINGS_DIR, 'company_embeddings.npy')
 faiss_index_dir = EMBEDDINGS_PATH
 faiss_index_file = os.path.join(faiss_index_dir, 'index.faiss')
 
-# Load embeddings
-embeddings = np.load(embeddings_file)
-embedding_dim = embeddings.shape[1]
-print(f"Loaded embeddings: {embeddings.shape}")
 
-# Build FAISS index
-index = faiss.IndexFlatL2(embedding_dim)
-index.add(embeddings)
-print(f"FAISS index built. Total vectors: {index.ntotal}")
+def main():
+    parser = argparse.ArgumentParser(description="Build the FAISS index from saved embeddings")
+    parser.add_argument("--index-spec", default=os.getenv("FINSIGHT_INDEX_SPEC", "flat"),
+                        help='Index type: flat, ivf-flat, ivf-pq, hnsw, sqfp16, sq8, ivf-sq8, hnsw-sq8, with options '
+                             '("hnsw:M=32,efSearch=64", "sq8:refine=4" for float32 re-ranking) '
+                             'or a raw faiss index_factory string')
+    args = parser.parse_args()
 
-# Ensure output directory exists
-os.makedirs(faiss_index_dir, exist_ok=True)
+    # Load embeddings
+    embeddings = np.load(embeddings_file)
+    print(f"Loaded embeddings: {embeddings.shape}")
 
-# Save index
-faiss.write_index(index, faiss_index_file)
-print(f"FAISS index saved to {faiss_index_file}") 
\ No newline at end of file
+    # Build FAISS index
+    index, params = build_index(embeddings, IndexSpec.parse(args.index_spec))
+    print(f"FAISS index built. Total vectors: {index.ntotal}")
+
+    # Ensure output directory exists
+    os.makedirs(faiss_index_dir, exist_ok=True)
+
+    # Save index and the parameters it was built with
+    faiss.write_index(index, faiss_index_file)
+    save_index_params(faiss_index_dir, params)
+    print(f"FAISS index saved to {faiss_index_file}")
+
+
+if __name__ == "__main__":
+    main()
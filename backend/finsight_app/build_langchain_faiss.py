@@ -1,32 +1,90 @@
 from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.docstore.document import Document
+import argparse
+import json
 import os
 import pickle
-from backend.finsight_app.path_utils import get_faiss_index_dir, PROCESSED_DATA_DIR, EMBEDDINGS_DIR
+import uuid
+import numpy as np
+from backend.finsight_app.path_utils import get_faiss_index_root, PROCESSED_DATA_DIR, EMBEDDINGS_DIR, CHUNK_STORE_DIR
+from backend.finsight_app.chunk_store import ChunkStore, read_chunk, store_exists
+from backend.finsight_app.index_specs import IndexSpec, build_index, save_index_params
+from backend.finsight_app.lexical_index import build_lexical_index, lexical_dir
+from backend.finsight_app.coarse_index import SECTION_SIZE, build_coarse_index, coarse_dir
+from backend.finsight_app.chunk_catalog import build_chunk_catalog, catalog_dir
+from backend.finsight_app.snapshots import SnapshotManager
 
-EMBEDDINGS_DIR_PATH = get_faiss_index_dir()
 PROCESSED_DIR = PROCESSED_DATA_DIR
-INDEX_PATH = EMBEDDINGS_DIR_PATH
+INDEX_ROOT = get_faiss_index_root()
 CHUNK_MAPPING_PATH = os.path.join(EMBEDDINGS_DIR, 'chunk_mapping.pkl')
+CHUNK_METADATA_PATH = os.path.join(PROCESSED_DIR, 'chunk_metadata.json')
+
+parser = argparse.ArgumentParser(description="Build the LangChain FAISS store served by the API")
+parser.add_argument("--index-spec", default=os.getenv("FINSIGHT_INDEX_SPEC", "flat"),
+                    help='Index type: flat, ivf-flat, ivf-pq, hnsw, sqfp16, sq8, ivf-sq8, hnsw-sq8, with options '
+                         '("hnsw:M=32,efSearch=64", "sq8:refine=4" for float32 re-ranking) '
+                         'or a raw faiss index_factory string')
+parser.add_argument("--section-size", type=int, default=SECTION_SIZE,
+                    help="Chunks per section vector in the filing-level coarse index")
+parser.add_argument("--keep", type=int, default=int(os.getenv("FINSIGHT_SNAPSHOTS_KEEP", "3")),
+                    help="Index snapshots to keep after publishing")
+args = parser.parse_args()
 
 # Load chunk mapping
 with open(CHUNK_MAPPING_PATH, 'rb') as f:
     chunk_mapping = pickle.load(f)
 
-# Build Document objects from chunk files
+# Source file and character offsets per chunk, written by chunk_texts.py
+chunk_metadata = {}
+if os.path.exists(CHUNK_METADATA_PATH):
+    with open(CHUNK_METADATA_PATH, 'r', encoding='utf-8') as f:
+        chunk_metadata = json.load(f)
+
+# Build Document objects from the chunk store (or legacy per-chunk files)
+chunk_store = ChunkStore(CHUNK_STORE_DIR) if store_exists(CHUNK_STORE_DIR) else None
 documents = []
 for meta in chunk_mapping:
     fname = meta['file'] if isinstance(meta, dict) and 'file' in meta else meta
-    chunk_path = os.path.join(PROCESSED_DIR, fname)
-    with open(chunk_path, 'r', encoding='utf-8') as f:
-        text = f.read()
-    documents.append(Document(page_content=text, metadata={'file': fname}))
+    text = read_chunk(fname, chunk_store, PROCESSED_DIR)
+    if text is None:
+        raise FileNotFoundError(f"Chunk {fname} is neither in {CHUNK_STORE_DIR} nor in {PROCESSED_DIR}")
+    # One metadata record per chunk: the docstore is the catalog's single source
+    metadata = {**chunk_metadata.get(fname, {}), **(meta if isinstance(meta, dict) else {}), 'file': fname}
+    documents.append(Document(page_content=text, metadata=metadata))
 
-print(f"Loaded {len(documents)} documents. Building FAISS index...")
+print(f"Loaded {len(documents)} documents. Building FAISS index ({args.index_spec})...")
 
 embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-vectorstore = FAISS.from_documents(documents, embedding_model)
-vectorstore.save_local(INDEX_PATH)
+vectors = np.array(embedding_model.embed_documents([doc.page_content for doc in documents]), dtype=np.float32)
+# Chunk i keeps id i; later uploads / deletes address chunks by these ids
+index, params = build_index(vectors, IndexSpec.parse(args.index_spec), ids=np.arange(len(documents)))
+
+def write_snapshot(out_dir, parent_dir):
+    # Same layout as FAISS.from_documents, but over the index type we built
+    ids = [str(uuid.uuid4()) for _ in documents]
+    vectorstore = FAISS(
+        embedding_function=embedding_model,
+        index=index,
+        docstore=InMemoryDocstore(dict(zip(ids, documents))),
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
+    vectorstore.save_local(out_dir)
+    save_index_params(out_dir, params)
+
+    # BM25 postings for hybrid retrieval, aligned with the FAISS ids above
+    build_lexical_index([doc.page_content for doc in documents], lexical_dir(out_dir))
+    # Ticker / form / date / section / offset columns for filtered search, keyed by FAISS id
+    build_chunk_catalog([doc.metadata for doc in documents], catalog_dir(out_dir), section_size=args.section_size)
+    # Per-filing / per-section means for two-stage search, grouped by chunk file name
+    build_coarse_index(vectors, [doc.metadata['file'] for doc in documents], coarse_dir(out_dir),
+                       metric=index.metric_type, section_size=args.section_size)
+    return {"next_id": len(documents), "ntotal": len(documents), "live": len(documents), "tombstones": 0}
+
+# A new immutable snapshot; running APIs swap to it without a restart
+snapshots = SnapshotManager(INDEX_ROOT)
+snapshot_dir = snapshots.publish(write_snapshot, "build")
+snapshots.prune(args.keep)
 
-print(f"✅ FAISS index and mapping saved to {INDEX_PATH}") 
\ No newline at end of file
+print(f"✅ FAISS index and mapping saved to {snapshot_dir}")
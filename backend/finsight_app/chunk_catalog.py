@@ -0,0 +1,238 @@
+"""
+FinSight Copilot - Chunk Catalog
+Columnar per-chunk metadata keyed by FAISS id (memory-mapped numpy columns)
+with vectorized filter evaluation for filtered search
+"""
+
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+try:
+    # Same module object as the API server when backend/ is on sys.path
+    from finsight_app.coarse_index import SECTION_SIZE
+    from finsight_app.filtered_search import COMPANY_KEYS, DATE_KEYS, chunk_attributes, date_bounds
+except ImportError:
+    from backend.finsight_app.coarse_index import SECTION_SIZE
+    from backend.finsight_app.filtered_search import COMPANY_KEYS, DATE_KEYS, chunk_attributes, date_bounds
+
+CATALOG_DIR = "catalog"
+PARAMS_FILE = "catalog_params.json"
+
+# Column -> dtype; row i describes FAISS id i. Coded columns use -1 for unknown.
+COLUMNS = {
+    "live": np.bool_,         # id holds a chunk (ids of compacted snapshots have gaps)
+    "ticker": np.int32,       # code into tickers.json
+    "form": np.int16,         # code into forms.json ("10-K", "10-Q", document kinds)
+    "date_first": np.int32,   # first / last YYYYMMDD day the filing date covers (0: unknown)
+    "date_last": np.int32,
+    "source": np.int32,       # code into sources.json (source document of the chunk)
+    "chunk": np.int32,        # chunk number within its source
+    "section": np.int32,      # chunk // section size (the coarse index's sections)
+    "start_char": np.int64,   # character offsets of the chunk in its source (-1: unknown)
+    "end_char": np.int64,
+}
+# Coded columns and their dictionaries
+DICTIONARIES = {"ticker": "tickers.json", "form": "forms.json", "source": "sources.json"}
+# Filter keys the catalog answers; anything else needs the raw metadata
+FILTER_KEYS = frozenset((*COMPANY_KEYS, *DATE_KEYS, "form", "source", "section"))
+
+_CHUNK_NUMBER_RE = re.compile(r"_chunk_(\d+)(?:\.txt)?$")
+
+
+def _as_list(value) -> list:
+    return list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+
+
+def catalog_dir(index_dir: str) -> str:
+    return os.path.join(index_dir, CATALOG_DIR)
+
+
+def catalog_exists(index_dir: str) -> bool:
+    return os.path.exists(os.path.join(catalog_dir(index_dir), PARAMS_FILE))
+
+
+def _source_name(meta: Dict[str, Any]) -> Optional[str]:
+    """Source document: upload / chunk_texts source, else the chunk file name without its counter."""
+    source = meta.get("source") or meta.get("source_file")
+    if source:
+        return str(source)
+    name = meta.get("file")
+    return _CHUNK_NUMBER_RE.sub("", str(name)) if name else None
+
+
+def build_chunk_catalog(metadata: Union[Sequence[Dict[str, Any]], Mapping[int, Dict[str, Any]]], out_dir: str,
+                        section_size: int = SECTION_SIZE) -> Dict[str, Any]:
+    """
+    Build and save the catalog columns
+
+    Args:
+        metadata: Per-chunk metadata dicts (or bare chunk file names), as a list indexed by
+            FAISS id or a {chunk id: metadata} mapping with gaps; company / form / filing date
+            come from the dict or the file name (as for ChunkFilterIndex), offsets from
+            start_char / end_char (chunk_texts.py), the chunk number from chunk_number or the name
+        out_dir: Output directory (usually <index_dir>/catalog)
+        section_size: Chunks per section (as the coarse index groups them)
+
+    Returns:
+        Build parameters (also saved as catalog_params.json)
+    """
+    start = time.perf_counter()
+    items = metadata.items() if isinstance(metadata, Mapping) else enumerate(metadata)
+    entries = {int(i): ({"file": meta} if isinstance(meta, str) else dict(meta or {})) for i, meta in items}
+    size = max(entries, default=-1) + 1
+    columns = {name: np.full(size, 0 if name in ("live", "date_first", "date_last") else -1, dtype=dtype)
+               for name, dtype in COLUMNS.items()}
+    codes: Dict[str, Dict[str, int]] = {name: {} for name in DICTIONARIES}
+
+    for i, meta in entries.items():
+        columns["live"][i] = True
+        company, form, (columns["date_first"][i], columns["date_last"][i]) = chunk_attributes(meta)
+        for name, value in (("ticker", company), ("form", form), ("source", _source_name(meta))):
+            if value:
+                columns[name][i] = codes[name].setdefault(value, len(codes[name]))
+        number = meta.get("chunk_number")
+        if number is None:
+            match = _CHUNK_NUMBER_RE.search(str(meta.get("file") or ""))
+            number = int(match.group(1)) if match else None
+        if number is not None:
+            columns["chunk"][i] = int(number)
+            columns["section"][i] = int(number) // section_size
+        if meta.get("start_char") is not None:
+            columns["start_char"][i] = int(meta["start_char"])
+        if meta.get("end_char") is not None:
+            columns["end_char"][i] = int(meta["end_char"])
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, column in columns.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), column)
+    for name, file_name in DICTIONARIES.items():
+        with open(os.path.join(out_dir, file_name), "w", encoding="utf-8") as f:
+            json.dump(sorted(codes[name], key=codes[name].get), f)
+    params = {
+        "count": len(entries),
+        "size": size,
+        "section_size": section_size,
+        "tickers": len(codes["ticker"]),
+        "sources": len(codes["source"]),
+        "build_seconds": round(time.perf_counter() - start, 3),
+    }
+    with open(os.path.join(out_dir, PARAMS_FILE), "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+    print(f"✅ Chunk catalog: {len(entries)} chunks, {len(codes['ticker'])} tickers, "
+          f"{len(codes['source'])} sources in {params['build_seconds']}s")
+    return params
+
+
+def catalog_metadata(docstore, index_to_docstore_id: Mapping[int, str]) -> Dict[int, Dict[str, Any]]:
+    """{FAISS id: metadata} of every document in a LangChain docstore (the catalog's input)."""
+    metadata = {}
+    for chunk_id, docstore_id in index_to_docstore_id.items():
+        metadata[int(chunk_id)] = dict(getattr(docstore.search(docstore_id), "metadata", None) or {})
+    return metadata
+
+
+class ChunkCatalog:
+    """
+    Read-only chunk metadata columns over memory-mapped .npy files.
+
+    Loading is a few file opens (only the small value dictionaries are
+    parsed), and a filter is evaluated as vectorized comparisons over whole
+    columns into one boolean mask per query, so it costs the same for any
+    number of matching values.
+    """
+
+    def __init__(self, index_dir: str):
+        """
+        Args:
+            index_dir: Directory written by build_chunk_catalog
+        """
+        self.index_dir = index_dir
+        self.columns = {name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r") for name in COLUMNS}
+        self.values: Dict[str, List[str]] = {}
+        self.codes: Dict[str, Dict[str, int]] = {}
+        for name, file_name in DICTIONARIES.items():
+            with open(os.path.join(index_dir, file_name), "r", encoding="utf-8") as f:
+                self.values[name] = json.load(f)
+            self.codes[name] = {value.upper(): code for code, value in enumerate(self.values[name])}
+        with open(os.path.join(index_dir, PARAMS_FILE), "r", encoding="utf-8") as f:
+            self.params = json.load(f)
+        self.count = int(self.params["count"])
+        self.size = int(self.params["size"])
+
+    def supports(self, filters: Optional[Dict[str, Any]]) -> bool:
+        """True if every filter key is a catalog column (others need the raw metadata)."""
+        return all(key in FILTER_KEYS for key, value in (filters or {}).items() if value is not None)
+
+    def companies(self) -> List[str]:
+        return sorted(self.values["ticker"])
+
+    def _codes(self, column: str, value) -> np.ndarray:
+        codes = [self.codes[column].get(str(v).upper()) for v in _as_list(value)]
+        return np.array([code for code in codes if code is not None], dtype=self.columns[column].dtype)
+
+    def mask(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Boolean mask over FAISS ids of the live chunks matching every filter
+
+        Args:
+            filters: company/ticker, form and source (value or list), section (int or list),
+                date_from / date_to ("YYYY", "YYYY-MM" or "YYYY-MM-DD", inclusive)
+
+        Returns:
+            Mask of length size, or None when there is nothing to filter on
+
+        Raises:
+            KeyError: A filter key the catalog has no column for (see supports)
+        """
+        if not filters:
+            return None
+        mask = np.array(self.columns["live"])
+        filtered = False
+        for key, value in filters.items():
+            if value is None or key in DATE_KEYS:
+                continue
+            if key in COMPANY_KEYS:
+                column, wanted = "ticker", self._codes("ticker", value)
+            elif key in ("form", "source"):
+                column, wanted = key, self._codes(key, value)
+            elif key == "section":
+                column, wanted = "section", np.array([int(v) for v in _as_list(value)], dtype=np.int32)
+            else:
+                raise KeyError(f"No catalog column for filter {key!r}")
+            mask &= np.isin(self.columns[column], wanted)
+            filtered = True
+
+        date_from, date_to = filters.get("date_from"), filters.get("date_to")
+        if date_from or date_to:
+            start = date_bounds(date_from)[0] if date_from else 1
+            end = date_bounds(date_to)[1] if date_to else 99991231
+            # A chunk matches if the period its filing date covers overlaps the range
+            first, last = self.columns["date_first"], self.columns["date_last"]
+            mask &= (first > 0) & (last >= start) & (first <= end)
+            filtered = True
+        return mask if filtered else None
+
+    def select(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Sorted FAISS ids matching every filter (ChunkFilterIndex.select over the catalog columns)."""
+        mask = self.mask(filters)
+        return None if mask is None else np.flatnonzero(mask).astype(np.int64)
+
+    def bitmap(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """The matching ids as a packed bitmap, bit (id & 7) of byte id >> 3 (faiss.IDSelectorBitmap layout)."""
+        mask = self.mask(filters)
+        return None if mask is None else np.packbits(mask, bitorder="little")
+
+    def get(self, chunk_id: int) -> Dict[str, Any]:
+        """One chunk's catalog row, with codes resolved."""
+        row = {name: column[chunk_id].item() for name, column in self.columns.items()}
+        for name in DICTIONARIES:
+            row[name] = self.values[name][row[name]] if row[name] >= 0 else None
+        return row
+
+    def stats(self) -> Dict[str, Any]:
+        return {key: self.params[key] for key in ("count", "size", "tickers", "sources")}
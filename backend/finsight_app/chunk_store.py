@@ -0,0 +1,172 @@
+"""
+FinSight Copilot - Chunk Store
+All chunk texts in one contiguous UTF-8 blob plus an offsets array,
+memory-mapped so fetching a chunk is a slice instead of a file open
+"""
+
+import json
+import mmap
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+BLOB_FILE = "chunks.bin"
+OFFSETS_FILE = "offsets.npy"
+NAMES_FILE = "names.json"
+
+
+def store_exists(store_dir: str) -> bool:
+    """True if a chunk store has been written to the directory."""
+    return os.path.exists(os.path.join(store_dir, OFFSETS_FILE))
+
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped chunk texts.
+
+    Chunk i is blob[offsets[i]:offsets[i + 1]]. Both files are mapped, so
+    pages are shared through the OS page cache (pre-forked workers read one
+    copy) and only the chunks actually returned are ever touched.
+    """
+
+    def __init__(self, store_dir: str):
+        """
+        Map a store written by ChunkStoreWriter
+
+        Args:
+            store_dir: Directory containing chunks.bin, offsets.npy and names.json
+        """
+        self.store_dir = store_dir
+        self.offsets = np.load(os.path.join(store_dir, OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(store_dir, NAMES_FILE), "r", encoding="utf-8") as f:
+            self.names: List[str] = json.load(f)
+        self._file = open(os.path.join(store_dir, BLOB_FILE), "rb")
+        size = int(self.offsets[-1])
+        # mmap cannot map an empty file
+        self._blob = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ) if size else b""
+        self._view = memoryview(self._blob)
+        self._ids: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def view(self, chunk_id: int) -> memoryview:
+        """Zero-copy UTF-8 bytes of a chunk."""
+        return self._view[int(self.offsets[chunk_id]):int(self.offsets[chunk_id + 1])]
+
+    def text(self, chunk_id: int) -> str:
+        """Decoded text of a chunk."""
+        return str(self.view(chunk_id), "utf-8")
+
+    def texts(self, chunk_ids: Iterable[int]) -> List[str]:
+        return [self.text(chunk_id) for chunk_id in chunk_ids]
+
+    def id_of(self, name: str) -> Optional[int]:
+        """Chunk id for a chunk name (e.g. "AAPL_10k_2023_chunk_4.txt"), or None."""
+        if self._ids is None:
+            self._ids = {chunk_name: i for i, chunk_name in enumerate(self.names)}
+        return self._ids.get(name)
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """(name, text) of every chunk, in id order."""
+        for i, name in enumerate(self.names):
+            yield name, self.text(i)
+
+    def stats(self) -> Dict[str, int]:
+        return {"chunks": len(self), "bytes": int(self.offsets[-1])}
+
+    def close(self):
+        self._view.release()
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._file.close()
+
+
+class ChunkStoreWriter:
+    """
+    Appends chunks to a store.
+
+    Texts are streamed to the blob as they arrive; offsets and names are
+    written (atomically) on close. Opening an existing store appends to it,
+    so per-document ingestion can add chunks without rewriting the blob.
+    """
+
+    def __init__(self, store_dir: str, append: bool = True):
+        """
+        Args:
+            store_dir: Store directory (created if missing)
+            append: Keep the chunks already in the store; False starts a new one
+        """
+        os.makedirs(store_dir, exist_ok=True)
+        self.store_dir = store_dir
+        self.offsets: List[int] = [0]
+        self.names: List[str] = []
+        if append and store_exists(store_dir):
+            self.offsets = np.load(os.path.join(store_dir, OFFSETS_FILE)).tolist()
+            with open(os.path.join(store_dir, NAMES_FILE), "r", encoding="utf-8") as f:
+                self.names = json.load(f)
+        self._blob = open(os.path.join(store_dir, BLOB_FILE), "r+b" if len(self.names) else "wb")
+        # Anything past the last offset is an interrupted write
+        self._blob.seek(self.offsets[-1])
+        self._blob.truncate()
+
+    def add(self, name: str, text: str) -> int:
+        """
+        Append a chunk
+
+        Returns:
+            Its chunk id
+        """
+        data = text.encode("utf-8")
+        self._blob.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+        self.names.append(name)
+        return len(self.names) - 1
+
+    def close(self):
+        self._blob.close()
+        offsets_tmp = os.path.join(self.store_dir, "offsets.tmp.npy")
+        np.save(offsets_tmp, np.asarray(self.offsets, dtype=np.int64))
+        names_tmp = os.path.join(self.store_dir, NAMES_FILE + ".tmp")
+        with open(names_tmp, "w", encoding="utf-8") as f:
+            json.dump(self.names, f)
+        # Names first: a reader that sees the new offsets also sees every name
+        os.replace(names_tmp, os.path.join(self.store_dir, NAMES_FILE))
+        os.replace(offsets_tmp, os.path.join(self.store_dir, OFFSETS_FILE))
+
+    def __enter__(self) -> "ChunkStoreWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_chunk_store(store_dir: str, chunks: Iterable[Tuple[str, str]]) -> int:
+    """
+    Write a new store from (name, text) pairs
+
+    Returns:
+        Number of chunks written
+    """
+    with ChunkStoreWriter(store_dir, append=False) as writer:
+        for name, text in chunks:
+            writer.add(name, text)
+        return len(writer.names)
+
+
+def read_chunk(name: str, store: Optional[ChunkStore], fallback_dir: str) -> Optional[str]:
+    """
+    Text of a chunk by name: from the store, else from a legacy per-chunk .txt file
+
+    Returns:
+        Chunk text, or None if neither has it
+    """
+    chunk_id = store.id_of(name) if store is not None else None
+    if chunk_id is not None:
+        return store.text(chunk_id)
+    path = os.path.join(fallback_dir, name)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
@@ -1,6 +1,7 @@
 import os
 import json
-from backend.finsight_app.path_utils import PROCESSED_DATA_DIR
+from backend.finsight_app.path_utils import PROCESSED_DATA_DIR, CHUNK_STORE_DIR
+from backend.finsight_app.chunk_store import ChunkStoreWriter
 
 PROCESSED_DIR = PROCESSED_DATA_DIR  # Use PROCESSED_DATA_DIR for processed data
 CHUNK_SIZE = 2000  # characters
@@ -11,23 +12,24 @@ def chunk_text(text, chunk_size):
     return [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
 
 def main():
-    for file in os.listdir(PROCESSED_DIR):
-        if file.endswith('.txt') and '_chunk_' not in file:
-            file_path = os.path.join(PROCESSED_DIR, file)
-            with open(file_path, 'r', encoding='utf-8') as f:
-                text = f.read()
-            chunks = chunk_text(text, CHUNK_SIZE)
-            for idx, chunk in enumerate(chunks):
-                chunk_filename = f"{file.replace('.txt', '')}_chunk_{idx}.txt"
-                chunk_path = os.path.join(PROCESSED_DIR, chunk_filename)
-                with open(chunk_path, 'w', encoding='utf-8') as cf:
-                    cf.write(chunk)
-                metadata[chunk_filename] = {
-                    'source_file': file,
-                    'chunk_number': idx,
-                    'start_char': idx * CHUNK_SIZE,
-                    'end_char': min((idx + 1) * CHUNK_SIZE, len(text))
-                }
+    # All chunks go into one memory-mappable store instead of a .txt file each
+    with ChunkStoreWriter(CHUNK_STORE_DIR, append=False) as store:
+        for file in sorted(os.listdir(PROCESSED_DIR)):
+            if file.endswith('.txt') and '_chunk_' not in file:
+                file_path = os.path.join(PROCESSED_DIR, file)
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+                chunks = chunk_text(text, CHUNK_SIZE)
+                for idx, chunk in enumerate(chunks):
+                    chunk_filename = f"{file.replace('.txt', '')}_chunk_{idx}.txt"
+                    store.add(chunk_filename, chunk)
+                    metadata[chunk_filename] = {
+                        'source_file': file,
+                        'chunk_number': idx,
+                        'start_char': idx * CHUNK_SIZE,
+                        'end_char': min((idx + 1) * CHUNK_SIZE, len(text))
+                    }
+        print(f"Wrote {len(store.names)} chunks to {CHUNK_STORE_DIR}")
     # Save metadata
     meta_path = os.path.join(PROCESSED_DIR, 'chunk_metadata.json')
     with open(meta_path, 'w', encoding='utf-8') as mf:
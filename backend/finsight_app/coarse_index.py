@@ -0,0 +1,251 @@
+"""
+FinSight Copilot - Coarse Filing Index
+Two-stage retrieval: per-filing / per-section mean embeddings pick the
+filings a query is about, then only their chunks are searched
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import faiss
+import numpy as np
+
+COARSE_DIR = "coarse"
+COARSE_INDEX_FILE = "coarse.faiss"
+FILINGS_FILE = "filings.json"
+PARAMS_FILE = "coarse_params.json"
+
+# Consecutive chunks of a filing averaged into one section vector (10-K item sections run to tens of chunks)
+SECTION_SIZE = 16
+
+_CHUNK_SUFFIX_RE = re.compile(r"_chunk_(\d+)(?:\.txt)?$")
+
+
+def filing_key(name: str) -> str:
+    """Filing a chunk belongs to: its file name without the "_chunk_<i>.txt" suffix."""
+    base = (name or "").rsplit("/", 1)[-1]
+    return _CHUNK_SUFFIX_RE.sub("", base) or base
+
+
+def _chunk_number(name: str) -> int:
+    match = _CHUNK_SUFFIX_RE.search(name or "")
+    return int(match.group(1)) if match else 0
+
+
+def coarse_dir(index_dir: str) -> str:
+    return os.path.join(index_dir, COARSE_DIR)
+
+
+def coarse_index_exists(index_dir: str) -> bool:
+    return os.path.exists(os.path.join(coarse_dir(index_dir), PARAMS_FILE))
+
+
+def build_coarse_index(vectors: np.ndarray, names: Sequence[str], out_dir: str,
+                       chunk_ids: Optional[Sequence[int]] = None, metric: int = faiss.METRIC_L2,
+                       section_size: int = SECTION_SIZE) -> Dict[str, Any]:
+    """
+    Build and save the coarse index over a chunk index's vectors
+
+    Chunks are grouped by filing (chunk file name without its counter), in
+    chunk order, and each run of section_size chunks becomes one section
+    whose vector is the mean of its chunks. Groups are saved as CSR arrays:
+    sections of filing f are section_indptr rows filing_indptr[f]..filing_indptr[f + 1],
+    chunks of section s are section_chunks[section_indptr[s]:section_indptr[s + 1]].
+
+    Args:
+        vectors: (n, d) float32 chunk vectors, row i is chunk_ids[i]
+        names: Chunk file name (or upload source) of each row
+        out_dir: Output directory (usually <index_dir>/coarse)
+        chunk_ids: FAISS id of each row (default: row number)
+        metric: FAISS metric of the chunk index; section means are unit-normalized for inner product
+        section_size: Chunks per section
+
+    Returns:
+        Build parameters (also saved as coarse_params.json)
+    """
+    start = time.perf_counter()
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ids = np.asarray(chunk_ids if chunk_ids is not None else np.arange(len(vectors)), dtype=np.int64)
+    keys = [filing_key(name) for name in names]
+    filings = sorted(set(keys))
+    filing_of = {key: f for f, key in enumerate(filings)}
+    order = sorted(range(len(keys)), key=lambda row: (filing_of[keys[row]], _chunk_number(names[row]), ids[row]))
+
+    rows: List[int] = []
+    section_indptr = [0]
+    filing_indptr = [0]
+    position = 0
+    for f in range(len(filings)):
+        end = position
+        while end < len(order) and filing_of[keys[order[end]]] == f:
+            end += 1
+        for section_start in range(position, end, section_size):
+            rows.extend(order[section_start:min(section_start + section_size, end)])
+            section_indptr.append(len(rows))
+        filing_indptr.append(len(section_indptr) - 1)
+        position = end
+
+    rows_arr = np.asarray(rows, dtype=np.int64)
+    section_indptr_arr = np.asarray(section_indptr, dtype=np.int64)
+    n_sections = len(section_indptr_arr) - 1
+    section_vectors = np.add.reduceat(vectors[rows_arr], section_indptr_arr[:-1], axis=0) if n_sections else \
+        np.empty((0, vectors.shape[1]), dtype=np.float32)
+    section_vectors /= np.diff(section_indptr_arr)[:, None].astype(np.float32)
+    if metric == faiss.METRIC_INNER_PRODUCT:
+        faiss.normalize_L2(section_vectors)
+    coarse = faiss.IndexFlat(vectors.shape[1], metric)
+    coarse.add(section_vectors)
+
+    os.makedirs(out_dir, exist_ok=True)
+    faiss.write_index(coarse, os.path.join(out_dir, COARSE_INDEX_FILE))
+    np.save(os.path.join(out_dir, "section_chunks.npy"), ids[rows_arr])
+    np.save(os.path.join(out_dir, "section_indptr.npy"), section_indptr_arr)
+    np.save(os.path.join(out_dir, "filing_indptr.npy"), np.asarray(filing_indptr, dtype=np.int64))
+    np.save(os.path.join(out_dir, "section_filing.npy"),
+            np.repeat(np.arange(len(filings), dtype=np.int32), np.diff(filing_indptr)))
+    with open(os.path.join(out_dir, FILINGS_FILE), "w", encoding="utf-8") as f:
+        json.dump(filings, f)
+    params = {
+        "n_chunks": int(len(rows_arr)),
+        "n_filings": len(filings),
+        "n_sections": n_sections,
+        "section_size": section_size,
+        # Chunks added later get ids from here on and are not grouped yet
+        "id_space": int(ids.max()) + 1 if len(ids) else 0,
+        "build_seconds": round(time.perf_counter() - start, 3),
+    }
+    with open(os.path.join(out_dir, PARAMS_FILE), "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+    print(f"✅ Coarse index: {len(filings)} filings, {n_sections} sections over {len(rows_arr)} chunks "
+          f"in {params['build_seconds']}s")
+    return params
+
+
+class CoarseIndex:
+    """
+    Read-only filing selector over a saved coarse index.
+
+    The section vectors are a few hundred rows per thousand chunks, so a
+    query's coarse search is cheap; the CSR group arrays are memory-mapped.
+    """
+
+    def __init__(self, index_dir: str):
+        """
+        Args:
+            index_dir: Directory written by build_coarse_index
+        """
+        self.index_dir = index_dir
+        self.index = faiss.read_index(os.path.join(index_dir, COARSE_INDEX_FILE))
+        self.section_chunks = np.load(os.path.join(index_dir, "section_chunks.npy"), mmap_mode="r")
+        self.section_indptr = np.load(os.path.join(index_dir, "section_indptr.npy"), mmap_mode="r")
+        self.filing_indptr = np.load(os.path.join(index_dir, "filing_indptr.npy"), mmap_mode="r")
+        self.section_filing = np.load(os.path.join(index_dir, "section_filing.npy"), mmap_mode="r")
+        with open(os.path.join(index_dir, FILINGS_FILE), "r", encoding="utf-8") as f:
+            self.filings = json.load(f)
+        with open(os.path.join(index_dir, PARAMS_FILE), "r", encoding="utf-8") as f:
+            self.params = json.load(f)
+        self.id_space = int(self.params["id_space"])
+
+    def filing_chunks(self, filing: int) -> np.ndarray:
+        """FAISS ids of every chunk of a filing."""
+        first = self.section_indptr[self.filing_indptr[filing]]
+        last = self.section_indptr[self.filing_indptr[filing + 1]]
+        return self.section_chunks[first:last]
+
+    def top_filings(self, queries: np.ndarray, n_filings: int) -> List[np.ndarray]:
+        """
+        Filings whose best section is closest to each query, best first
+
+        Args:
+            queries: (n, d) float32 queries, normalized like the chunk index's
+            n_filings: Filings to return per query
+
+        Returns:
+            Filing numbers per query
+        """
+        n_sections = self.index.ntotal
+        if not n_sections:
+            return [np.empty(0, dtype=np.int64) for _ in range(len(queries))]
+        # Filings have several sections; over-fetch so n distinct filings survive
+        depth = min(n_sections, n_filings * 4)
+        _, sections = self.index.search(np.ascontiguousarray(queries, dtype=np.float32), depth)
+        results = []
+        for row in sections:
+            filings = self.section_filing[row[row != -1]]
+            # First occurrence of each filing keeps the ranking
+            _, first = np.unique(filings, return_index=True)
+            results.append(filings[np.sort(first)][:n_filings].astype(np.int64))
+        return results
+
+    def select(self, queries: np.ndarray, n_filings: int, min_chunks: int = 0) -> List[np.ndarray]:
+        """
+        Candidate chunk ids per query: every chunk of its top filings
+
+        Args:
+            queries: (n, d) float32 queries
+            n_filings: Filings to search per query
+            min_chunks: Keep adding filings (in rank order) until at least this many chunks are selected
+
+        Returns:
+            Sorted FAISS ids per query
+        """
+        wanted = max(n_filings, 1)
+        ranked = self.top_filings(queries, wanted)
+        results = []
+        for row, filings in enumerate(ranked):
+            parts = [self.filing_chunks(int(filing)) for filing in filings]
+            if sum(len(part) for part in parts) < min_chunks and len(filings) < len(self.filings):
+                # Small filings: rank every filing and take them in order until there are enough chunks
+                parts = []
+                for filing in self.top_filings(queries[row:row + 1], len(self.filings))[0]:
+                    parts.append(self.filing_chunks(int(filing)))
+                    if len(parts) >= wanted and sum(len(part) for part in parts) >= min_chunks:
+                        break
+            results.append(np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64))
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {key: self.params[key] for key in ("n_filings", "n_sections", "n_chunks", "section_size")}
+
+
+def main():
+    """Add a coarse index to the live FAISS store (index.pkl docstore), published as a new snapshot."""
+    import pickle
+
+    try:
+        from finsight_app.index_specs import stored_vectors
+        from finsight_app.path_utils import get_faiss_index_root
+        from finsight_app.snapshots import SnapshotManager
+    except ImportError:
+        from backend.finsight_app.index_specs import stored_vectors
+        from backend.finsight_app.path_utils import get_faiss_index_root
+        from backend.finsight_app.snapshots import SnapshotManager
+
+    parser = argparse.ArgumentParser(
+        description="Publish a snapshot of the live FAISS store with a filing-level coarse index")
+    parser.add_argument("--index-root", default=get_faiss_index_root(),
+                        help="Index root with snapshots/ and CURRENT (default: the API's)")
+    parser.add_argument("--section-size", type=int, default=SECTION_SIZE,
+                        help="Chunks averaged into one section vector")
+    args = parser.parse_args()
+
+    def build(out_dir: str, parent_dir: str):
+        index = faiss.read_index(os.path.join(parent_dir, "index.faiss"))
+        with open(os.path.join(parent_dir, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        chunk_ids = np.array(sorted(index_to_docstore_id), dtype=np.int64)
+        names = []
+        for chunk_id in chunk_ids:
+            metadata = getattr(docstore.search(index_to_docstore_id[int(chunk_id)]), "metadata", None) or {}
+            names.append(metadata.get("file") or metadata.get("source") or "")
+        build_coarse_index(stored_vectors(index, chunk_ids), names, coarse_dir(out_dir), chunk_ids=chunk_ids,
+                           metric=index.metric_type, section_size=args.section_size)
+
+    SnapshotManager(args.index_root).publish_derived(build, [COARSE_DIR], "coarse")
+
+if __name__ == "__main__":
+    main()
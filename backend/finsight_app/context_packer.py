@@ -0,0 +1,169 @@
+"""
+FinSight Copilot - Context Packer
+Token-budgeted, near-duplicate-free context assembly for RAG prompts
+"""
+
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, FrozenSet, List, Optional, Sequence
+
+# Sentence boundary: terminal punctuation followed by whitespace and something that
+# can start a sentence, or a blank line (filings often separate table rows / items that way).
+# Initials and common filing abbreviations ("U.S.", "Inc.", "No.") do not end a sentence.
+_SENTENCE_RE = re.compile(
+    r"(?<![A-Z]\.)(?<!\bInc\.)(?<!\bCo\.)(?<!\bNo\.)(?<=[.!?;])\s+(?=[\"'(\[$A-Z0-9•\-])|\n\s*\n"
+)
+# Words, with "." / "," kept only between digits ("3.5%", "$383,285"), so trailing punctuation never changes a word
+_WORD_RE = re.compile(r"(?:\d+(?:[.,]\d+)+|[a-z0-9$%])+")
+
+# Rough characters per token, used only when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split chunk text into sentences, collapsing internal whitespace."""
+    sentences = []
+    for piece in _SENTENCE_RE.split(text or ""):
+        piece = " ".join(piece.split())
+        if piece:
+            sentences.append(piece)
+    return sentences
+
+
+def shingles(sentence: str, size: int = 3) -> FrozenSet[int]:
+    """Hashed word n-grams of a sentence (case and punctuation-spacing insensitive)."""
+    words = _WORD_RE.findall(sentence.lower())
+    if len(words) < size:
+        return frozenset([zlib.crc32(" ".join(words).encode("utf-8"))]) if words else frozenset()
+    return frozenset(
+        zlib.crc32(" ".join(words[i:i + size]).encode("utf-8"))
+        for i in range(len(words) - size + 1)
+    )
+
+
+def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class PackedContext:
+    """Packed context text plus what went into it."""
+    text: str
+    tokens: int
+    budget: int
+    sentences: int = 0
+    duplicates_dropped: int = 0
+    over_budget_dropped: int = 0
+    chunks_used: List[int] = field(default_factory=list)
+
+
+class ContextPacker:
+    """
+    Fills a token budget with the best evidence from retrieved chunks.
+
+    Chunks are visited in descending rerank score. Each chunk is split into
+    sentences; a sentence is skipped if its hashed word shingles overlap an
+    already selected sentence by more than `duplicate_threshold` (Jaccard),
+    or if it does not fit the remaining budget. Tokens are counted with the
+    generating model's own tokenizer, so the budget is exact.
+    """
+
+    def __init__(
+        self,
+        tokenizer=None,
+        context_window: int = 1024,
+        duplicate_threshold: float = 0.8,
+        shingle_size: int = 3,
+        safety_margin: int = 16,
+    ):
+        """
+        Initialize the packer
+
+        Args:
+            tokenizer: Hugging Face tokenizer of the generating model (None: estimate from characters)
+            context_window: Model context length in tokens
+            duplicate_threshold: Shingle Jaccard similarity above which a sentence counts as a duplicate
+            shingle_size: Words per shingle
+            safety_margin: Tokens kept free for separators and tokenizer boundary effects
+        """
+        self.tokenizer = tokenizer
+        self.context_window = context_window
+        self.duplicate_threshold = duplicate_threshold
+        self.shingle_size = shingle_size
+        self.safety_margin = safety_margin
+
+    def count_tokens(self, texts: Sequence[str]) -> List[int]:
+        """Token count of each text (one batched tokenizer call)."""
+        if not texts:
+            return []
+        if self.tokenizer is None:
+            return [max(1, len(text) // CHARS_PER_TOKEN) for text in texts]
+        encoded = self.tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+
+    def budget(self, prompt_overhead: str, max_tokens: int, cap: Optional[int] = None) -> int:
+        """
+        Tokens available for context
+
+        Args:
+            prompt_overhead: The prompt rendered with an empty context (template + question)
+            max_tokens: Tokens reserved for the answer
+            cap: Optional upper bound on context tokens
+
+        Returns:
+            Context token budget (never negative)
+        """
+        overhead = self.count_tokens([prompt_overhead])[0]
+        available = self.context_window - overhead - max_tokens - self.safety_margin
+        if cap is not None:
+            available = min(available, cap)
+        return max(0, available)
+
+    def pack(self, chunks: Sequence[Any], scores: Optional[Sequence[float]], budget: int) -> PackedContext:
+        """
+        Greedily pack chunk sentences into the budget, best chunks first
+
+        Args:
+            chunks: Retrieved documents (anything with page_content)
+            scores: Rerank scores aligned with chunks (None: keep retrieval order)
+            budget: Context token budget
+
+        Returns:
+            PackedContext; selected sentences stay grouped by chunk in score order
+        """
+        if scores is None:
+            order = list(range(len(chunks)))
+        else:
+            order = sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)
+
+        packed = PackedContext(text="", tokens=0, budget=budget)
+        selected_shingles: List[FrozenSet[int]] = []
+        blocks: List[str] = []
+        separator_tokens = 1
+        for chunk_index in order:
+            sentences = split_sentences(chunks[chunk_index].page_content)
+            counts = self.count_tokens(sentences)
+            kept = []
+            for sentence, tokens in zip(sentences, counts):
+                signature = shingles(sentence, self.shingle_size)
+                if any(jaccard(signature, seen) >= self.duplicate_threshold for seen in selected_shingles):
+                    packed.duplicates_dropped += 1
+                    continue
+                if packed.tokens + tokens + separator_tokens > budget:
+                    packed.over_budget_dropped += 1
+                    continue
+                kept.append(sentence)
+                selected_shingles.append(signature)
+                packed.tokens += tokens + separator_tokens
+            if kept:
+                blocks.append(" ".join(kept))
+                packed.chunks_used.append(chunk_index)
+            if budget - packed.tokens <= separator_tokens:
+                break
+
+        packed.text = "\n\n".join(blocks)
+        packed.sentences = len(selected_shingles)
+        return packed
@@ -1,12 +1,14 @@
 import os
 from bs4 import BeautifulSoup
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from backend.finsight_app.path_utils import DATA_DIR, PROCESSED_DATA_DIR
+from backend.finsight_app.path_utils import DATA_DIR, PROCESSED_DATA_DIR, CHUNK_STORE_DIR
+from backend.finsight_app.chunk_store import ChunkStoreWriter
 
 class DataProcessor:
-    def __init__(self, input_dir=None, output_dir=None):
+    def __init__(self, input_dir=None, output_dir=None, store_dir=None):
         self.input_dir = input_dir or DATA_DIR
         self.output_dir = output_dir or PROCESSED_DATA_DIR
+        self.store_dir = store_dir or CHUNK_STORE_DIR
         os.makedirs(self.output_dir, exist_ok=True)
 
     def clean_html(self, html_file):
@@ -33,13 +35,13 @@ class DataProcessor:
         splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap)
         chunks = splitter.split_text(text)
 
-        chunk_paths = []
-        for i, chunk in enumerate(chunks):
-            chunk_file = txt_file.replace(".txt", f"_chunk_{i}.txt")
-            full_chunk_path = os.path.join(self.output_dir, chunk_file)
-            with open(full_chunk_path, "w", encoding="utf-8") as f:
-                f.write(chunk)
-            chunk_paths.append(full_chunk_path)
+        # Appended to the chunk store rather than written as one file per chunk
+        chunk_names = []
+        with ChunkStoreWriter(self.store_dir) as store:
+            for i, chunk in enumerate(chunks):
+                chunk_file = txt_file.replace(".txt", f"_chunk_{i}.txt")
+                store.add(chunk_file, chunk)
+                chunk_names.append(chunk_file)
 
-        print(f"✅ {len(chunk_paths)} chunks saved to: {self.output_dir}")
-        return chunk_paths 
\ No newline at end of file
+        print(f"✅ {len(chunk_names)} chunks saved to: {self.store_dir}")
+        return chunk_names 
\ No newline at end of file
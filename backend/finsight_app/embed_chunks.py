@@ -1,5 +1,6 @@
 import os
 import json
+import argparse
 import numpy as np
 import pickle
 import pandas as pd
@@ -12,6 +13,11 @@ EMBEDDINGS_PATH = os.path.join(EMBEDDINGS_DIR, "chunk_embeddings.npy")
 
 os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
 
+parser = argparse.ArgumentParser(description="Embed company JSON/CSV files")
+parser.add_argument("--dtype", choices=["float32", "float16"], default=os.getenv("FINSIGHT_COMPANY_EMBEDDING_DTYPE", "float32"),
+                    help="Storage type of company_embeddings.npy (float16 halves it; cosine scores move by ~1e-3)")
+args = parser.parse_args()
+
 MODEL_NAME = 'all-MiniLM-L6-v2'
 model = SentenceTransformer(MODEL_NAME)
 
@@ -45,11 +51,12 @@ for fname in csv_files:
     file_mapping.append(fname)
 
 print(f"Generating embeddings for {len(texts)} company JSON/CSV files...")
-embeddings = model.encode(texts, show_progress_bar=True, batch_size=32)
+# Unit-norm rows: query_company_data scores with a plain dot product, no per-query normalization
+embeddings = model.encode(texts, show_progress_bar=True, batch_size=32, normalize_embeddings=True)
 
 # Save embeddings
 embeddings_path = os.path.join(EMBEDDINGS_DIR, 'company_embeddings.npy')
-np.save(embeddings_path, embeddings)
+np.save(embeddings_path, np.asarray(embeddings, dtype=args.dtype))
 
 # Save mapping
 mapping_path = os.path.join(EMBEDDINGS_DIR, 'company_mapping.pkl')
@@ -3,38 +3,58 @@ import faiss
 import pickle
 from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
-from backend.finsight_app.path_utils import get_faiss_index_dir, PROCESSED_DATA_DIR
+from backend.finsight_app.path_utils import get_faiss_index_root, PROCESSED_DATA_DIR, CHUNK_STORE_DIR
+from backend.finsight_app.chunk_store import ChunkStore, store_exists, write_chunk_store
+from backend.finsight_app.index_specs import IndexSpec, build_index, save_index_params
 
 class EmbeddingManager:
-    def __init__(self, data_dir=None, model_name="all-MiniLM-L6-v2"):
+    def __init__(self, data_dir=None, model_name="all-MiniLM-L6-v2", store_dir=None):
         self.data_dir = data_dir or PROCESSED_DATA_DIR
-        self.index_dir = get_faiss_index_dir()
+        self.store_dir = store_dir or CHUNK_STORE_DIR
+        self.index_dir = get_faiss_index_root()
         os.makedirs(self.index_dir, exist_ok=True)
         self.model = SentenceTransformer(model_name)
 
     def load_chunks(self):
-        chunks = []
-        file_names = []
+        """
+        Chunk texts and names in chunk-store order (FAISS id i is store chunk i)
 
-        for file in os.listdir(self.data_dir):
-            if file.endswith(".txt") and "_chunk_" in file:
-                path = os.path.join(self.data_dir, file)
-                with open(path, "r", encoding="utf-8") as f:
-                    chunks.append(f.read())
-                    file_names.append(file)
+        Legacy per-chunk .txt files are migrated into a new store first.
+        """
+        if not store_exists(self.store_dir):
+            legacy = sorted(file for file in os.listdir(self.data_dir) if file.endswith(".txt") and "_chunk_" in file)
 
+            def read(file):
+                with open(os.path.join(self.data_dir, file), "r", encoding="utf-8") as f:
+                    return f.read()
+
+            count = write_chunk_store(self.store_dir, ((file, read(file)) for file in legacy))
+            print(f"📦 Migrated {count} chunk files into {self.store_dir}")
+
+        store = ChunkStore(self.store_dir)
+        try:
+            chunks = [text for _, text in store.items()]
+            file_names = list(store.names)
+        finally:
+            store.close()
         return chunks, file_names
 
-    def create_and_save_faiss_index(self):
+    def create_and_save_faiss_index(self, index_spec: str = "flat"):
+        """
+        Embed every chunk and save the index plus its build parameters
+
+        Args:
+            index_spec: Index type, e.g. "flat", "ivf-flat", "ivf-pq", "hnsw:M=32", "sq8:refine=4" (see index_specs)
+        """
         chunks, file_names = self.load_chunks()
         print(f"📦 Loaded {len(chunks)} chunks... Generating embeddings...")
 
         embeddings = self.model.encode(chunks, show_progress_bar=True)
 
-        index = faiss.IndexFlatL2(embeddings.shape[1])
-        index.add(embeddings)
+        index, params = build_index(embeddings, IndexSpec.parse(index_spec))
 
         faiss.write_index(index, os.path.join(self.index_dir, "index.faiss"))
+        save_index_params(self.index_dir, params)
 
         with open(os.path.join(self.index_dir, "chunk_mapping.pkl"), "wb") as f:
             pickle.dump(file_names, f)
@@ -0,0 +1,109 @@
+"""
+FinSight Copilot - Bounded Executors
+Dedicated thread pools that keep blocking model and network work off the event loop
+"""
+
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class ExecutorSaturated(Exception):
+    """Raised when an executor's queue is full and a task cannot be admitted."""
+
+    def __init__(self, name: str, retry_after: int = 1):
+        super().__init__(f"{name} executor is saturated, retry later")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a concurrency cap and a queue-depth limit.
+
+    At most `max_workers` tasks run at once; up to `max_queue` more wait in
+    FIFO order inside the pool. Anything beyond that is rejected immediately
+    with ExecutorSaturated so the server sheds load instead of freezing.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        """
+        Initialize the executor
+
+        Args:
+            name: Name used for thread names and error messages
+            max_workers: Number of tasks allowed to run concurrently
+            max_queue: Number of tasks allowed to wait for a free worker
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"finsight-{name}")
+        # Only touched from the event loop thread, so no lock is needed
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Number of admitted tasks, running or queued."""
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of admitted tasks still waiting for a worker."""
+        return max(0, self._in_flight - self.max_workers)
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking callable on the pool and await its result
+
+        Args:
+            fn: Blocking callable
+            *args, **kwargs: Arguments for the callable
+
+        Returns:
+            Whatever the callable returns
+
+        Raises:
+            ExecutorSaturated: If the queue-depth limit has been reached
+        """
+        if self._in_flight >= self.max_workers + self.max_queue:
+            raise ExecutorSaturated(self.name)
+
+        loop = asyncio.get_running_loop()
+        self._in_flight += 1
+        try:
+            return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+        finally:
+            self._in_flight -= 1
+
+    def stats(self) -> Dict[str, int]:
+        """Current load figures for health and metrics endpoints."""
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+        }
+
+    def shutdown(self, wait: bool = False):
+        """Stop accepting work and release the worker threads."""
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+# CPU-bound model work (embedding, FAISS search, reranking, local generation).
+# Torch already parallelises inside a single call, so keep this pool small.
+model_executor = BoundedExecutor(
+    "model",
+    max_workers=int(os.getenv("FINSIGHT_MODEL_WORKERS", "2")),
+    max_queue=int(os.getenv("FINSIGHT_MODEL_QUEUE", "32")),
+)
+
+# Outbound I/O (Gemini and other HTTP calls) spends its time waiting, so it
+# can afford many more concurrent workers.
+io_executor = BoundedExecutor(
+    "io",
+    max_workers=int(os.getenv("FINSIGHT_IO_WORKERS", "16")),
+    max_queue=int(os.getenv("FINSIGHT_IO_QUEUE", "64")),
+)
@@ -0,0 +1,327 @@
+"""
+FinSight Copilot - Filtered Vector Search
+Metadata filters (ticker, form type, filing date range) applied before scoring,
+via FAISS ID selectors or an exact scan over the matching chunks
+"""
+
+import math
+import re
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import faiss
+import numpy as np
+
+try:
+    # Same module object as the API server when backend/ is on sys.path
+    from finsight_app.index_specs import search_parameters
+except ImportError:
+    from backend.finsight_app.index_specs import search_parameters
+
+# Filters with at most this many matching chunks are answered by an exact scan of just those vectors
+EXACT_SCAN_THRESHOLD = 5000
+
+_FORM_RE = re.compile(r"(?<![A-Za-z0-9])10-?([kq])(?![A-Za-z])", re.IGNORECASE)
+_DOC_KINDS = ("company_info", "financial_data", "stock_data")
+_DATE_RE = re.compile(r"(?<!\d)((?:19|20)\d{2})-?(\d{2})-?(\d{2})(?!\d)")
+_YEAR_RE = re.compile(r"(?<!\d)((?:19|20)\d{2})(?!\d)")
+_TICKER_RE = re.compile(r"^([A-Za-z][A-Za-z.\-]{0,9})_")
+
+# Filter keys handled by the columns below; anything else is matched against raw metadata
+COMPANY_KEYS = ("company", "ticker")
+DATE_KEYS = ("date_from", "date_to")
+
+
+def parse_chunk_name(name: str) -> Dict[str, Any]:
+    """
+    Ticker, form type and filing date encoded in a chunk file name
+
+    Handles the names the pipelines produce, e.g. "AAPL_10-K_2023-11-03_chunk_4.txt",
+    "MSFT_10q_2022_chunk_0.txt", "10-Q_2023-08-04_chunk_2.txt", "AAPL_company_info_chunk_0.txt".
+
+    Returns:
+        Dict with company (upper-case or None), form ("10-K", "10-Q", a document kind or None)
+        and filing_date ("YYYY-MM-DD", "YYYY" when only the year is known, or None)
+    """
+    base = (name or "").rsplit("/", 1)[-1]
+    form = None
+    form_match = _FORM_RE.search(base)
+    if form_match:
+        form = f"10-{form_match.group(1).upper()}"
+    else:
+        form = next((kind for kind in _DOC_KINDS if kind in base.lower()), None)
+
+    company = None
+    ticker_match = _TICKER_RE.match(base)
+    if ticker_match and not _FORM_RE.fullmatch(ticker_match.group(1)):
+        company = ticker_match.group(1).upper()
+
+    # The chunk counter ("_chunk_12") is not a date
+    dated = re.sub(r"_chunk_\d+", "", base)
+    filing_date = None
+    date_match = _DATE_RE.search(dated)
+    if date_match:
+        filing_date = "-".join(date_match.groups())
+    else:
+        year_match = _YEAR_RE.search(dated)
+        if year_match:
+            filing_date = year_match.group(1)
+    return {"company": company, "form": form, "filing_date": filing_date}
+
+
+def date_bounds(value: Optional[str]) -> Tuple[int, int]:
+    """(first, last) YYYYMMDD day covered by "YYYY", "YYYY-MM" or "YYYY-MM-DD"; (0, 0) if unknown."""
+    if not value:
+        return 0, 0
+    digits = str(value).replace("-", "")
+    if len(digits) == 4:
+        return int(digits + "0101"), int(digits + "1231")
+    if len(digits) == 6:
+        return int(digits + "01"), int(digits + "31")
+    return int(digits[:8]), int(digits[:8])
+
+
+def _as_set(value) -> set:
+    values = value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+    return {str(v).upper() for v in values}
+
+
+def chunk_attributes(meta: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], Tuple[int, int]]:
+    """
+    (company, form, (first, last) filing day) of one chunk's metadata
+
+    Explicit company/ticker, form and filing_date keys win; otherwise they are
+    parsed from the chunk's file / source name.
+    """
+    parsed = parse_chunk_name(meta.get("file") or meta.get("source") or "")
+    company = meta.get("company") or meta.get("ticker") or parsed["company"]
+    form = meta.get("form") or parsed["form"]
+    return (
+        str(company).upper() if company else None,
+        str(form).upper() if form else None,
+        date_bounds(meta.get("filing_date") or parsed["filing_date"]),
+    )
+
+
+class ChunkFilterIndex:
+    """
+    Per-chunk filter columns aligned with FAISS ids.
+
+    Company and form are stored as postings (value -> sorted ids), filing
+    dates as [first, last] day columns, so a filter resolves to the set of
+    matching ids with a few numpy operations instead of a scan over chunk
+    metadata. Filtered search then only scores those ids.
+    """
+
+    def __init__(self, metadata: Union[Sequence[Dict[str, Any]], Mapping[int, Dict[str, Any]]]):
+        """
+        Build the columns
+
+        Args:
+            metadata: Per-FAISS-id metadata dicts (or bare chunk file names), as a list indexed
+                by id or a {chunk id: metadata} mapping for ID-mapped indexes with gaps;
+                company/form/filing_date are taken from the dict when present, otherwise
+                parsed from its file/source name
+        """
+        if isinstance(metadata, Mapping):
+            entries = [{} for _ in range(max(metadata, default=-1) + 1)]
+            for chunk_id, meta in metadata.items():
+                entries[chunk_id] = meta
+            self.count = len(metadata)
+        else:
+            entries = list(metadata)
+            self.count = len(entries)
+        self.size = len(entries)
+        self.metadata = [{"file": meta} if isinstance(meta, str) else meta for meta in entries]
+        self.date_first = np.zeros(self.size, dtype=np.int32)
+        self.date_last = np.zeros(self.size, dtype=np.int32)
+        postings: Dict[str, Dict[str, List[int]]] = {"company": {}, "form": {}}
+        for i, meta in enumerate(self.metadata):
+            if not meta:
+                continue
+            company, form, (self.date_first[i], self.date_last[i]) = chunk_attributes(meta)
+            if company:
+                postings["company"].setdefault(company, []).append(i)
+            if form:
+                postings["form"].setdefault(form, []).append(i)
+        self.postings = {
+            column: {value: np.array(ids, dtype=np.int64) for value, ids in values.items()}
+            for column, values in postings.items()
+        }
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore) -> "ChunkFilterIndex":
+        """Columns for a LangChain FAISS store (metadata of every docstore document, keyed by FAISS id)."""
+        metadata: Dict[int, Dict[str, Any]] = {}
+        for i, docstore_id in vectorstore.index_to_docstore_id.items():
+            doc = vectorstore.docstore.search(docstore_id)
+            metadata[int(i)] = dict(getattr(doc, "metadata", None) or {})
+        return cls(metadata)
+
+    def companies(self) -> List[str]:
+        return sorted(self.postings["company"])
+
+    def _posting_union(self, column: str, values) -> np.ndarray:
+        arrays = [self.postings[column].get(value) for value in _as_set(values)]
+        arrays = [array for array in arrays if array is not None]
+        if not arrays:
+            return np.empty(0, dtype=np.int64)
+        return arrays[0] if len(arrays) == 1 else np.unique(np.concatenate(arrays))
+
+    def select(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Sorted FAISS ids matching every filter
+
+        Args:
+            filters: company/ticker and form (value or list), date_from / date_to
+                ("YYYY", "YYYY-MM" or "YYYY-MM-DD", inclusive), any other key
+                matched against raw metadata (value or list of allowed values)
+
+        Returns:
+            Matching ids, or None when there is nothing to filter on
+        """
+        if not filters:
+            return None
+        mask: Optional[np.ndarray] = None
+
+        def restrict(ids: np.ndarray):
+            nonlocal mask
+            selected = np.zeros(self.size, dtype=bool)
+            selected[ids] = True
+            mask = selected if mask is None else mask & selected
+
+        for key, value in filters.items():
+            if value is None or key in DATE_KEYS:
+                continue
+            if key in COMPANY_KEYS:
+                restrict(self._posting_union("company", value))
+            elif key == "form":
+                restrict(self._posting_union("form", value))
+            else:
+                allowed = set(value) if isinstance(value, (list, tuple, set, frozenset)) else {value}
+                restrict(np.array([i for i, meta in enumerate(self.metadata) if meta.get(key) in allowed], dtype=np.int64))
+
+        date_from, date_to = filters.get("date_from"), filters.get("date_to")
+        if date_from or date_to:
+            start = date_bounds(date_from)[0] if date_from else 1
+            end = date_bounds(date_to)[1] if date_to else 99991231
+            # A chunk matches if the period its file name covers overlaps the range
+            in_range = (self.date_first > 0) & (self.date_last >= start) & (self.date_first <= end)
+            mask = in_range if mask is None else mask & in_range
+
+        if mask is None:
+            return None
+        return np.flatnonzero(mask).astype(np.int64)
+
+
+Hits = Tuple[np.ndarray, np.ndarray]
+
+
+def _exact_scan(index: faiss.Index, queries: np.ndarray, ids: np.ndarray, k: int) -> Optional[List[Hits]]:
+    """Score just the given ids exactly, all query rows in one matrix product; None if the index cannot return stored vectors."""
+    try:
+        vectors = index.reconstruct_batch(ids)
+    except RuntimeError:
+        return None
+    products = queries @ vectors.T
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        order_by = -products
+        scores = products
+    else:
+        scores = (queries ** 2).sum(axis=1, keepdims=True) - 2 * products + (vectors ** 2).sum(axis=1)
+        order_by = scores
+    results = []
+    for row in range(len(queries)):
+        order = np.argsort(order_by[row], kind="stable")[:k]
+        results.append((scores[row][order], ids[order]))
+    return results
+
+
+def filtered_search_batch(
+    index: faiss.Index,
+    queries: np.ndarray,
+    k: int,
+    ids: np.ndarray,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    exact_threshold: int = EXACT_SCAN_THRESHOLD,
+) -> List[Hits]:
+    """
+    Top-k search restricted to the given ids, for every query row at once
+
+    Selective filters are answered by an exact scan of only the matching
+    vectors. Broader ones search the index with an ID selector, widening
+    nprobe / efSearch by the inverse selectivity so approximate indexes
+    still find k matches; if they do not, the exact scan is the fallback.
+
+    Args:
+        index: FAISS index
+        queries: (n, d) float32 queries
+        k: Number of results per query
+        ids: Sorted allowed FAISS ids (ChunkFilterIndex.select)
+        nprobe / ef_search: Per-request knobs, before widening
+        exact_threshold: Use the exact scan at or below this many ids
+
+    Returns:
+        (distances, ids) of each query's hits, best first
+    """
+    if len(ids) == 0:
+        return [(np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)) for _ in range(len(queries))]
+    if len(ids) <= exact_threshold:
+        exact = _exact_scan(index, queries, ids, k)
+        if exact is not None:
+            return exact
+
+    widen = index.ntotal / len(ids)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        nprobe = min(ivf.nlist, math.ceil((nprobe or ivf.nprobe) * widen))
+    # Only used when the index has an HNSW graph
+    ef_search = min(4096, math.ceil(max(ef_search or 64, k) * widen))
+
+    # Chunk ids of an ID-mapped index can run past ntotal
+    n_bits = max(index.ntotal, int(ids[-1]) + 1)
+    mask = np.zeros(n_bits, dtype=bool)
+    mask[ids] = True
+    # IDSelectorBitmap reads bit (id & 7) of byte id >> 3
+    bitmap = np.packbits(mask, bitorder="little")
+    selector = faiss.IDSelectorBitmap(n_bits, faiss.swig_ptr(bitmap))
+    params = search_parameters(index, nprobe=nprobe, ef_search=ef_search, selector=selector)
+    distances, hits = index.search(queries, min(k, len(ids)), params=params)
+    found = hits != -1
+    if (found.sum(axis=1) < min(k, len(ids))).any():
+        exact = _exact_scan(index, queries, ids, k)
+        if exact is not None:
+            return exact
+    return [(distances[row][found[row]], hits[row][found[row]]) for row in range(len(queries))]
+
+
+def filtered_search(
+    index: faiss.Index,
+    query: np.ndarray,
+    k: int,
+    ids: np.ndarray,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    exact_threshold: int = EXACT_SCAN_THRESHOLD,
+) -> Hits:
+    """
+    Top-k search restricted to the given ids (single-query filtered_search_batch)
+
+    Args:
+        query: (1, d) float32 query
+
+    Returns:
+        (distances, ids) of the hits, best first
+    """
+    return filtered_search_batch(index, query, k, ids, nprobe=nprobe, ef_search=ef_search,
+                                 exact_threshold=exact_threshold)[0]
+
+
+def filter_key(filters: Optional[Dict[str, Any]]) -> tuple:
+    """Hashable, order-independent form of a filter dict (for caches)."""
+    if not filters:
+        return ()
+    return tuple(sorted(
+        (key, tuple(sorted(map(str, value))) if isinstance(value, (list, tuple, set, frozenset)) else value)
+        for key, value in filters.items() if value is not None
+    ))
@@ -0,0 +1,471 @@
+"""
+FinSight Copilot - Gemini Client
+Shared, pooled Gemini REST client with deadlines, retries and a circuit breaker
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+DEFAULT_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class GeminiError(Exception):
+    """A Gemini call failed (after retries, where applicable)."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpen(GeminiError):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Gemini circuit open, retry in {retry_after:.0f}s", status_code=503)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls fail fast for `reset_timeout` seconds. Then a single trial call is
+    let through (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """
+        Raise CircuitOpen unless a call may go upstream now
+
+        Returns:
+            True if the call is the half-open trial (pass it to abandon)
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return False
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            elapsed = time.monotonic() - self.opened_at
+            raise CircuitOpen(max(1.0, self.reset_timeout - elapsed))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def abandon(self, trial: bool):
+        """A call ended without a verdict (e.g. cancelled); a trial frees the half-open slot for the next call."""
+        if trial:
+            with self._lock:
+                self._trial_in_flight = False
+
+
+class GeminiStream:
+    """An open upstream response whose body is passed through chunk by chunk."""
+
+    def __init__(self, response: httpx.Response, breaker: CircuitBreaker):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self._breaker = breaker
+
+    async def aiter_bytes(self) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self.response.aiter_bytes():
+                yield chunk
+        except httpx.HTTPError:
+            self._breaker.record_failure()
+            raise
+        finally:
+            await self.response.aclose()
+
+    async def aclose(self):
+        await self.response.aclose()
+
+
+def extract_text(payload: Dict[str, Any]) -> str:
+    """Concatenate the text parts of a generateContent response."""
+    texts = []
+    for candidate in payload.get("candidates") or []:
+        for part in (candidate.get("content") or {}).get("parts") or []:
+            if part.get("text"):
+                texts.append(part["text"])
+        break  # first candidate only
+    return "".join(texts)
+
+
+def text_body(prompt: str) -> Dict[str, Any]:
+    return {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+
+
+class GeminiClient:
+    """
+    Gemini REST client shared by the whole process.
+
+    One keep-alive connection pool per mode (an httpx.AsyncClient for the
+    event loop, an httpx.Client for blocking callers such as llm_engine).
+    Every call has a deadline covering all of its attempts; transport
+    errors and 408/429/5xx responses are retried with full-jitter
+    exponential backoff (honouring Retry-After); and a circuit breaker makes
+    calls fail fast while the upstream keeps failing. `base_url` can point
+    at a local stub server.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gemini-1.5-flash",
+        base_url: str = DEFAULT_API_BASE,
+        timeout: float = 20.0,
+        connect_timeout: float = 5.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        """
+        Initialize the client
+
+        Args:
+            api_key: Gemini API key (sent as the x-goog-api-key header)
+            model: Default model name
+            base_url: API root, e.g. a stub server for tests and load tests
+            timeout: Default deadline per call in seconds, across retries
+            connect_timeout: TCP/TLS connect timeout per attempt
+            max_retries: Retries after the first attempt
+            backoff_base: First backoff ceiling in seconds (doubles per retry)
+            backoff_max: Backoff ceiling cap in seconds
+            max_connections: Connection pool size
+            max_keepalive: Idle keep-alive connections kept in the pool
+            breaker: Circuit breaker (a default one is created if omitted)
+        """
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.breaker = breaker or CircuitBreaker()
+
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._sync_client: Optional[httpx.Client] = None
+        self._client_lock = threading.Lock()
+
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+
+    # ---- Connection pools ----
+    @property
+    def _headers(self) -> Dict[str, str]:
+        return {"x-goog-api-key": self.api_key, "Content-Type": "application/json"}
+
+    def _timeout(self, remaining: float) -> httpx.Timeout:
+        return httpx.Timeout(max(0.05, remaining), connect=min(self.connect_timeout, max(0.05, remaining)))
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(base_url=self.base_url, headers=self._headers, limits=self.limits)
+        return self._async_client
+
+    @property
+    def sync_client(self) -> httpx.Client:
+        with self._client_lock:
+            if self._sync_client is None or self._sync_client.is_closed:
+                self._sync_client = httpx.Client(base_url=self.base_url, headers=self._headers, limits=self.limits)
+            return self._sync_client
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+        self.close()
+
+    def close(self):
+        if self._sync_client is not None:
+            self._sync_client.close()
+
+    # ---- Retry policy ----
+    def _path(self, model: Optional[str], method: str) -> str:
+        return f"/models/{model or self.model}:{method}"
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.backoff_max)
+                except ValueError:
+                    pass
+        # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _admit(self) -> bool:
+        try:
+            trial = self.breaker.before_call()
+        except CircuitOpen:
+            self.rejected += 1
+            raise
+        self.calls += 1
+        return trial
+
+    @contextmanager
+    def _admitted(self):
+        """
+        Admit one call through the breaker and make sure it settles it
+
+        Retries and responses record their own outcome. Anything else that
+        escapes (an unexpected httpx or decoding error) counts as a failure,
+        and a cancelled call (client disconnect, deadline, shutdown) frees
+        the half-open trial slot, so the breaker can never stay wedged.
+        """
+        trial = self._admit()
+        try:
+            yield
+        except GeminiError:
+            raise
+        except Exception:
+            self.failures += 1
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.abandon(trial)
+            raise
+
+    def _record_status(self, status_code: int):
+        # Client errors (bad request, bad key) say nothing about upstream health
+        if status_code >= 500:
+            self.failures += 1
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _give_up(self, message: str, status_code: Optional[int] = None) -> GeminiError:
+        self.failures += 1
+        self.breaker.record_failure()
+        return GeminiError(message, status_code)
+
+    @staticmethod
+    def _error_message(response: httpx.Response) -> str:
+        try:
+            return response.json().get("error", {}).get("message") or response.text[:200]
+        except (ValueError, AttributeError):
+            return response.text[:200]
+
+    # ---- Async API ----
+    async def _send(self, path: str, body: Dict[str, Any], deadline: Optional[float], stream: bool = False,
+                    params: Optional[Dict[str, str]] = None) -> httpx.Response:
+        with self._admitted():
+            end = time.monotonic() + (deadline or self.timeout)
+            attempt = 0
+            while True:
+                remaining = end - time.monotonic()
+                response = None
+                try:
+                    request = self.async_client.build_request(
+                        "POST", path, json=body, params=params, timeout=self._timeout(remaining)
+                    )
+                    response = await self.async_client.send(request, stream=stream)
+                    if response.status_code not in RETRYABLE_STATUS:
+                        self._record_status(response.status_code)
+                        return response
+                    error = f"Gemini returned HTTP {response.status_code}"
+                    if stream:
+                        await response.aread()
+                        await response.aclose()
+                except httpx.TimeoutException:
+                    error = "Gemini request timed out"
+                except httpx.TransportError as e:
+                    error = f"Gemini connection error: {e}"
+
+                delay = self._backoff(attempt, response)
+                if attempt >= self.max_retries or time.monotonic() + delay >= end:
+                    if response is not None and response.status_code in RETRYABLE_STATUS:
+                        if not stream:
+                            error = f"{error}: {self._error_message(response)}"
+                        raise self._give_up(error, response.status_code)
+                    raise self._give_up(error, 504)
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
+
+    async def generate_content(self, body: Dict[str, Any], model: Optional[str] = None,
+                               deadline: Optional[float] = None) -> httpx.Response:
+        """
+        POST :generateContent with retries; the response is returned as is (any status)
+
+        Args:
+            body: Gemini request body
+            model: Model override
+            deadline: Seconds allowed for the whole call including retries
+        """
+        return await self._send(self._path(model, "generateContent"), body, deadline)
+
+    async def generate_text(self, prompt: str, model: Optional[str] = None, deadline: Optional[float] = None) -> str:
+        """
+        Generate a plain-text answer for a prompt
+
+        Raises:
+            GeminiError: On non-success responses or once retries are exhausted
+            CircuitOpen: While the breaker is open
+        """
+        response = await self.generate_content(text_body(prompt), model=model, deadline=deadline)
+        if response.status_code >= 400:
+            raise GeminiError(f"Gemini returned HTTP {response.status_code}: {self._error_message(response)}",
+                              response.status_code)
+        return extract_text(response.json())
+
+    async def open_stream(self, body: Dict[str, Any], model: Optional[str] = None, sse: bool = True,
+                          deadline: Optional[float] = None) -> GeminiStream:
+        """
+        Open an upstream response for chunked passthrough
+
+        Retries only happen before the first byte is received; after that the
+        caller owns the stream and must exhaust or close it.
+
+        Args:
+            body: Gemini request body
+            model: Model override
+            sse: Use :streamGenerateContent?alt=sse (otherwise :generateContent)
+            deadline: Seconds allowed for the whole call including retries
+        """
+        if sse:
+            response = await self._send(self._path(model, "streamGenerateContent"), body, deadline,
+                                        stream=True, params={"alt": "sse"})
+        else:
+            response = await self._send(self._path(model, "generateContent"), body, deadline, stream=True)
+        return GeminiStream(response, self.breaker)
+
+    async def stream_text(self, prompt: str, model: Optional[str] = None, deadline: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Stream answer text pieces via server-sent events
+
+        Raises:
+            GeminiError: On non-success responses or once retries are exhausted
+        """
+        stream = await self.open_stream(text_body(prompt), model=model, deadline=deadline)
+        try:
+            if stream.status_code >= 400:
+                await stream.response.aread()
+                raise GeminiError(f"Gemini returned HTTP {stream.status_code}: {self._error_message(stream.response)}",
+                                  stream.status_code)
+            async for line in stream.response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if not data or data == "[DONE]":
+                    continue
+                text = extract_text(json.loads(data))
+                if text:
+                    yield text
+        finally:
+            await stream.aclose()
+
+    # ---- Blocking API (for callers outside the event loop) ----
+    def generate_text_sync(self, prompt: str, model: Optional[str] = None, deadline: Optional[float] = None) -> str:
+        """Blocking generate_text, sharing the retry policy and circuit breaker."""
+        with self._admitted():
+            end = time.monotonic() + (deadline or self.timeout)
+            attempt = 0
+            while True:
+                response = None
+                try:
+                    response = self.sync_client.post(
+                        self._path(model, "generateContent"),
+                        json=text_body(prompt),
+                        timeout=self._timeout(end - time.monotonic())
+                    )
+                    if response.status_code not in RETRYABLE_STATUS:
+                        self._record_status(response.status_code)
+                        if response.status_code >= 400:
+                            message = f"Gemini returned HTTP {response.status_code}: {self._error_message(response)}"
+                            raise GeminiError(message, response.status_code)
+                        return extract_text(response.json())
+                    error = f"Gemini returned HTTP {response.status_code}"
+                except httpx.TimeoutException:
+                    error = "Gemini request timed out"
+                except httpx.TransportError as e:
+                    error = f"Gemini connection error: {e}"
+
+                delay = self._backoff(attempt, response)
+                if attempt >= self.max_retries or time.monotonic() + delay >= end:
+                    raise self._give_up(error, response.status_code if response is not None else 504)
+                attempt += 1
+                self.retries += 1
+                time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Call, retry and breaker counters for health and metrics endpoints."""
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected_open_circuit": self.rejected,
+            "circuit": self.breaker.state,
+        }
+
+
+_client: Optional[GeminiClient] = None
+_client_lock = threading.Lock()
+
+
+def get_gemini_client() -> GeminiClient:
+    """Process-wide client configured from the environment."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GeminiClient(
+                api_key=os.getenv("GEMINI_API_KEY", ""),
+                model=os.getenv("GEMINI_MODEL", "gemini-1.5-flash"),
+                base_url=os.getenv("GEMINI_API_BASE", DEFAULT_API_BASE),
+                timeout=float(os.getenv("GEMINI_TIMEOUT", "20")),
+                max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "2")),
+                max_connections=int(os.getenv("GEMINI_MAX_CONNECTIONS", "20")),
+                breaker=CircuitBreaker(
+                    failure_threshold=int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5")),
+                    reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET", "30")),
+                ),
+            )
+        return _client
@@ -0,0 +1,463 @@
+"""
+FinSight Copilot - Continuous Batching Scheduler
+Iteration-level scheduling of local causal-LM generation across concurrent requests
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import torch
+
+from finsight_app.metrics import record_generation
+
+try:
+    from transformers import DynamicCache
+except ImportError:  # very old transformers: legacy tuple caches only
+    DynamicCache = None
+
+KVLayers = List[Tuple[torch.Tensor, torch.Tensor]]
+
+
+@dataclass
+class GenerationRequest:
+    """One prompt being decoded inside the running batch."""
+    prompt_ids: List[int]
+    max_tokens: int
+    temperature: float
+    top_p: float
+    stop_sequences: Sequence[str]
+    future: Future
+    on_text: Optional[Callable[[Optional[str]], None]] = None
+    generated: List[int] = field(default_factory=list)
+    text: str = ""
+    emitted: int = 0
+    finish_reason: Optional[str] = None
+    cancelled: bool = False
+    submitted_at: float = field(default_factory=time.time)
+
+    def cancel(self):
+        """Retire this request at the next decode step."""
+        self.cancelled = True
+
+
+def _cache_layers(cache) -> KVLayers:
+    """Extract per-layer (key, value) tensors of shape [batch, heads, seq, dim]."""
+    if isinstance(cache, (tuple, list)):
+        return [(layer[0], layer[1]) for layer in cache]
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    if hasattr(cache, "key_cache"):
+        return list(zip(cache.key_cache, cache.value_cache))
+    return [(layer[0], layer[1]) for layer in cache.to_legacy_cache()]
+
+
+def _build_cache(layers: KVLayers):
+    """Wrap (key, value) tensors back into the cache type the model expects."""
+    if DynamicCache is None:
+        return tuple(layers)
+    cache = DynamicCache()
+    for layer_idx, (key, value) in enumerate(layers):
+        cache.update(key, value, layer_idx)
+    return cache
+
+
+def _left_pad(tensor: torch.Tensor, length: int, dim: int) -> torch.Tensor:
+    missing = length - tensor.shape[dim]
+    if missing <= 0:
+        return tensor
+    shape = list(tensor.shape)
+    shape[dim] = missing
+    return torch.cat([tensor.new_zeros(shape), tensor], dim=dim)
+
+
+class ContinuousBatchScheduler:
+    """
+    Continuous (iteration-level) batching for a Hugging Face causal LM.
+
+    A single background thread owns the model. Before every decode step it
+    admits waiting prompts: they are prefilled together, left-padded, and
+    their KV cache is merged into the running batch. After every step,
+    sequences that hit EOS, their own `max_tokens` or one of their stop
+    sequences are retired and their rows dropped from the cache, so new
+    requests never wait for the longest generation in the batch to finish.
+    Padding is tracked through the attention mask and position ids are
+    derived from it, so each row decodes exactly as it would alone.
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        device: str = "cpu",
+        max_batch_size: int = 8,
+        max_context: Optional[int] = None,
+    ):
+        """
+        Initialize the scheduler
+
+        Args:
+            model: Causal LM (AutoModelForCausalLM)
+            tokenizer: Matching tokenizer
+            device: Device the model lives on
+            max_batch_size: Maximum number of sequences decoded together
+            max_context: Longest padded sequence allowed (defaults to the model's position limit)
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.max_batch_size = max_batch_size
+        config = getattr(model, "config", None)
+        self.max_context = max_context or getattr(config, "n_positions", None) \
+            or getattr(config, "max_position_embeddings", None) or 2048
+        self.eos_token_id = tokenizer.eos_token_id
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+        self._waiting: "queue.Queue[GenerationRequest]" = queue.Queue()
+        self._deferred: Optional[GenerationRequest] = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Running batch state (only touched by the scheduler thread)
+        self._active: List[GenerationRequest] = []
+        self._cache: Optional[KVLayers] = None
+        self._attention_mask: Optional[torch.Tensor] = None
+        self._next_tokens: Optional[torch.Tensor] = None
+
+        self.steps = 0
+        self.tokens_generated = 0
+        self.completed = 0
+        self.batch_size_sum = 0
+
+    # ---- Lifecycle ----
+    def start(self):
+        """Start the decode loop thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._loop, name="finsight-generation", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Stop the decode loop; requests still in flight fail."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # ---- Public API ----
+    def submit(
+        self,
+        prompt: str,
+        max_tokens: int = 512,
+        temperature: float = 0.3,
+        top_p: float = 0.9,
+        stop_sequences: Optional[Sequence[str]] = None,
+        on_text: Optional[Callable[[Optional[str]], None]] = None,
+    ) -> Tuple[GenerationRequest, Future]:
+        """
+        Queue a prompt for generation
+
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens to generate for this request
+            temperature: Sampling temperature (<= 0 decodes greedily)
+            top_p: Nucleus sampling threshold
+            stop_sequences: Strings that end this request's generation
+            on_text: Called on the scheduler thread with each new piece of text, then None at the end
+
+        Returns:
+            (request handle, Future resolving to the LocalHuggingFaceEngine.generate result dict)
+        """
+        if self._stopped.is_set():
+            raise RuntimeError("Generation scheduler is stopped")
+        max_tokens = max(1, min(max_tokens, self.max_context - 1))
+        prompt_ids = self.tokenizer(
+            prompt,
+            truncation=True,
+            max_length=self.max_context - max_tokens
+        )["input_ids"] or [self.eos_token_id]
+
+        request = GenerationRequest(
+            prompt_ids=list(prompt_ids),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            stop_sequences=[s for s in (stop_sequences or []) if s],
+            future=Future(),
+            on_text=on_text,
+        )
+        self._waiting.put(request)
+        self._wakeup.set()
+        return request, request.future
+
+    @property
+    def active(self) -> int:
+        return len(self._active)
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting.qsize() + (1 if self._deferred is not None else 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """Scheduler counters for health and metrics endpoints."""
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "steps": self.steps,
+            "tokens_generated": self.tokens_generated,
+            "completed": self.completed,
+            "avg_batch_size": round(self.batch_size_sum / self.steps, 2) if self.steps else 0.0,
+            "max_batch_size": self.max_batch_size,
+        }
+
+    # ---- Decode loop ----
+    def _loop(self):
+        while not self._stopped.is_set():
+            if not self._active and self._deferred is None and self._waiting.empty():
+                self._wakeup.wait(0.5)
+                self._wakeup.clear()
+                continue
+            try:
+                with torch.no_grad():
+                    self._admit()
+                    if self._active:
+                        self._decode_step()
+            except Exception as e:
+                print(f"❌ Generation scheduler step failed: {e}")
+                self._fail_active(e)
+
+        error = RuntimeError("Generation scheduler stopped")
+        self._fail_active(error)
+        pending = [self._deferred] if self._deferred is not None else []
+        self._deferred = None
+        while not self._waiting.empty():
+            pending.append(self._waiting.get_nowait())
+        for request in pending:
+            if not request.future.done():
+                request.future.set_exception(error)
+
+    def _fits(self, request: GenerationRequest) -> bool:
+        """Whether admitting the request keeps every padded row inside the context window."""
+        current = self._attention_mask.shape[1] if self._attention_mask is not None else 0
+        length = max(current, len(request.prompt_ids))
+        remaining = max([r.max_tokens - len(r.generated) for r in self._active] + [request.max_tokens])
+        return length + remaining <= self.max_context
+
+    def _admit(self):
+        new: List[GenerationRequest] = []
+        while len(self._active) + len(new) < self.max_batch_size:
+            if self._deferred is not None:
+                request, self._deferred = self._deferred, None
+            else:
+                try:
+                    request = self._waiting.get_nowait()
+                except queue.Empty:
+                    break
+            if request.cancelled:
+                self._finish(request, "cancelled")
+                continue
+            if (self._active or new) and not self._fits(request):
+                # Wait for the batch to drain a little before padding it further
+                self._deferred = request
+                break
+            new.append(request)
+        if new:
+            try:
+                self._prefill(new)
+            except Exception as e:
+                for request in new:
+                    if request not in self._active and not request.future.done():
+                        request.future.set_exception(e)
+                raise
+
+    def _prefill(self, requests: List[GenerationRequest]):
+        length = max(len(r.prompt_ids) for r in requests)
+        input_ids = torch.full((len(requests), length), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(requests), length), dtype=torch.long)
+        for row, request in enumerate(requests):
+            ids = request.prompt_ids
+            input_ids[row, length - len(ids):] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, length - len(ids):] = 1
+        input_ids = input_ids.to(self.device)
+        attention_mask = attention_mask.to(self.device)
+        position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            use_cache=True
+        )
+        next_tokens = self._sample(outputs.logits[:, -1, :], requests)
+        self._merge(requests, _cache_layers(outputs.past_key_values), attention_mask, next_tokens)
+        # New rows sit at the end of the running batch
+        self._record(requests, next_tokens)
+
+    def _merge(self, requests, layers: KVLayers, attention_mask: torch.Tensor, next_tokens: torch.Tensor):
+        """Append freshly prefilled rows to the running batch, left-padding whichever side is shorter."""
+        if not self._active:
+            self._active = list(requests)
+            self._cache = layers
+            self._attention_mask = attention_mask
+            self._next_tokens = next_tokens
+            return
+        length = max(self._attention_mask.shape[1], attention_mask.shape[1])
+        self._cache = [
+            (
+                torch.cat([_left_pad(old_k, length, 2), _left_pad(new_k, length, 2)], dim=0),
+                torch.cat([_left_pad(old_v, length, 2), _left_pad(new_v, length, 2)], dim=0),
+            )
+            for (old_k, old_v), (new_k, new_v) in zip(self._cache, layers)
+        ]
+        self._attention_mask = torch.cat(
+            [_left_pad(self._attention_mask, length, 1), _left_pad(attention_mask, length, 1)], dim=0
+        )
+        self._next_tokens = torch.cat([self._next_tokens, next_tokens], dim=0)
+        self._active.extend(requests)
+
+    def _decode_step(self):
+        batch = len(self._active)
+        attention_mask = torch.cat([self._attention_mask, self._attention_mask.new_ones((batch, 1))], dim=1)
+        position_ids = self._attention_mask.sum(dim=-1, keepdim=True)
+
+        outputs = self.model(
+            input_ids=self._next_tokens.unsqueeze(-1),
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=_build_cache(self._cache),
+            use_cache=True
+        )
+        self._cache = _cache_layers(outputs.past_key_values)
+        self._attention_mask = attention_mask
+        self._next_tokens = self._sample(outputs.logits[:, -1, :], self._active)
+
+        self.steps += 1
+        self.batch_size_sum += batch
+        self._record(self._active, self._next_tokens)
+
+    def _sample(self, logits: torch.Tensor, requests: Sequence[GenerationRequest]) -> torch.Tensor:
+        """Per-row temperature / top-p sampling (greedy for temperature <= 0)."""
+        logits = logits.float()
+        temperatures = torch.tensor([r.temperature for r in requests], device=logits.device)
+        greedy = temperatures <= 0
+        if bool(greedy.all()):
+            return logits.argmax(dim=-1)
+
+        scaled = logits / temperatures.clamp(min=1e-5).unsqueeze(-1)
+        probs = torch.softmax(scaled, dim=-1)
+        sorted_probs, sorted_idx = probs.sort(dim=-1, descending=True)
+        top_p = torch.tensor([r.top_p for r in requests], device=logits.device).unsqueeze(-1)
+        # Drop tokens once the probability mass before them already exceeds top_p
+        outside = (sorted_probs.cumsum(dim=-1) - sorted_probs) > top_p
+        sorted_probs = sorted_probs.masked_fill(outside, 0.0)
+        choice = torch.multinomial(sorted_probs, num_samples=1)
+        sampled = sorted_idx.gather(-1, choice).squeeze(-1)
+        return torch.where(greedy, logits.argmax(dim=-1), sampled)
+
+    def _record(self, requests: Sequence[GenerationRequest], next_tokens: torch.Tensor):
+        """Append sampled tokens to the last len(requests) rows, stream new text, retire finished rows."""
+        offset = len(self._active) - len(requests)
+        finished = set()
+        for row, (request, token) in enumerate(zip(requests, next_tokens.tolist())):
+            reason = None
+            if request.cancelled:
+                reason = "cancelled"
+            elif token == self.eos_token_id:
+                reason = "stop"
+            else:
+                request.generated.append(token)
+                self.tokens_generated += 1
+                reason = self._update_text(request)
+                if reason is None and len(request.generated) >= request.max_tokens:
+                    reason = "length"
+            if reason is not None:
+                finished.add(offset + row)
+                self._finish(request, reason)
+
+        if finished:
+            self._retire([row for row in range(len(self._active)) if row not in finished])
+
+    def _update_text(self, request: GenerationRequest) -> Optional[str]:
+        request.text = self.tokenizer.decode(request.generated, skip_special_tokens=True)
+        reason = None
+        hits = [request.text.find(stop) for stop in request.stop_sequences]
+        hits = [i for i in hits if i >= 0]
+        if hits:
+            request.text = request.text[:min(hits)]
+            reason = "stop"
+        elif request.text.endswith("�"):
+            # Incomplete multi-byte character; wait for the next token
+            return None
+
+        if request.on_text is not None and len(request.text) > request.emitted:
+            piece = request.text[request.emitted:]
+            request.emitted = len(request.text)
+            try:
+                request.on_text(piece)
+            except Exception as e:
+                print(f"⚠️ Stream consumer failed: {e}")
+                request.cancelled = True
+        return reason
+
+    def _retire(self, keep: List[int]):
+        if not keep:
+            self._active = []
+            self._cache = None
+            self._attention_mask = None
+            self._next_tokens = None
+            return
+        index = torch.tensor(keep, dtype=torch.long, device=self._attention_mask.device)
+        attention_mask = self._attention_mask.index_select(0, index)
+        # Drop leading columns that are padding for every remaining row
+        start = int((attention_mask.sum(dim=0) > 0).nonzero()[0]) if attention_mask.shape[1] else 0
+        self._attention_mask = attention_mask[:, start:]
+        self._cache = [
+            (key.index_select(0, index)[:, :, start:], value.index_select(0, index)[:, :, start:])
+            for key, value in self._cache
+        ]
+        self._next_tokens = self._next_tokens.index_select(0, index)
+        self._active = [self._active[i] for i in keep]
+
+    def _finish(self, request: GenerationRequest, reason: str):
+        request.finish_reason = reason
+        self.completed += 1
+        if request.on_text is not None:
+            try:
+                request.on_text(None)
+            except Exception:
+                pass
+        if not request.future.done():
+            prompt_tokens = len(request.prompt_ids)
+            completion_tokens = len(request.generated)
+            response_time = time.time() - request.submitted_at
+            record_generation("local_hf_batched", completion_tokens, response_time)
+            request.future.set_result({
+                "choices": [{
+                    "text": request.text.strip(),
+                    "finish_reason": reason
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                },
+                "response_time": response_time
+            })
+
+    def _fail_active(self, error: Exception):
+        for request in self._active:
+            if request.on_text is not None:
+                try:
+                    request.on_text(None)
+                except Exception:
+                    pass
+            if not request.future.done():
+                request.future.set_exception(error)
+        self._active = []
+        self._cache = None
+        self._attention_mask = None
+        self._next_tokens = None
@@ -0,0 +1,385 @@
+"""
+FinSight Copilot - Index Specs
+Pluggable FAISS index types (Flat, IVF-Flat, IVF-PQ, HNSW, scalar / product quantized),
+their build parameters and per-request search knobs (nprobe, efSearch, refine depth)
+"""
+
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+INDEX_PARAMS_FILE = "index_params.json"
+
+# Preset name -> faiss.index_factory template
+PRESETS = {
+    "flat": "Flat",
+    "ivf-flat": "IVF{nlist},Flat",
+    "ivf-pq": "IVF{nlist},PQ{pq_m}x8",
+    "hnsw": "HNSW{hnsw_m},Flat",
+    # Compressed storage: 2x (fp16) or 4x (int8) smaller than float32; ivf-pq above
+    # stores d*4/pq_m x smaller codes (a bare PQ index cannot apply ID selectors)
+    "sqfp16": "SQfp16",
+    "sq8": "SQ8",
+    "ivf-sq8": "IVF{nlist},SQ8",
+    "hnsw-sq8": "HNSW{hnsw_m},SQ8",
+}
+
+METRICS = {"l2": faiss.METRIC_L2, "ip": faiss.METRIC_INNER_PRODUCT}
+
+ADD_BATCH_SIZE = 65536
+
+
+@dataclass
+class IndexSpec:
+    """
+    What index to build and how to search it by default.
+
+    Written as "<preset>[:key=value,...]", e.g. "hnsw:M=48", "ivf-pq:nlist=1024,m=48"
+    or "ivf-flat:nprobe=32". Anything else is taken as a raw faiss.index_factory
+    string ("IVF4096,SQ8"). Unset sizes are derived from the corpus at build time.
+
+    refine=N keeps the float32 vectors beside compressed codes and re-ranks the
+    top k*N candidates exactly ("sq8:refine=4"); the float32 store is memory-
+    mapped at load, so only the candidates' pages are read.
+    """
+    kind: str = "flat"
+    factory: Optional[str] = None  # raw index_factory string (kind == "factory")
+    metric: str = "l2"
+    nlist: Optional[int] = None
+    pq_m: Optional[int] = None
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    train_size: Optional[int] = None
+    nprobe: int = 16
+    ef_search: int = 64
+    refine: int = 0  # k_factor of a float32 re-ranking stage (0: none)
+
+    @classmethod
+    def parse(cls, text: str) -> "IndexSpec":
+        """Parse a spec string (see class docstring)."""
+        text = (text or "flat").strip()
+        name, _, options = text.partition(":")
+        if name.lower() not in PRESETS:
+            return cls(kind="factory", factory=text)
+
+        spec = cls(kind=name.lower())
+        fields = {key: type(value) for key, value in asdict(cls()).items()}
+        for option in filter(None, (part.strip() for part in options.split(","))):
+            key, _, value = option.partition("=")
+            key = key.strip().lower().replace("efsearch", "ef_search").replace("efconstruction", "ef_construction")
+            if key == "m":
+                key = "pq_m" if "pq" in spec.kind else "hnsw_m"
+            if key not in fields or key in ("kind", "factory"):
+                raise ValueError(f"Unknown index spec option '{key}' in '{text}'")
+            setattr(spec, key, value.strip() if key == "metric" else int(value))
+        if spec.metric not in METRICS:
+            raise ValueError(f"Unknown metric '{spec.metric}' (expected one of {sorted(METRICS)})")
+        return spec
+
+    def resolve(self, dimension: int, count: int) -> Tuple[str, Dict[str, Any]]:
+        """
+        Concrete factory string for a corpus size
+
+        Returns:
+            (factory string, resolved sizes)
+        """
+        sizes: Dict[str, Any] = {}
+        refine = ",RFlat" if self.refine else ""
+        if self.kind == "factory":
+            return self.factory + refine, sizes
+        if "{nlist}" in PRESETS[self.kind]:
+            # ~4*sqrt(n) lists, with at least 39 training points per centroid
+            sizes["nlist"] = self.nlist or max(1, min(4 * int(np.sqrt(count)), count // 39))
+        if "{pq_m}" in PRESETS[self.kind]:
+            sizes["pq_m"] = self.pq_m or default_pq_m(dimension)
+            if dimension % sizes["pq_m"]:
+                raise ValueError(f"pq_m={sizes['pq_m']} does not divide dimension {dimension}")
+        if "{hnsw_m}" in PRESETS[self.kind]:
+            sizes["hnsw_m"] = self.hnsw_m
+        return PRESETS[self.kind].format(**sizes) + refine, sizes
+
+
+def default_pq_m(dimension: int) -> int:
+    """Largest sub-quantizer count with at least 8 dimensions each that divides the dimension."""
+    for m in range(max(1, dimension // 8), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+# ---- Building ----
+def build_index(vectors: np.ndarray, spec: IndexSpec, seed: int = 0,
+                ids: Optional[np.ndarray] = None) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """
+    Build, train and fill an index for the given vectors
+
+    Trainable indexes (IVF, PQ) are trained on a random sample rather than the
+    whole corpus: k-means cost grows with the sample, quality barely does.
+
+    Args:
+        vectors: (n, d) float32 embeddings
+        spec: Index spec
+        seed: Sampling seed, so rebuilds are reproducible
+        ids: Stable chunk ids, so searches return these ids and chunks can later
+            be added / deleted by id (IVF indexes store ids in their inverted
+            lists; other types are wrapped in an IndexIDMap2)
+
+    Returns:
+        (index, build parameters to persist with save_index_params)
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dimension = vectors.shape
+    factory, sizes = spec.resolve(dimension, count)
+    start = time.perf_counter()
+    index = faiss.index_factory(dimension, factory, METRICS[spec.metric])
+
+    trained_on = 0
+    if not index.is_trained:
+        train_size = min(count, spec.train_size or max(64 * sizes.get("nlist", 256), 10000))
+        sample = vectors
+        if train_size < count:
+            sample = vectors[np.random.default_rng(seed).choice(count, train_size, replace=False)]
+        print(f"🏋️ Training {factory} on {len(sample)} of {count} vectors...")
+        index.train(sample)
+        trained_on = len(sample)
+
+    hnsw = _find(index, faiss.IndexHNSW)
+    if hnsw is not None:
+        hnsw.hnsw.efConstruction = spec.ef_construction
+    refine = _find(index, faiss.IndexRefine)
+    if refine is not None and spec.refine:
+        refine.k_factor = float(spec.refine)
+    if ids is not None:
+        if not _stores_ids(index):
+            index = faiss.IndexIDMap2(index)
+        ids = np.ascontiguousarray(ids, dtype=np.int64)
+    for begin in range(0, count, ADD_BATCH_SIZE):
+        if ids is None:
+            index.add(vectors[begin:begin + ADD_BATCH_SIZE])
+        else:
+            index.add_with_ids(vectors[begin:begin + ADD_BATCH_SIZE], ids[begin:begin + ADD_BATCH_SIZE])
+    apply_search_defaults(index, nprobe=spec.nprobe, ef_search=spec.ef_search)
+
+    params = {
+        "spec": asdict(spec),
+        "factory": factory,
+        "metric": spec.metric,
+        "dimension": dimension,
+        "ntotal": int(index.ntotal),
+        "trained_on": trained_on,
+        "build_seconds": round(time.perf_counter() - start, 3),
+        "nprobe": spec.nprobe,
+        "ef_search": spec.ef_search,
+        "refine": spec.refine,
+        "faiss_version": faiss.__version__,
+        **sizes,
+    }
+    print(f"✅ Built {factory} index with {index.ntotal} vectors in {params['build_seconds']}s")
+    return index, params
+
+
+def enable_reconstruct(index: faiss.Index, sequential: bool = False):
+    """
+    Let an IVF index reconstruct vectors by id (others can already)
+
+    Builds the id -> inverted-list position map IVF indexes are loaded without.
+
+    Args:
+        sequential: Ids are 0..ntotal-1 (array map); otherwise a hashtable, which
+            resolves arbitrary ids and, unlike the array map, still allows remove_ids
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.set_direct_map_type(faiss.DirectMap.Array if sequential else faiss.DirectMap.Hashtable)
+
+
+def stored_vectors(index: faiss.Index, ids: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Vectors held by an index (decoded, so approximate for PQ / SQ codes)
+
+    Args:
+        ids: Ids to reconstruct (default: 0..ntotal-1 for indexes without custom ids)
+    """
+    enable_reconstruct(index, sequential=ids is None)
+    if ids is None:
+        return index.reconstruct_n(0, index.ntotal)
+    return index.reconstruct_batch(np.ascontiguousarray(ids, dtype=np.int64))
+
+
+def to_id_map(index: faiss.Index) -> faiss.Index:
+    """
+    The index in a form that adds / deletes by id, with the ids it already has (0..ntotal-1)
+
+    IVF indexes keep ids in their inverted lists and are returned as is.
+    Flat / HNSW / refined indexes address vectors by position; their vectors are
+    re-added to an emptied copy inside an IndexIDMap2, which keeps results
+    identical while allowing add / delete by id from then on.
+    """
+    # The caller's object owns the index; a downcast proxy does not, so return the original
+    if isinstance(faiss.downcast_index(index), faiss.IndexIDMap2) or _stores_ids(index):
+        return index
+    vectors = stored_vectors(index)
+    empty = faiss.clone_index(index)
+    empty.reset()
+    mapped = faiss.IndexIDMap2(empty)
+    mapped.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+    return mapped
+
+
+def remove_ids(index: faiss.Index, ids: np.ndarray) -> bool:
+    """
+    Remove ids in place where the index type supports it
+
+    Returns:
+        False when the index cannot remove (HNSW, refine) and must be rebuilt
+    """
+    inner = faiss.downcast_index(index)
+    if isinstance(inner, faiss.IndexIDMap2):
+        inner = faiss.downcast_index(inner.index)
+        # Only flat code storage renumbers the remaining vectors the way the id map expects
+        if not isinstance(inner, faiss.IndexFlatCodes):
+            return False
+    elif not _stores_ids(inner):
+        return False
+    index.remove_ids(faiss.IDSelectorBatch(np.ascontiguousarray(ids, dtype=np.int64)))
+    return True
+
+
+def read_index_mmap(path: str, refine: bool = False) -> faiss.Index:
+    """
+    Read an index memory-mapped and read-only
+
+    IO_FLAG_MMAP covers inverted lists (IVF); IO_FLAG_MMAP_IFC covers flat code
+    storage, including the float32 store of a refine stage. Some IVF variants
+    (IVF-PQ) refuse the combination; those fall back to mapping whichever part
+    is larger: the float32 refine store if there is one, else the lists.
+
+    Args:
+        refine: The index has a refine stage (index_params.json "refine")
+    """
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    if not ifc:
+        return faiss.read_index(path, flags)
+    attempts = [flags | ifc, ifc | faiss.IO_FLAG_READ_ONLY, flags] if refine else [flags | ifc, flags]
+    for attempt in attempts[:-1]:
+        try:
+            return faiss.read_index(path, attempt)
+        except RuntimeError:
+            pass
+    return faiss.read_index(path, attempts[-1])
+
+
+def save_index_params(index_dir: str, params: Dict[str, Any]):
+    """Write build parameters next to index.faiss."""
+    with open(os.path.join(index_dir, INDEX_PARAMS_FILE), "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+
+
+def load_index_params(index_dir: str) -> Dict[str, Any]:
+    """Build parameters saved with the index, or {} for indexes built before specs existed."""
+    path = os.path.join(index_dir, INDEX_PARAMS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---- Searching ----
+def _stores_ids(index: faiss.Index) -> bool:
+    """True if add_with_ids / remove_ids work on the index itself (IVF, possibly behind a pre-transform)."""
+    return faiss.try_extract_index_ivf(index) is not None and _find(index, faiss.IndexRefine) is None
+
+
+def _find(index: faiss.Index, kind):
+    """The first index of a given type inside ID-map / pre-transform / refine wrappers, or None."""
+    index = faiss.downcast_index(index)
+    while True:
+        if isinstance(index, kind):
+            return index
+        inner = getattr(index, "index", None) or getattr(index, "base_index", None)
+        if inner is None:
+            return None
+        index = faiss.downcast_index(inner)
+
+
+def apply_search_defaults(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Set the index's default query-time knobs (ignored where they do not apply)."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = min(int(nprobe), ivf.nlist)
+    hnsw = _find(index, faiss.IndexHNSW)
+    if hnsw is not None and ef_search:
+        hnsw.hnsw.efSearch = int(ef_search)
+
+
+def search_parameters(index: faiss.Index, nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None,
+                      selector: Optional[faiss.IDSelector] = None,
+                      k_factor: Optional[float] = None) -> Optional[faiss.SearchParameters]:
+    """
+    Per-request search parameters for an index, without touching its defaults
+
+    Args:
+        selector: Optional ID selector restricting which ids may be returned
+            (the caller keeps it and its backing array alive during the search)
+        k_factor: Candidates re-ranked in float32 per result, for refined indexes
+
+    Returns:
+        SearchParametersIVF / SearchParametersHNSW / SearchParameters, or None when
+        nothing applies (e.g. flat indexes, no selector) so callers can search exactly as before
+    """
+    refine = _find(index, faiss.IndexRefine)
+    if refine is not None:
+        return _refine_parameters(index, refine, nprobe, ef_search, selector, k_factor)
+    extra = {"sel": selector} if selector is not None else {}
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and (nprobe or selector is not None):
+        return faiss.SearchParametersIVF(nprobe=min(int(nprobe or ivf.nprobe), ivf.nlist), **extra)
+    hnsw = _find(index, faiss.IndexHNSW)
+    if hnsw is not None and (ef_search or selector is not None):
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search or hnsw.hnsw.efSearch), **extra)
+    if selector is not None:
+        return faiss.SearchParameters(**extra)
+    return None
+
+
+def _refine_parameters(index: faiss.Index, refine: faiss.IndexRefine, nprobe, ef_search, selector, k_factor):
+    """
+    Parameters for a refined index: the knobs and the selector go to the base index
+
+    IndexRefine ignores a top-level selector, so it is handed to the base
+    index instead, translated from chunk ids to positions when an id map
+    sits on top.
+    """
+    base_selector = selector
+    id_map = faiss.downcast_index(index)
+    if selector is not None and isinstance(id_map, faiss.IndexIDMap2):
+        base_selector = faiss.IDSelectorTranslated(id_map.id_map, selector)
+    base = search_parameters(refine.base_index, nprobe=nprobe, ef_search=ef_search, selector=base_selector)
+    if base is None and not k_factor:
+        return None
+    params = faiss.IndexRefineSearchParameters(k_factor=float(k_factor or refine.k_factor), base_index_params=base)
+    # faiss keeps raw pointers to these for the duration of the search
+    params.referenced_objects = [base, base_selector]
+    return params
+
+
+def describe_index(index: faiss.Index) -> Dict[str, Any]:
+    """Index type and current default knobs, for stats endpoints."""
+    info: Dict[str, Any] = {"index_type": type(faiss.downcast_index(index)).__name__, "ntotal": int(index.ntotal)}
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        info.update(nlist=ivf.nlist, nprobe=ivf.nprobe)
+    hnsw = _find(index, faiss.IndexHNSW)
+    if hnsw is not None:
+        info.update(ef_search=hnsw.hnsw.efSearch)
+    refine = _find(index, faiss.IndexRefine)
+    if refine is not None:
+        info.update(refine_k_factor=refine.k_factor)
+    return info
@@ -0,0 +1,245 @@
+"""
+FinSight Copilot - Lexical Index
+Persistent BM25 inverted index (CSR arrays, memory-mapped at startup)
+and reciprocal-rank fusion with vector search
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+LEXICAL_DIR = "lexical"
+VOCAB_FILE = "vocab.json"
+PARAMS_FILE = "lexical_params.json"
+
+# Rank constant from the original RRF paper; larger values flatten the head of each ranking
+RRF_K = 60
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+_THOUSANDS_RE = re.compile(r"(?<=\d),(?=\d{3})")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "what which who how did does do".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased terms; numbers keep decimals and lose thousands separators ("1,234.5" -> "1234.5"),
+    so tickers, figures and line-item names match literally
+    """
+    text = _THOUSANDS_RE.sub("", text.lower())
+    return [token for token in _TOKEN_RE.findall(text) if token not in STOPWORDS]
+
+
+def lexical_dir(index_dir: str) -> str:
+    return os.path.join(index_dir, LEXICAL_DIR)
+
+
+def lexical_index_exists(index_dir: str) -> bool:
+    return os.path.exists(os.path.join(lexical_dir(index_dir), PARAMS_FILE))
+
+
+def build_lexical_index(texts: Iterable[str], out_dir: str, k1: float = 1.2, b: float = 0.75,
+                        chunk_ids: Optional[Sequence[int]] = None) -> Dict[str, Any]:
+    """
+    Build and save a BM25 index; document i is FAISS id i unless chunk_ids are given
+
+    Each posting stores its final BM25 weight (idf and length normalisation
+    applied at build time), so a query only sums weights over its terms'
+    posting lists.
+
+    Args:
+        texts: Chunk texts in FAISS id order
+        out_dir: Output directory (usually <index_dir>/lexical)
+        k1: Term-frequency saturation
+        b: Length normalisation
+        chunk_ids: FAISS id of each text, for ID-mapped indexes with gaps (compacted snapshots)
+
+    Returns:
+        Build parameters (also saved as lexical_params.json)
+    """
+    start = time.perf_counter()
+    vocab: Dict[str, int] = {}
+    term_ids: List[int] = []
+    doc_ids: List[int] = []
+    freqs: List[int] = []
+    lengths: List[int] = []
+    for position, text in enumerate(texts):
+        doc_id = int(chunk_ids[position]) if chunk_ids is not None else position
+        tokens = tokenize(text)
+        lengths.append(len(tokens))
+        for term, count in Counter(tokens).items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            doc_ids.append(doc_id)
+            freqs.append(count)
+
+    n_docs = len(lengths)
+    lengths_arr = np.asarray(lengths, dtype=np.float32)
+    avgdl = float(lengths_arr.mean()) if n_docs else 0.0
+    term_arr = np.asarray(term_ids, dtype=np.int64)
+    doc_arr = np.asarray(doc_ids, dtype=np.int32)
+    tf = np.asarray(freqs, dtype=np.float32)
+
+    # Group postings by term; the stable sort keeps each list in doc order
+    order = np.argsort(term_arr, kind="stable")
+    term_arr, doc_arr, tf = term_arr[order], doc_arr[order], tf[order]
+    df = np.bincount(term_arr, minlength=len(vocab))
+    id_space = max((int(i) for i in chunk_ids), default=-1) + 1 if chunk_ids is not None else n_docs
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(df, out=indptr[1:])
+
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+    doc_lengths = np.zeros(id_space, dtype=np.float32)
+    doc_lengths[np.asarray(chunk_ids, dtype=np.int64) if chunk_ids is not None else np.arange(n_docs)] = lengths_arr
+    norm = k1 * (1 - b + b * doc_lengths[doc_arr] / max(avgdl, 1e-9))
+    weights = (idf[term_arr] * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "indptr.npy"), indptr)
+    np.save(os.path.join(out_dir, "docs.npy"), doc_arr)
+    np.save(os.path.join(out_dir, "weights.npy"), weights)
+    with open(os.path.join(out_dir, VOCAB_FILE), "w", encoding="utf-8") as f:
+        json.dump(sorted(vocab, key=vocab.get), f)
+    params = {
+        "k1": k1,
+        "b": b,
+        "n_docs": n_docs,
+        "id_space": id_space,
+        "avgdl": round(avgdl, 3),
+        "n_terms": len(vocab),
+        "n_postings": int(len(doc_arr)),
+        "build_seconds": round(time.perf_counter() - start, 3),
+    }
+    with open(os.path.join(out_dir, PARAMS_FILE), "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+    print(f"✅ Lexical index: {n_docs} chunks, {len(vocab)} terms, {len(doc_arr)} postings in {params['build_seconds']}s")
+    return params
+
+
+class LexicalIndex:
+    """
+    Read-only BM25 index over memory-mapped CSR arrays.
+
+    Only the vocabulary is loaded onto the heap; posting lists are mapped,
+    so startup is a few file opens and the pages are shared between
+    pre-forked workers.
+    """
+
+    def __init__(self, index_dir: str):
+        """
+        Args:
+            index_dir: Directory written by build_lexical_index
+        """
+        self.index_dir = index_dir
+        self.indptr = np.load(os.path.join(index_dir, "indptr.npy"), mmap_mode="r")
+        self.docs = np.load(os.path.join(index_dir, "docs.npy"), mmap_mode="r")
+        self.weights = np.load(os.path.join(index_dir, "weights.npy"), mmap_mode="r")
+        with open(os.path.join(index_dir, VOCAB_FILE), "r", encoding="utf-8") as f:
+            self.vocab = {term: i for i, term in enumerate(json.load(f))}
+        with open(os.path.join(index_dir, PARAMS_FILE), "r", encoding="utf-8") as f:
+            self.params = json.load(f)
+        # Dense accumulators are sized by the largest id, which exceeds n_docs after compaction
+        self.size = int(self.params.get("id_space", self.params["n_docs"]))
+
+    def search(self, query: str, k: int = 5, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k chunks by BM25
+
+        Args:
+            query: Query text
+            k: Number of results
+            allowed: Optional sorted ids to restrict to (e.g. from a metadata filter)
+
+        Returns:
+            (ids, scores), best first
+        """
+        terms = {self.vocab[term] for term in tokenize(query) if term in self.vocab}
+        if not terms:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        spans = [(int(self.indptr[t]), int(self.indptr[t + 1])) for t in terms]
+        docs = np.concatenate([self.docs[s:e] for s, e in spans])
+        weights = np.concatenate([self.weights[s:e] for s, e in spans])
+        if allowed is not None:
+            keep = np.isin(docs, allowed)
+            docs, weights = docs[keep], weights[keep]
+            if not len(docs):
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if len(docs) * 4 >= self.size:
+            # Common terms: a dense accumulator beats sorting the postings
+            dense = np.bincount(docs, weights=weights, minlength=self.size)
+            ids = np.flatnonzero(dense)
+            scores = dense[ids].astype(np.float32)
+        else:
+            ids, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights).astype(np.float32)
+        if len(ids) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return ids[order].astype(np.int64), scores[order]
+
+    def stats(self) -> Dict[str, Any]:
+        return {key: self.params[key] for key in ("n_docs", "n_terms", "n_postings")}
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = RRF_K,
+                           limit: Optional[int] = None) -> List[int]:
+    """
+    Fuse rankings by summing 1 / (k + rank) per id
+
+    Rank-based, so BM25 scores and vector distances never need calibrating
+    against each other. Ties keep the order of first appearance.
+
+    Args:
+        rankings: Id lists, best first (e.g. vector hits, lexical hits)
+        k: RRF rank constant
+        limit: Number of fused ids to return (None: all)
+
+    Returns:
+        Fused ids, best first
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[int(doc_id)] = scores.get(int(doc_id), 0.0) + 1.0 / (k + rank + 1)
+    fused = sorted(scores, key=scores.get, reverse=True)
+    return fused[:limit] if limit is not None else fused
+
+
+def main():
+    """Add a lexical index to the live FAISS store (index.pkl docstore), published as a new snapshot."""
+    import pickle
+
+    try:
+        from finsight_app.path_utils import get_faiss_index_root
+        from finsight_app.snapshots import SnapshotManager
+    except ImportError:
+        from backend.finsight_app.path_utils import get_faiss_index_root
+        from backend.finsight_app.snapshots import SnapshotManager
+
+    parser = argparse.ArgumentParser(description="Publish a snapshot of the live FAISS store with a BM25 index")
+    parser.add_argument("--index-root", default=get_faiss_index_root(),
+                        help="Index root with snapshots/ and CURRENT (default: the API's)")
+    parser.add_argument("--k1", type=float, default=1.2)
+    parser.add_argument("--b", type=float, default=0.75)
+    args = parser.parse_args()
+
+    def build(out_dir: str, parent_dir: str):
+        with open(os.path.join(parent_dir, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        chunk_ids = sorted(index_to_docstore_id)
+        texts = [docstore.search(index_to_docstore_id[i]).page_content for i in chunk_ids]
+        build_lexical_index(texts, lexical_dir(out_dir), k1=args.k1, b=args.b, chunk_ids=chunk_ids)
+
+    SnapshotManager(args.index_root).publish_derived(build, [LEXICAL_DIR], "lexical")
+
+if __name__ == "__main__":
+    main()
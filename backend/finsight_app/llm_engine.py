@@ -1,6 +1,14 @@
 import os
+import time
 from typing import List, Optional
 
+try:
+    from finsight_app.gemini_client import get_gemini_client
+    from finsight_app.metrics import GEMINI_REQUESTS_TOTAL, MODEL_SECONDS
+except ImportError:
+    from backend.finsight_app.gemini_client import get_gemini_client
+    from backend.finsight_app.metrics import GEMINI_REQUESTS_TOTAL, MODEL_SECONDS
+
 # Configuration - Set to True to use Gemini API, False for local LLM
 USE_GEMINI = False
 
@@ -44,19 +52,18 @@ def gemini_response(prompt: str) -> str:
         Generated response text
     """
     try:
-        import google.generativeai as genai
-        
         if not GEMINI_API_KEY:
             return "❌ Error: Gemini API key not configured. Please set GEMINI_API_KEY environment variable."
         
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt)
-        return response.text
+        # Shared pooled client: no per-call configure, bounded by a deadline, retried, circuit-broken
+        start = time.perf_counter()
+        text = get_gemini_client().generate_text_sync(prompt)
+        MODEL_SECONDS.observe(time.perf_counter() - start, model="gemini")
+        GEMINI_REQUESTS_TOTAL.inc(outcome="ok")
+        return text
         
-    except ImportError:
-        return "❌ Error: google-generativeai package not installed. Run: pip install google-generativeai"
     except Exception as e:
+        GEMINI_REQUESTS_TOTAL.inc(outcome="error")
         return f"❌ Error generating Gemini response: {str(e)}"
 
 def local_llm_response(prompt: str, model_path: str = "models/phi-2.gguf") -> str:
@@ -6,10 +6,122 @@ Uses Hugging Face models locally for faster inference
 
 import os
 import time
-from typing import Optional, Dict, Any
-from transformers import AutoTokenizer, AutoModelForCausalLM
+import queue
+import threading
+from typing import Optional, Dict, Any, Iterator
+from transformers import (
+    AutoTokenizer,
+    AutoModelForCausalLM,
+    TextIteratorStreamer,
+    StoppingCriteria,
+    StoppingCriteriaList,
+)
 import torch
 
+from finsight_app.generation_scheduler import ContinuousBatchScheduler
+from finsight_app.metrics import record_generation
+
+
+class _CancelCriteria(StoppingCriteria):
+    """Stops generation once the owning stream has been cancelled."""
+
+    def __init__(self, cancelled: threading.Event):
+        self.cancelled = cancelled
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.cancelled.is_set()
+
+
+class GenerationStream:
+    """
+    A pending streamed generation.
+
+    Iterating yields decoded text pieces as the model produces them. The
+    blocking `run()` must be executed on a worker thread; `cancel()` stops
+    generation early, e.g. when the client disconnects.
+    """
+
+    def __init__(self, model, tokenizer, inputs, generate_kwargs: Dict[str, Any], timeout: float = 120.0):
+        self._model = model
+        self._inputs = inputs
+        self._generate_kwargs = generate_kwargs
+        self._cancelled = threading.Event()
+        self.streamer = TextIteratorStreamer(
+            tokenizer,
+            skip_prompt=True,
+            skip_special_tokens=True,
+            timeout=timeout
+        )
+
+    def run(self):
+        """Run model.generate, feeding tokens into the streamer (blocking)."""
+        try:
+            start = time.time()
+            with torch.no_grad():
+                outputs = self._model.generate(
+                    **self._inputs,
+                    **self._generate_kwargs,
+                    streamer=self.streamer,
+                    stopping_criteria=StoppingCriteriaList([_CancelCriteria(self._cancelled)])
+                )
+            prompt_tokens = self._inputs["input_ids"].shape[1]
+            record_generation("local_hf", outputs.shape[1] - prompt_tokens, time.time() - start)
+        except Exception:
+            # Unblock the consumer before propagating the error
+            self.streamer.end()
+            raise
+
+    def end(self):
+        """Unblock the consumer, e.g. when run() never got a worker."""
+        self.streamer.end()
+
+    def cancel(self):
+        """Ask the running generation to stop after the current step."""
+        self._cancelled.set()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.streamer)
+
+
+class ScheduledGenerationStream:
+    """
+    A streamed generation decoded by the continuous batching scheduler.
+
+    Same interface as GenerationStream, but the decode loop lives on the
+    scheduler thread: `run()` returns immediately, so no executor slot is
+    held while tokens are produced.
+    """
+
+    def __init__(self, scheduler: ContinuousBatchScheduler, prompt: str, max_tokens: int, temperature: float,
+                 timeout: float = 120.0):
+        self._pieces: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._timeout = timeout
+        self.request, self.future = scheduler.submit(
+            prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            on_text=self._pieces.put
+        )
+
+    def run(self):
+        """Generation is already queued on the scheduler; nothing to run here."""
+        return None
+
+    def end(self):
+        self._pieces.put(None)
+
+    def cancel(self):
+        self.request.cancel()
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            piece = self._pieces.get(timeout=self._timeout)
+            if piece is None:
+                break
+            yield piece
+        if self.future.done() and self.future.exception() is not None:
+            raise self.future.exception()
+
 class LocalHuggingFaceEngine:
     """Local Hugging Face LLM Engine for fast inference"""
     
@@ -18,6 +130,7 @@ class LocalHuggingFaceEngine:
         self.model = None
         self.tokenizer = None
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.scheduler: Optional[ContinuousBatchScheduler] = None
         
         print(f"🚀 Initializing local Hugging Face model: {model_name}")
         print(f"💻 Using device: {self.device}")
@@ -54,6 +167,67 @@ class LocalHuggingFaceEngine:
             self.model = self.model.to(self.device)
         
         print("✅ Model loaded successfully")
+
+    def enable_continuous_batching(self, max_batch_size: int = 8) -> ContinuousBatchScheduler:
+        """
+        Serve generate()/stream_generate() through a continuous batching scheduler
+
+        Concurrent requests are then decoded together, one token per step,
+        instead of queueing behind each other's model.generate calls.
+
+        Args:
+            max_batch_size: Maximum number of sequences decoded together
+
+        Returns:
+            The running scheduler
+        """
+        if self.model is None or self.tokenizer is None:
+            raise Exception("Model not loaded")
+        if self.scheduler is None:
+            self.model.eval()
+            self.scheduler = ContinuousBatchScheduler(
+                self.model,
+                self.tokenizer,
+                device=self.device,
+                max_batch_size=max_batch_size
+            )
+            self.scheduler.start()
+            print(f"✅ Continuous batching enabled (max batch {max_batch_size})")
+        return self.scheduler
+
+    def after_fork(self, num_threads: Optional[int] = None):
+        """
+        Re-initialise per-process state in a forked worker
+
+        The model weights stay shared copy-on-write with the parent; only the
+        scheduler thread (threads do not survive fork) is recreated.
+
+        Args:
+            num_threads: Intra-op torch threads for this worker (None: leave as is)
+        """
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        scheduler, self.scheduler = self.scheduler, None
+        if scheduler is not None:
+            self.enable_continuous_batching(max_batch_size=scheduler.max_batch_size)
+
+    def submit(self, prompt: str, max_tokens: int = 512, temperature: float = 0.3,
+               stop_sequences: Optional[list] = None):
+        """
+        Queue a prompt on the continuous batching scheduler without blocking
+
+        Returns:
+            concurrent.futures.Future resolving to the same dict as generate()
+        """
+        if self.scheduler is None:
+            raise Exception("Continuous batching is not enabled")
+        _, future = self.scheduler.submit(
+            prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stop_sequences=stop_sequences
+        )
+        return future
     
     def generate(self, prompt: str, max_tokens: int = 512, temperature: float = 0.3, 
                 stop_sequences: Optional[list] = None) -> Dict[str, Any]:
@@ -72,6 +246,9 @@ class LocalHuggingFaceEngine:
         try:
             if self.model is None or self.tokenizer is None:
                 raise Exception("Model not loaded")
+
+            if self.scheduler is not None:
+                return self.submit(prompt, max_tokens, temperature, stop_sequences).result()
             
             # Format prompt for DialoGPT
             formatted_prompt = prompt
@@ -101,6 +278,7 @@ class LocalHuggingFaceEngine:
             
             end_time = time.time()
             response_time = end_time - start_time
+            record_generation("local_hf", len(outputs[0]) - inputs['input_ids'].shape[1], response_time)
             
             # Decode output
             generated_text = self.tokenizer.decode(
@@ -125,6 +303,64 @@ class LocalHuggingFaceEngine:
             print(f"❌ Local HF generation error: {e}")
             raise
     
+    def stream_generate(self, prompt: str, max_tokens: int = 512, temperature: float = 0.3):
+        """
+        Prepare a streamed generation without starting it
+
+        The caller decides which thread runs `stream.run()` (e.g. a bounded
+        executor) and consumes tokens by iterating over the stream.
+
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+
+        Returns:
+            GenerationStream ready to run (ScheduledGenerationStream when batching)
+        """
+        if self.model is None or self.tokenizer is None:
+            raise Exception("Model not loaded")
+
+        if self.scheduler is not None:
+            return ScheduledGenerationStream(self.scheduler, prompt, max_tokens, temperature)
+
+        inputs = self.tokenizer(
+            prompt,
+            return_tensors="pt",
+            truncation=True,
+            max_length=2048
+        ).to(self.device)
+
+        generate_kwargs = {
+            "max_new_tokens": max_tokens,
+            "temperature": temperature,
+            "do_sample": True,
+            "top_p": 0.9,
+            "pad_token_id": self.tokenizer.eos_token_id,
+            "eos_token_id": self.tokenizer.eos_token_id
+        }
+        return GenerationStream(self.model, self.tokenizer, inputs, generate_kwargs)
+
+    def generate_stream(self, prompt: str, max_tokens: int = 512, temperature: float = 0.3) -> Iterator[str]:
+        """
+        Stream generated text, running model.generate in a background thread
+
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+
+        Yields:
+            Decoded text pieces as they are produced
+        """
+        stream = self.stream_generate(prompt, max_tokens=max_tokens, temperature=temperature)
+        worker = threading.Thread(target=stream.run, daemon=True)
+        worker.start()
+        try:
+            yield from stream
+        finally:
+            stream.cancel()
+
     def test_connection(self) -> bool:
         """Test if model is loaded and working"""
         try:
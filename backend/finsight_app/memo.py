@@ -0,0 +1,91 @@
+"""
+FinSight Copilot - Memoization Helpers
+Bounded, thread-safe LRU caches with hit/miss counters for pipeline stages
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalise a query for cache keys
+
+    all-MiniLM-L6-v2 uses an uncased tokenizer, so case and runs of
+    whitespace do not change the embedding and can safely be folded.
+    """
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+
+def digest(data) -> str:
+    """Short, stable content hash for strings, bytes or numpy arrays."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    elif not isinstance(data, (bytes, bytearray, memoryview)):
+        data = data.tobytes()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a fixed capacity and hit/miss counters."""
+
+    def __init__(self, name: str, maxsize: int = 1024):
+        """
+        Initialize the cache
+
+        Args:
+            name: Name reported in stats
+            maxsize: Maximum number of entries (0 disables caching)
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Return the cached value (refreshing its recency) or `default`."""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Insert or refresh a value, evicting the least recently used entry if full."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry (counters are kept)."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for health and metrics endpoints."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -14,11 +14,26 @@ DB_DIR = os.path.join(BASE_DIR, "db")
 PROCESSED_DATA_DIR = os.path.join(DATA_DIR, "processed_data")
 SEC_FILINGS_DIR = os.path.join(DATA_DIR, "sec_filings")
 STOCK_PRICES_DIR = os.path.join(DATA_DIR, "stock_prices")
+CHUNK_STORE_DIR = os.path.join(EMBEDDINGS_DIR, "chunk_store")
  
-def get_faiss_index_dir() -> str:
-    """Returns the absolute path to the FAISS index directory."""
+# Index snapshots: <index root>/snapshots/<version>, with CURRENT naming the live one
+SNAPSHOTS_SUBDIR = "snapshots"
+CURRENT_SNAPSHOT_FILE = "CURRENT"
+
+def get_faiss_index_root() -> str:
+    """Returns the directory holding the FAISS index snapshots (and pre-snapshot index files)."""
     return os.path.join(EMBEDDINGS_DIR, "finsight_index")
 
+def get_faiss_index_dir() -> str:
+    """Returns the absolute path to the live FAISS index directory (the current snapshot, if any)."""
+    root = get_faiss_index_root()
+    try:
+        with open(os.path.join(root, CURRENT_SNAPSHOT_FILE), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except OSError:
+        return root
+    return os.path.join(root, SNAPSHOTS_SUBDIR, name) if name else root
+
 def ensure_directories():
     """Ensure all necessary directories exist."""
     directories = [
@@ -29,7 +44,8 @@ def ensure_directories():
         PROCESSED_DATA_DIR,
         SEC_FILINGS_DIR,
         STOCK_PRICES_DIR,
-        get_faiss_index_dir()
+        CHUNK_STORE_DIR,
+        get_faiss_index_root()
     ]
     
     for directory in directories:
@@ -0,0 +1,63 @@
+"""
+FinSight Copilot - Process Memory
+Unique vs. shared memory accounting from /proc/<pid>/smaps_rollup (Linux)
+"""
+
+import os
+from typing import Dict, Iterable, List, Optional
+
+
+def read_smaps_rollup(pid: Optional[int] = None) -> Optional[Dict[str, int]]:
+    """
+    Memory breakdown of one process in bytes
+
+    Returns:
+        Dict with rss, pss, uss (private clean + dirty), shared (shared clean + dirty)
+        and swap, or None where /proc/<pid>/smaps_rollup is unavailable
+    """
+    path = f"/proc/{pid or os.getpid()}/smaps_rollup"
+    try:
+        with open(path, "r") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    fields: Dict[str, int] = {}
+    for line in lines[1:]:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].endswith(":"):
+            fields[parts[0][:-1]] = int(parts[1]) * 1024
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "swap": fields.get("Swap", 0),
+    }
+
+
+def memory_report(pids: Iterable[int]) -> List[Dict[str, int]]:
+    """Per-process breakdown for every readable pid, plus a pid key."""
+    report = []
+    for pid in pids:
+        usage = read_smaps_rollup(pid)
+        if usage is not None:
+            report.append({"pid": pid, **usage})
+    return report
+
+
+def format_report(report: List[Dict[str, int]], labels: Optional[Dict[int, str]] = None) -> str:
+    """Human-readable table (MiB) with totals; the PSS total is the box's real footprint."""
+    labels = labels or {}
+    mib = 1024 * 1024
+    lines = [f"{'process':<10} {'pid':>7} {'rss':>9} {'pss':>9} {'uss':>9} {'shared':>9}"]
+    for row in report:
+        lines.append(
+            f"{labels.get(row['pid'], 'worker'):<10} {row['pid']:>7} {row['rss'] / mib:>8.0f}M "
+            f"{row['pss'] / mib:>8.0f}M {row['uss'] / mib:>8.0f}M {row['shared'] / mib:>8.0f}M"
+        )
+    if report:
+        total_pss = sum(row["pss"] for row in report) / mib
+        total_rss = sum(row["rss"] for row in report) / mib
+        lines.append(f"{'total':<10} {'':>7} {total_rss:>8.0f}M {total_pss:>8.0f}M")
+    return "\n".join(lines)
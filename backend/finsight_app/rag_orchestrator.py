@@ -0,0 +1,621 @@
+"""
+FinSight Copilot - Staged RAG Orchestrator
+One retrieval-augmented generation hot path shared by every chat endpoint
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from finsight_app.answer_cache import SemanticAnswerCache, CachedAnswer
+from finsight_app.context_packer import ContextPacker, PackedContext
+from finsight_app.executors import model_executor, io_executor
+from finsight_app.filtered_search import filter_key
+from finsight_app.memo import LRUCache, digest
+from finsight_app.metrics import ANSWERS_TOTAL, FALLBACKS_TOTAL, MODEL_SECONDS, STAGE_SECONDS
+from finsight_app.prompts import FinSightPrompts, PromptType, PromptConfig
+from finsight_app.streaming import iterate_blocking
+from finsight_app.warmup import ComponentRegistry
+
+NO_ANALYSIS_MESSAGE = "Sorry, no analysis is available for this stock at the moment. Please try a different ticker or try again later."
+INVALID_ANSWERS = ["...", "❌", "❌ Sorry, I couldn't generate a response. Please try again."]
+
+
+def source_id(chunk) -> str:
+    """Stable identifier for a retrieved chunk, used in responses and streamed source events."""
+    metadata = getattr(chunk, "metadata", None) or {}
+    return getattr(chunk, "id", None) or metadata.get("file") or metadata.get("source") or ""
+
+
+def is_invalid_answer(answer: Optional[str]) -> bool:
+    """True if the model produced nothing usable."""
+    return not answer or not answer.strip() or answer.strip() in INVALID_ANSWERS
+
+
+def fallback_reason(prepared, llm) -> str:
+    """Why the Gemini fallback was needed, for the fallback counter."""
+    if not prepared.prompt:
+        return "no_context"
+    if llm is None:
+        return "llm_unavailable"
+    return "invalid_answer"
+
+
+class StageTimer:
+    """Records wall-clock milliseconds spent in each pipeline stage (and feeds the stage histograms)."""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            STAGE_SECONDS.observe(elapsed, stage=name)
+            self.timings[name] = round(self.timings.get(name, 0.0) + elapsed * 1000, 2)
+
+    def finish(self) -> Dict[str, float]:
+        """Return per-stage timings plus the total, in milliseconds."""
+        elapsed = time.perf_counter() - self._start
+        STAGE_SECONDS.observe(elapsed, stage="total")
+        self.timings["total"] = round(elapsed * 1000, 2)
+        return self.timings
+
+
+@dataclass
+class RAGOptions:
+    """Per-request knobs for the pipeline."""
+    k: int = 3
+    top_k: int = 3
+    rerank: bool = True
+    max_context_tokens: Optional[int] = None  # cap on packed context; None fills the model's window
+    max_tokens: int = 200
+    temperature: float = 0.1
+    prompt_type: PromptType = PromptType.RAG_FINANCIAL
+    nprobe: Optional[int] = None  # IVF lists probed; None uses the index default
+    ef_search: Optional[int] = None  # HNSW search breadth; None uses the index default
+    filings: Optional[int] = None  # filings the coarse stage narrows to; None uses the retriever default, 0 searches all
+    filters: Optional[Dict[str, Any]] = None  # company/ticker, form, date_from/date_to; only matching chunks are searched
+    hybrid: bool = True  # fuse BM25 hits with vector hits when a lexical index is loaded
+
+    def cache_scope(self) -> str:
+        """Key of every option that changes the answer; cached answers only match within a scope."""
+        return (
+            f"{self.prompt_type.value}|k={self.k}|top_k={self.top_k}|rerank={self.rerank}"
+            f"|ctx={self.max_context_tokens}|tokens={self.max_tokens}|temp={self.temperature}"
+            f"|nprobe={self.nprobe}|ef={self.ef_search}|filings={self.filings}|filters={filter_key(self.filters)}"
+            f"|hybrid={self.hybrid}"
+        )
+
+
+@dataclass
+class PreparedQuery:
+    """Output of the retrieval half of the pipeline (embed → prompt)."""
+    question: str
+    embedding: Optional[List[float]] = None
+    chunks: List[Any] = field(default_factory=list)
+    context: str = ""
+    context_tokens: int = 0
+    prompt: str = ""
+
+    @property
+    def sources(self) -> List[str]:
+        return [source_id(chunk) for chunk in self.chunks]
+
+
+@dataclass
+class RAGResult:
+    """Final answer plus provenance and timings."""
+    answer: str
+    sources: List[str]
+    used_fallback: bool
+    timings: Dict[str, float]
+    cached: bool = False
+
+
+@dataclass
+class SearchResult:
+    """Ranked chunks from a retrieval-only request."""
+    chunks: List[Any]
+    scores: Optional[List[float]]
+    timings: Dict[str, float]
+
+    def hits(self) -> List[Dict[str, Any]]:
+        """JSON-serialisable hits, best first."""
+        return [
+            {
+                "source": source_id(chunk),
+                "score": self.scores[i] if self.scores is not None else None,
+                "content": chunk.page_content,
+                "metadata": getattr(chunk, "metadata", None) or {},
+            }
+            for i, chunk in enumerate(self.chunks)
+        ]
+
+
+class RAGOrchestrator:
+    """
+    Staged RAG pipeline: embed → search → rerank → pack → prompt → generate → fallback.
+
+    Every stage runs on the appropriate bounded executor and is timed, so
+    the endpoints share one hot path and one set of fallback rules. When an
+    answer cache is configured it is consulted right after the embed stage,
+    before any search, rerank or generation work.
+    """
+
+    def __init__(
+        self,
+        components: ComponentRegistry,
+        prompt_builder: FinSightPrompts,
+        fallback: Callable[[str], str],
+        fallback_stream: Optional[Callable[[str], Iterator[str]]] = None,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+        rerank_cache_size: int = 8192,
+        context_window: int = 1024,
+        duplicate_threshold: float = 0.8,
+    ):
+        """
+        Initialize the orchestrator
+
+        Args:
+            components: Registry providing "retriever" (required), "reranker" and "llm" (optional)
+            prompt_builder: FinSightPrompts instance
+            fallback: Callable answering a bare question (Gemini); coroutine functions are awaited,
+                plain callables run on the I/O executor
+            fallback_stream: Factory streaming a fallback answer, as an async or blocking iterator
+            answer_cache: Semantic answer cache consulted right after embedding (optional)
+            rerank_cache_size: Capacity of the (question, chunk) -> score cache
+            context_window: Context length assumed when no local model is loaded
+            duplicate_threshold: Shingle similarity above which context sentences count as duplicates
+        """
+        self.components = components
+        self.prompt_builder = prompt_builder
+        self.fallback = fallback
+        self.fallback_stream = fallback_stream
+        self.answer_cache = answer_cache
+        self.rerank_cache = LRUCache("rerank_score", rerank_cache_size)
+        self.context_window = context_window
+        self.duplicate_threshold = duplicate_threshold
+
+    # ---- Components ----
+    @property
+    def retriever(self):
+        """rag_utils.RetrievalSystem; raises ComponentNotReady while warming up."""
+        return self.components.get("retriever")
+
+    @property
+    def reranker(self):
+        """CrossEncoder, or None until loaded (rerank is skipped meanwhile)."""
+        return self.components.peek("reranker")
+
+    @property
+    def llm(self):
+        """LocalHuggingFaceEngine, or None until loaded (Gemini answers meanwhile)."""
+        return self.components.peek("llm")
+
+    @property
+    def rerank_service(self):
+        """RerankBatcher that micro-batches scoring across requests, if enabled and loaded."""
+        return self.components.peek("rerank_service")
+
+    # ---- Stages ----
+    @staticmethod
+    def _predict(reranker, pairs):
+        start = time.perf_counter()
+        scores = reranker.predict([list(pair) for pair in pairs])
+        MODEL_SECONDS.observe(time.perf_counter() - start, model="reranker")
+        return scores
+
+    async def _rerank(self, reranker, question: str, chunks: List[Any], top_k: int) -> List[Tuple[Any, float]]:
+        # The cross-encoder is cased, so key on the raw (stripped) question
+        query_key = digest(question.strip())
+        keys = [(query_key, digest(chunk.page_content)) for chunk in chunks]
+        scores = [self.rerank_cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            pairs = [(question, chunks[i].page_content) for i in missing]
+            rerank_service = self.rerank_service
+            if rerank_service is not None:
+                fresh = await rerank_service.score(pairs)
+            else:
+                fresh = await model_executor.run(self._predict, reranker, pairs)
+            for i, score in zip(missing, fresh):
+                scores[i] = float(score)
+                self.rerank_cache.put(keys[i], scores[i])
+
+        ranked = sorted(zip(chunks, scores), key=lambda x: x[1], reverse=True)
+        print(f"\n🔎 RERANKED CHUNKS (top {top_k}):")
+        for i, (chunk, score) in enumerate(ranked[:top_k]):
+            print(f"[{i+1}] Score: {score:.4f} | {chunk.page_content[:200]}...\n")
+        return ranked[:top_k]
+
+    def _packer(self, llm) -> ContextPacker:
+        """Packer sized for the model that will read the prompt."""
+        tokenizer = getattr(llm, "tokenizer", None)
+        context_window = self.context_window
+        scheduler = getattr(llm, "scheduler", None)
+        config = getattr(getattr(llm, "model", None), "config", None)
+        if scheduler is not None:
+            context_window = scheduler.max_context
+        elif config is not None:
+            context_window = getattr(config, "n_positions", None) or getattr(config, "max_position_embeddings", None) or context_window
+        return ContextPacker(tokenizer, context_window=context_window, duplicate_threshold=self.duplicate_threshold)
+
+    def _pack(self, question: str, chunks: List[Any], scores: Optional[List[float]], options: RAGOptions) -> PackedContext:
+        packer = self._packer(self.llm)
+        # Render the template with an empty context to measure its fixed overhead
+        overhead = self.prompt_builder.build_prompt(options.prompt_type, question=question, context=" ", config=PromptConfig())
+        budget = packer.budget(overhead, options.max_tokens, cap=options.max_context_tokens)
+        return packer.pack(chunks, scores, budget)
+
+    async def embed(self, question: str, timer: StageTimer) -> List[float]:
+        """Embed the question with the retriever's embedding model."""
+        with timer.stage("embed"):
+            return await model_executor.run(self.retriever.embed_query, question)
+
+    def _cache_lookup(self, question: str, embedding: List[float], options: RAGOptions,
+                      timer: StageTimer) -> Optional[CachedAnswer]:
+        if self.answer_cache is None:
+            return None
+        with timer.stage("cache"):
+            cached = self.answer_cache.lookup(embedding, scope=options.cache_scope(), question=question)
+        if cached is not None:
+            print(f"💾 Semantic cache hit (similarity {cached.similarity:.3f})")
+        return cached
+
+    def _cache_store(self, prepared: PreparedQuery, answer: str, options: RAGOptions):
+        if self.answer_cache is None or prepared.embedding is None:
+            return
+        if answer == NO_ANALYSIS_MESSAGE or answer.startswith("❌"):
+            return
+        self.answer_cache.store(prepared.embedding, answer, prepared.sources, scope=options.cache_scope(),
+                                question=prepared.question)
+
+    async def retrieve(
+        self,
+        question: str,
+        embedding: List[float],
+        options: RAGOptions,
+        timer: StageTimer,
+    ) -> Tuple[List[Any], Optional[List[float]]]:
+        """
+        Search the index and optionally rerank
+
+        Returns:
+            (top_k chunks best first, their rerank scores or None when not reranked)
+        """
+        # One retriever for the whole request: ids from one snapshot must not be resolved in another
+        retriever = self.retriever
+        with timer.stage("search"):
+            if options.hybrid and getattr(retriever, "lexical_index", None) is not None:
+                # Vector and BM25 searches run side by side, then merge by reciprocal rank
+                vector_ids, lexical_ids = await asyncio.gather(
+                    model_executor.run(
+                        retriever.search_ids,
+                        embedding,
+                        k=options.k,
+                        filters=options.filters,
+                        nprobe=options.nprobe,
+                        ef_search=options.ef_search,
+                        filings=options.filings
+                    ),
+                    io_executor.run(retriever.lexical_ids, question, k=options.k, filters=options.filters),
+                )
+                chunks = retriever.documents(retriever.fuse([vector_ids, lexical_ids], options.k))
+            else:
+                chunks = await model_executor.run(
+                    retriever.retrieve_by_vector,
+                    embedding,
+                    k=options.k,
+                    nprobe=options.nprobe,
+                    ef_search=options.ef_search,
+                    filters=options.filters,
+                    filings=options.filings
+                )
+
+        scores = None
+        reranker = self.reranker
+        if options.rerank and reranker is not None and len(chunks) > 1:
+            with timer.stage("rerank"):
+                ranked = await self._rerank(reranker, question, chunks, options.top_k)
+            chunks = [chunk for chunk, _ in ranked]
+            scores = [score for _, score in ranked]
+        return chunks[:options.top_k], scores
+
+    async def prepare(
+        self,
+        question: str,
+        options: RAGOptions,
+        timer: StageTimer,
+        embedding: Optional[List[float]] = None,
+    ) -> PreparedQuery:
+        """
+        Run the retrieval half of the pipeline
+
+        Args:
+            question: User question
+            options: Pipeline options
+            timer: Stage timer to record into
+            embedding: Query embedding if already computed
+
+        Returns:
+            PreparedQuery with the selected chunks, packed context and prompt
+        """
+        if embedding is None:
+            embedding = await self.embed(question, timer)
+        prepared = PreparedQuery(question=question, embedding=embedding)
+
+        chunks, scores = await self.retrieve(question, embedding, options, timer)
+        prepared.chunks = chunks
+
+        with timer.stage("pack"):
+            packed = await model_executor.run(self._pack, question, prepared.chunks, scores, options)
+        prepared.context = packed.text
+        prepared.context_tokens = packed.tokens
+        print(f"📦 Packed {packed.sentences} sentences, {packed.tokens}/{packed.budget} tokens "
+              f"({packed.duplicates_dropped} duplicates, {packed.over_budget_dropped} over budget dropped)")
+
+        if prepared.context.strip():
+            with timer.stage("prompt"):
+                prepared.prompt = self.prompt_builder.build_prompt(
+                    options.prompt_type,
+                    question=question,
+                    context=prepared.context,
+                    config=PromptConfig()
+                )
+            print(f"Prompt length: {len(prepared.prompt)}")
+        return prepared
+
+    async def generate(self, prepared: PreparedQuery, options: RAGOptions, timer: StageTimer) -> Tuple[str, bool]:
+        """
+        Generate an answer, falling back to Gemini when the local model cannot help
+
+        Returns:
+            (answer, used_fallback)
+        """
+        answer = ""
+        llm = self.llm
+        if prepared.prompt and llm is not None:
+            try:
+                with timer.stage("generate"):
+                    print("🚀 Generating response with Hugging Face LLM...")
+                    if getattr(llm, "scheduler", None) is not None:
+                        # Continuous batching: join the running batch without holding an executor slot
+                        response = await asyncio.wrap_future(llm.submit(
+                            prepared.prompt,
+                            max_tokens=options.max_tokens,
+                            temperature=options.temperature
+                        ))
+                    else:
+                        response = await model_executor.run(
+                            llm.generate,
+                            prepared.prompt,
+                            max_tokens=options.max_tokens,
+                            temperature=options.temperature
+                        )
+                answer = response["choices"][0]["text"].strip()
+                print(f"✅ HF LLM response: {answer[:100]}...")
+            except Exception as e:
+                print(f"\n⚠️ Hugging Face LLM failed: {e}, using Gemini fallback!")
+                answer = ""
+
+        used_fallback = False
+        if is_invalid_answer(answer):
+            if not prepared.prompt:
+                print("\n⚡ No context found, using Gemini fallback!")
+            elif llm is None:
+                print("🔄 Hugging Face LLM not available, using Gemini fallback!")
+            else:
+                print("⚡ HF LLM returned empty or invalid answer, using Gemini fallback!")
+            FALLBACKS_TOTAL.inc(reason=fallback_reason(prepared, llm))
+            with timer.stage("fallback"):
+                if asyncio.iscoroutinefunction(self.fallback):
+                    answer = await self.fallback(prepared.question)
+                else:
+                    answer = await io_executor.run(self.fallback, prepared.question)
+            used_fallback = True
+
+        if is_invalid_answer(answer):
+            answer = NO_ANALYSIS_MESSAGE
+            ANSWERS_TOTAL.inc(source="none")
+        else:
+            ANSWERS_TOTAL.inc(source="fallback" if used_fallback else "local")
+        return answer.strip(), used_fallback
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of every stage-level cache on the hot path."""
+        retriever = self.components.peek("retriever")
+        stats = dict(retriever.cache_stats()) if retriever is not None else {}
+        stats[self.rerank_cache.name] = self.rerank_cache.stats()
+        return stats
+
+    # ---- Entry points ----
+    async def run(self, question: str, options: Optional[RAGOptions] = None) -> RAGResult:
+        """
+        Answer a question end to end
+
+        Args:
+            question: User question
+            options: Pipeline options (defaults to RAGOptions())
+
+        Returns:
+            RAGResult with answer, sources, fallback flag and per-stage timings
+        """
+        options = options or RAGOptions()
+        timer = StageTimer()
+        embedding = await self.embed(question, timer)
+        cached = self._cache_lookup(question, embedding, options, timer)
+        if cached is not None:
+            ANSWERS_TOTAL.inc(source="cache")
+            return RAGResult(
+                answer=cached.answer,
+                sources=cached.sources,
+                used_fallback=False,
+                timings=timer.finish(),
+                cached=True
+            )
+
+        prepared = await self.prepare(question, options, timer, embedding=embedding)
+        answer, used_fallback = await self.generate(prepared, options, timer)
+        self._cache_store(prepared, answer, options)
+        return RAGResult(
+            answer=answer,
+            sources=prepared.sources,
+            used_fallback=used_fallback,
+            timings=timer.finish()
+        )
+
+    async def search(self, question: str, options: Optional[RAGOptions] = None) -> SearchResult:
+        """
+        Retrieval only: embed, search and (optionally) rerank, without generating
+
+        Args:
+            question: Search query
+            options: Pipeline options (k, top_k and rerank are used)
+
+        Returns:
+            SearchResult with the ranked chunks and per-stage timings
+        """
+        options = options or RAGOptions()
+        timer = StageTimer()
+        embedding = await self.embed(question, timer)
+        chunks, scores = await self.retrieve(question, embedding, options, timer)
+        return SearchResult(chunks=chunks, scores=scores, timings=timer.finish())
+
+    async def search_batch(self, questions: List[str], options: Optional[RAGOptions] = None) -> List[SearchResult]:
+        """
+        Retrieval only, for many questions at once
+
+        All questions are embedded in one batched forward pass and searched
+        with one multi-row FAISS query; reranking (if asked for) still scores
+        each question's own candidates.
+
+        Args:
+            questions: Search queries
+            options: Pipeline options shared by every query
+
+        Returns:
+            One SearchResult per question, in order; timings cover the whole batch
+        """
+        options = options or RAGOptions()
+        timer = StageTimer()
+        retriever = self.retriever
+        with timer.stage("embed"):
+            embeddings = await model_executor.run(retriever.embed_queries, questions)
+        with timer.stage("search"):
+            search = model_executor.run(
+                retriever.search_ids_batch,
+                embeddings,
+                k=options.k,
+                filters=options.filters,
+                nprobe=options.nprobe,
+                ef_search=options.ef_search,
+                filings=options.filings
+            )
+            if options.hybrid and getattr(retriever, "lexical_index", None) is not None:
+                vector_ids, lexical_ids = await asyncio.gather(
+                    search,
+                    io_executor.run(retriever.lexical_ids_batch, questions, k=options.k, filters=options.filters),
+                )
+                ids = [retriever.fuse([v, l], options.k) for v, l in zip(vector_ids, lexical_ids)]
+            else:
+                ids = await search
+            batches = [retriever.documents(row) for row in ids]
+
+        scores: List[Optional[List[float]]] = [None] * len(questions)
+        reranker = self.reranker
+        if options.rerank and reranker is not None:
+            with timer.stage("rerank"):
+                # Concurrent, so the rerank batcher can merge the questions' pairs into shared forward passes
+                ranked = await asyncio.gather(*(
+                    self._rerank(reranker, question, chunks, options.top_k)
+                    for question, chunks in zip(questions, batches) if len(chunks) > 1
+                ))
+            ranked_iter = iter(ranked)
+            for i, chunks in enumerate(batches):
+                if len(chunks) > 1:
+                    pairs = next(ranked_iter)
+                    batches[i] = [chunk for chunk, _ in pairs]
+                    scores[i] = [score for _, score in pairs]
+
+        timings = timer.finish()
+        return [
+            SearchResult(chunks=chunks[:options.top_k], scores=row_scores, timings=timings)
+            for chunks, row_scores in zip(batches, scores)
+        ]
+
+    async def stream(self, question: str, options: Optional[RAGOptions] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Answer a question as a stream of (event, payload) pairs
+
+        Emits `sources` once retrieval finishes, `token` for every generated
+        text piece and `done` with the full answer and timings.
+        """
+        options = options or RAGOptions()
+        timer = StageTimer()
+        embedding = await self.embed(question, timer)
+        cached = self._cache_lookup(question, embedding, options, timer)
+        if cached is not None:
+            ANSWERS_TOTAL.inc(source="cache")
+            yield "sources", {"sources": cached.sources}
+            yield "token", {"text": cached.answer}
+            yield "done", {"answer": cached.answer, "used_fallback": False, "cached": True, "timings": timer.finish()}
+            return
+
+        prepared = await self.prepare(question, options, timer, embedding=embedding)
+        yield "sources", {"sources": prepared.sources}
+
+        pieces: List[str] = []
+        used_fallback = False
+        llm = self.llm
+        if prepared.prompt and llm is not None:
+            print("🚀 Streaming response with Hugging Face LLM...")
+            stream = llm.stream_generate(prepared.prompt, max_tokens=options.max_tokens, temperature=options.temperature)
+            generation = asyncio.ensure_future(model_executor.run(stream.run))
+
+            def end_on_failure(task):
+                # If generation never started (e.g. queue full), unblock the streamer
+                if task.cancelled() or task.exception() is not None:
+                    stream.end()
+
+            generation.add_done_callback(end_on_failure)
+            try:
+                with timer.stage("generate"):
+                    async for text in iterate_blocking(stream, name="llm-stream"):
+                        if text:
+                            pieces.append(text)
+                            yield "token", {"text": text}
+                    await generation
+            except Exception as e:
+                print(f"\n⚠️ Hugging Face LLM stream failed: {e}")
+            finally:
+                stream.cancel()
+
+        if is_invalid_answer("".join(pieces)) and self.fallback_stream is not None:
+            print("⚡ Streaming Gemini fallback!")
+            FALLBACKS_TOTAL.inc(reason=fallback_reason(prepared, llm))
+            pieces = []
+            used_fallback = True
+            with timer.stage("fallback"):
+                pieces_stream = self.fallback_stream(question)
+                if not hasattr(pieces_stream, "__aiter__"):
+                    pieces_stream = iterate_blocking(pieces_stream, name="fallback-stream")
+                async for text in pieces_stream:
+                    pieces.append(text)
+                    yield "token", {"text": text}
+
+        answer = "".join(pieces).strip()
+        if is_invalid_answer(answer):
+            answer = NO_ANALYSIS_MESSAGE
+            ANSWERS_TOTAL.inc(source="none")
+            yield "token", {"text": answer}
+        else:
+            ANSWERS_TOTAL.inc(source="fallback" if used_fallback else "local")
+        self._cache_store(prepared, answer, options)
+        yield "done", {"answer": answer, "used_fallback": used_fallback, "cached": False, "timings": timer.finish()}
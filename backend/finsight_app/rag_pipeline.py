@@ -5,12 +5,13 @@ Combines retrieval and response generation for end-to-end question answering
 
 from finsight_app.retrieval_system import RetrievalSystem, retrieve_context
 from finsight_app.llm_engine import generate_response, gemini_response, GEMINI_API_KEY
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import os
+import threading
 from llama_cpp import Llama
 import numpy as np
 import pickle
-from sentence_transformers import util, SentenceTransformer
+from sentence_transformers import SentenceTransformer
 from finsight_app.path_utils import EMBEDDINGS_DIR, DATA_DIR
 
 # Path to your quantized .gguf model (update as needed)
@@ -41,12 +42,68 @@ DEBUG = os.getenv("DEBUG", "False") == "True"
 EMBEDDINGS_PATH = os.path.join(EMBEDDINGS_DIR, "company_embeddings.npy")
 MAPPING_PATH = os.path.join(EMBEDDINGS_DIR, "company_mapping.pkl")
 MODEL_NAME = "all-MiniLM-L6-v2"
+# Rows scored per matrix-vector product (bounds the float32 upcast of float16 files)
+COMPANY_SCORE_BLOCK = 65536
 
 model = SentenceTransformer(MODEL_NAME)
-embeddings = np.load(EMBEDDINGS_PATH)
 with open(MAPPING_PATH, "rb") as f:
     mapping = pickle.load(f)
 
+_company_matrix: Optional[np.ndarray] = None
+_company_lock = threading.Lock()
+
+
+def get_company_matrix() -> np.ndarray:
+    """
+    Unit-norm company embeddings, memory-mapped on first use
+
+    embed_chunks.py normalizes rows at build time, so cosine similarity is a
+    plain dot product. Mapped rather than read: pages are loaded on use and
+    shared between processes (float16 files stay float16 on disk). Files
+    written before normalization are normalized once onto the heap.
+    """
+    global _company_matrix
+    with _company_lock:
+        if _company_matrix is None:
+            matrix = np.load(EMBEDDINGS_PATH, mmap_mode="r")
+            norms = np.linalg.norm(np.asarray(matrix[:64], dtype=np.float32), axis=1)
+            if len(norms) and not np.allclose(norms, 1.0, atol=1e-2):
+                print("⚠️ company_embeddings.npy is not normalized; re-run embed_chunks.py. Normalizing in memory.")
+                matrix = np.asarray(matrix, dtype=np.float32)
+                matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            _company_matrix = matrix
+        return _company_matrix
+
+
+def top_k_inner_product(matrix: np.ndarray, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rows with the largest inner product with the query
+
+    One matrix-vector product (in blocks) and an argpartition: only the k
+    winners are sorted, not every row.
+
+    Args:
+        matrix: (n, d) rows, float32 or float16
+        query: (d,) vector
+        k: Number of results
+
+    Returns:
+        (row indices, scores), best first
+    """
+    query = np.asarray(query, dtype=np.float32).ravel()
+    n = len(matrix)
+    scores = np.empty(n, dtype=np.float32)
+    for start in range(0, n, COMPANY_SCORE_BLOCK):
+        block = matrix[start:start + COMPANY_SCORE_BLOCK]
+        scores[start:start + len(block)] = block @ query
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return top, scores[top]
+
+
 class RAGPipeline:
     """
     Complete RAG pipeline for financial analysis
@@ -237,9 +294,8 @@ def answer_query(query, k=3, max_tokens=512):
     return output
 
 def query_company_data(query: str, top_k: int = 3):
-    query_embedding = model.encode(query)
-    scores = util.cos_sim(query_embedding, embeddings)[0]
-    top_results = scores.argsort(descending=True)[:top_k]
+    query_embedding = model.encode(query, normalize_embeddings=True)
+    top_results, _ = top_k_inner_product(get_company_matrix(), query_embedding, top_k)
 
     context = []
     for idx in top_results:
@@ -6,13 +6,17 @@ Core components for data processing, embeddings, and retrieval
 import json
 import logging
 import re
-from typing import List, Dict, Any, Optional
+import time
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 from pathlib import Path
 import pandas as pd
 from tqdm import tqdm
 import os
+import pickle
 import uuid
 import fitz  # PyMuPDF
+import faiss
+import numpy as np
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import HuggingFaceEmbeddings
@@ -21,6 +25,24 @@ from langchain.docstore.document import Document
 from langchain_community.retrievers import BM25Retriever
 from langchain.retrievers import EnsembleRetriever
 
+from finsight_app.chunk_catalog import ChunkCatalog, build_chunk_catalog, catalog_dir, catalog_exists, catalog_metadata
+from finsight_app.chunk_store import ChunkStoreWriter
+from finsight_app.coarse_index import COARSE_DIR, CoarseIndex, build_coarse_index, coarse_dir, coarse_index_exists
+from finsight_app.filtered_search import ChunkFilterIndex, filter_key, filtered_search_batch
+from finsight_app.index_specs import (
+    INDEX_PARAMS_FILE, IndexSpec, apply_search_defaults, build_index, describe_index, enable_reconstruct,
+    load_index_params, read_index_mmap, remove_ids, save_index_params, search_parameters, stored_vectors, to_id_map,
+)
+from finsight_app.lexical_index import (
+    LEXICAL_DIR, LexicalIndex, RRF_K, build_lexical_index, lexical_dir, lexical_index_exists, reciprocal_rank_fusion,
+)
+from finsight_app.memo import LRUCache, normalize_query, digest
+from finsight_app.metrics import INDEX_SEARCH_SECONDS, MODEL_SECONDS
+from finsight_app.path_utils import CHUNK_STORE_DIR, get_faiss_index_root
+from finsight_app.snapshots import (
+    TOMBSTONES_FILE, SnapshotManager, carry_over, load_tombstones, read_manifest, save_tombstones,
+)
+
 logger = logging.getLogger(__name__)
 
 class DataProcessor:
@@ -344,16 +366,55 @@ class RetrievalSystem:
     Advanced retrieval system with multiple retrieval strategies
     """
     
-    def __init__(self, vectorstore: FAISS):
+    def __init__(self, vectorstore: FAISS, embed_cache_size: int = 2048, search_cache_size: int = 2048,
+                 nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                 lexical_index: Optional[LexicalIndex] = None, rrf_k: int = RRF_K,
+                 deleted_ids: Optional[np.ndarray] = None, coarse_index: Optional[CoarseIndex] = None,
+                 coarse_filings: int = 0, catalog: Optional[ChunkCatalog] = None):
         """
         Initialize the retrieval system
         
         Args:
             vectorstore: FAISS vector store
+            embed_cache_size: Capacity of the normalized query -> embedding cache
+            search_cache_size: Capacity of the (embedding, k, filters) -> FAISS ids cache
+            nprobe: Default IVF lists probed per query (None: keep the index's own default)
+            ef_search: Default HNSW search breadth (None: keep the index's own default)
+            lexical_index: Persistent BM25 index aligned with the FAISS ids, for hybrid retrieval
+            rrf_k: Reciprocal-rank-fusion constant for hybrid retrieval
+            deleted_ids: Ids deleted from the docstore but still in the index until
+                compaction (the snapshot's tombstones); searches skip them
+            coarse_index: Filing-level index for two-stage search (see coarse_index)
+            coarse_filings: Filings whose chunks an unfiltered query searches (0: search every chunk)
+            catalog: Memory-mapped chunk metadata columns saved with the snapshot; filters are
+                evaluated on it instead of a filter index built from the docstore
         """
         self.vectorstore = vectorstore
+        self.lexical_index = lexical_index
+        self.rrf_k = rrf_k
+        self.deleted_ids = np.asarray(deleted_ids if deleted_ids is not None else [], dtype=np.int64)
+        self._deleted_selector = None
+        self._live_selector = None
+        if len(self.deleted_ids):
+            # Kept on self: faiss holds raw pointers to both selectors during a search
+            self._deleted_selector = faiss.IDSelectorBatch(self.deleted_ids)
+            self._live_selector = faiss.IDSelectorNot(self._deleted_selector)
+        self.catalog = catalog
+        self.coarse_index = coarse_index
+        self.coarse_filings = coarse_filings
+        self._coarse_pending = np.empty(0, dtype=np.int64)
+        if coarse_index is not None:
+            # Chunks uploaded since the coarse build are not grouped yet; every coarse query includes them
+            live = np.fromiter(vectorstore.index_to_docstore_id, dtype=np.int64)
+            self._coarse_pending = np.sort(live[live >= coarse_index.id_space])
+            # The fine stage scores candidate ids directly, which IVF indexes need an id map for
+            enable_reconstruct(vectorstore.index)
+        apply_search_defaults(vectorstore.index, nprobe=nprobe, ef_search=ef_search)
         self.bm25_retriever = None
         self.ensemble_retriever = None
+        self.embedding_cache = LRUCache("query_embedding", embed_cache_size)
+        self.search_cache = LRUCache("faiss_search", search_cache_size)
+        self._filter_index: Optional[ChunkFilterIndex] = None
         
     def setup_bm25_retriever(self, documents: List[Document]):
         """
@@ -413,15 +474,304 @@ class RetrievalSystem:
             List of relevant documents
         """
         try:
-            if use_ensemble and self.ensemble_retriever:
+            if use_ensemble and self.lexical_index is not None:
+                embedding = self.embed_query(query)
+                ids = self.fuse([self.search_ids(embedding, k=k), self.lexical_ids(query, k=k)], k)
+                return self.documents(ids)
+            elif use_ensemble and self.ensemble_retriever:
                 return self.ensemble_retriever.get_relevant_documents(query)
             else:
-                return self.vectorstore.similarity_search(query, k=k)
+                return self.retrieve_by_vector(self.embed_query(query), k=k)
                 
         except Exception as e:
             logger.error(f"Error during retrieval: {e}")
             return []
-    
+
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a query with the vector store's embedding model (memoized)
+
+        Args:
+            query: Search query
+
+        Returns:
+            Query embedding (shared with the cache, do not mutate)
+        """
+        key = normalize_query(query)
+        embedding = self.embedding_cache.get(key)
+        if embedding is None:
+            embedder = self.vectorstore.embedding_function
+            start = time.perf_counter()
+            if hasattr(embedder, "embed_query"):
+                embedding = embedder.embed_query(query)
+            else:
+                embedding = embedder(query)
+            MODEL_SECONDS.observe(time.perf_counter() - start, model="embedding")
+            self.embedding_cache.put(key, embedding)
+        return embedding
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed many queries, uncached ones in a single batched forward pass (memoized)
+
+        Args:
+            queries: Search queries
+
+        Returns:
+            One embedding per query (shared with the cache, do not mutate)
+        """
+        keys = [normalize_query(query) for query in queries]
+        embeddings = [self.embedding_cache.get(key) for key in keys]
+        missing: Dict[str, List[int]] = {}
+        for i, (key, embedding) in enumerate(zip(keys, embeddings)):
+            if embedding is None:
+                missing.setdefault(key, []).append(i)
+        if missing:
+            embedder = self.vectorstore.embedding_function
+            texts = [queries[positions[0]] for positions in missing.values()]
+            start = time.perf_counter()
+            if hasattr(embedder, "embed_documents"):
+                # Same model and pooling as embed_query, one matrix instead of a row per call
+                fresh = embedder.embed_documents(texts)
+            else:
+                fresh = [embedder(text) for text in texts]
+            MODEL_SECONDS.observe(time.perf_counter() - start, model="embedding")
+            for (key, positions), embedding in zip(missing.items(), fresh):
+                self.embedding_cache.put(key, embedding)
+                for i in positions:
+                    embeddings[i] = embedding
+        return embeddings
+
+    @property
+    def filter_index(self) -> ChunkFilterIndex:
+        """Ticker / form / filing-date columns over the docstore, built on first filtered search."""
+        filter_index = self._filter_index
+        if filter_index is None or filter_index.count != len(self.vectorstore.index_to_docstore_id):
+            start = time.perf_counter()
+            filter_index = ChunkFilterIndex.from_vectorstore(self.vectorstore)
+            self._filter_index = filter_index
+            logger.info(f"Filter index over {filter_index.size} chunks built in {time.perf_counter() - start:.2f}s")
+        return filter_index
+
+    def select_filtered(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Sorted live FAISS ids matching the filters
+
+        Uses the snapshot's chunk catalog when it covers the live chunks and every
+        filter key; otherwise the filter index built from the docstore.
+
+        Returns:
+            Matching ids, or None when there is nothing to filter on
+        """
+        if not filters:
+            return None
+        catalog = self.catalog
+        if (catalog is not None and catalog.count == len(self.vectorstore.index_to_docstore_id)
+                and catalog.supports(filters)):
+            return catalog.select(filters)
+        return self.filter_index.select(filters)
+
+    def _document(self, faiss_id: int) -> Document:
+        docstore_id = self.vectorstore.index_to_docstore_id[faiss_id]
+        return self.vectorstore.docstore.search(docstore_id)
+
+    def search_ids(self, embedding: List[float], k: int = 5, filters: Optional[Dict[str, Any]] = None,
+                   nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                   filings: Optional[int] = None) -> List[int]:
+        """
+        Run the FAISS search for an embedding (memoized)
+
+        Args:
+            embedding: Query embedding
+            k: Number of results to return
+            filters: Optional metadata filters: company/ticker, form, date_from/date_to
+                or any other metadata key (value or list of allowed values per key);
+                only matching chunks are scored
+            nprobe: IVF lists to probe for this request (recall vs. latency)
+            ef_search: HNSW search breadth for this request (recall vs. latency)
+            filings: Filings the coarse stage narrows an unfiltered search to
+                (None: coarse_filings, 0: search every chunk)
+
+        Returns:
+            FAISS ids of the hits, best first
+        """
+        return self.search_ids_batch([embedding], k=k, filters=filters, nprobe=nprobe, ef_search=ef_search,
+                                     filings=filings)[0]
+
+    def coarse_candidates(self, vectors: np.ndarray, k: int, filings: Optional[int] = None) -> Optional[List[np.ndarray]]:
+        """
+        Chunk ids of each query's top filings (first stage of a two-stage search)
+
+        Args:
+            vectors: (n, d) float32 queries, normalized like the index
+            k: Results wanted; filings are added until there are at least k candidates
+            filings: Filings per query (None: coarse_filings)
+
+        Returns:
+            Sorted live candidate ids per query, or None when the whole index should be searched
+        """
+        n_filings = self.coarse_filings if filings is None else filings
+        if self.coarse_index is None or n_filings <= 0 or n_filings >= len(self.coarse_index.filings):
+            return None
+        start = time.perf_counter()
+        candidates = self.coarse_index.select(vectors, n_filings, min_chunks=k)
+        INDEX_SEARCH_SECONDS.observe(time.perf_counter() - start, index="coarse")
+        results = []
+        for ids in candidates:
+            if len(self._coarse_pending):
+                ids = np.union1d(ids, self._coarse_pending)
+            if len(self.deleted_ids):
+                ids = np.setdiff1d(ids, self.deleted_ids, assume_unique=True)
+            results.append(ids)
+        return results
+
+    def search_ids_batch(self, embeddings: List[List[float]], k: int = 5, filters: Optional[Dict[str, Any]] = None,
+                         nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                         filings: Optional[int] = None) -> List[List[int]]:
+        """
+        Run the FAISS search for many embeddings at once (memoized per embedding)
+
+        Uncached rows go to FAISS as one (n, d) matrix, so the index is
+        scanned once per batch rather than once per query. With a coarse
+        index, unfiltered queries first pick their top filings and then only
+        score those filings' chunks.
+
+        Args:
+            embeddings: Query embeddings
+            k / filters / nprobe / ef_search / filings: As for search_ids, shared by every query
+
+        Returns:
+            FAISS ids of each query's hits, best first
+        """
+        if not len(embeddings):
+            return []
+        vectors = np.array(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        if getattr(self.vectorstore, "_normalize_L2", False):
+            faiss.normalize_L2(vectors)
+
+        index = self.vectorstore.index
+        params = search_parameters(index, nprobe=nprobe, ef_search=ef_search, selector=self._live_selector)
+        scope = (k, filter_key(filters), nprobe if params else None, ef_search if params else None, filings)
+        keys = [(digest(vector), *scope) for vector in vectors]
+        results = [self.search_cache.get(key) for key in keys]
+        missing = [i for i, ids in enumerate(results) if ids is None]
+        if missing:
+            allowed = self.select_filtered(filters)
+            batch = vectors[missing]
+            # Filters already narrow the search; the coarse stage only applies to unfiltered queries
+            candidates = self.coarse_candidates(batch, k, filings) if allowed is None else None
+            start = time.perf_counter()
+            if candidates is not None:
+                hits = [filtered_search_batch(index, batch[row:row + 1], k, ids, nprobe=nprobe, ef_search=ef_search)[0][1]
+                        for row, ids in enumerate(candidates)]
+            elif allowed is None:
+                _, hits = index.search(batch, k, params=params)
+            else:
+                hits = [row_ids for _, row_ids in filtered_search_batch(index, batch, k, allowed, nprobe=nprobe, ef_search=ef_search)]
+            INDEX_SEARCH_SECONDS.observe(time.perf_counter() - start, index="chunks")
+            for i, row in zip(missing, hits):
+                results[i] = tuple(int(hit) for hit in row if hit != -1)
+                self.search_cache.put(keys[i], results[i])
+        return [list(ids) for ids in results]
+
+    def lexical_ids(self, query: str, k: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[int]:
+        """
+        Run the BM25 search for a query (memoized)
+
+        Args:
+            query: Query text
+            k: Number of results to return
+            filters: Optional metadata filters, as for search_ids
+
+        Returns:
+            FAISS ids of the hits, best first ([] without a lexical index)
+        """
+        if self.lexical_index is None:
+            return []
+        key = ("lexical", normalize_query(query), k, filter_key(filters))
+        ids = self.search_cache.get(key)
+        if ids is None:
+            allowed = self.select_filtered(filters)
+            start = time.perf_counter()
+            # Over-fetch past deleted chunks, which stay in the postings until compaction
+            hits, _ = self.lexical_index.search(query, k + len(self.deleted_ids), allowed=allowed)
+            INDEX_SEARCH_SECONDS.observe(time.perf_counter() - start, index="lexical")
+            live = self.vectorstore.index_to_docstore_id
+            ids = tuple(int(i) for i in hits if int(i) in live)[:k]
+            self.search_cache.put(key, ids)
+        return list(ids)
+
+    def lexical_ids_batch(self, queries: List[str], k: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[List[int]]:
+        """BM25 hits for many queries (posting lists are per term, so this is a loop over lexical_ids)."""
+        return [self.lexical_ids(query, k=k, filters=filters) for query in queries]
+
+    def fuse(self, rankings: List[List[int]], k: int) -> List[int]:
+        """Reciprocal-rank fusion of vector and lexical hits, best k first."""
+        return reciprocal_rank_fusion(rankings, k=self.rrf_k, limit=k)
+
+    def documents(self, ids: List[int]) -> List[Document]:
+        """Docstore documents for FAISS ids."""
+        return [self._document(i) for i in ids]
+
+    def retrieve_by_vector(self, embedding: List[float], k: int = 5, filters: Optional[Dict[str, Any]] = None,
+                           nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                           filings: Optional[int] = None) -> List[Document]:
+        """
+        Retrieve relevant documents for an already-computed query embedding
+
+        Args:
+            embedding: Query embedding from embed_query
+            k: Number of results to return
+            filters: Optional metadata filters
+            nprobe: IVF lists to probe for this request
+            ef_search: HNSW search breadth for this request
+            filings: Filings searched after the coarse stage (None: coarse_filings)
+
+        Returns:
+            List of relevant documents
+        """
+        try:
+            ids = self.search_ids(embedding, k=k, filters=filters, nprobe=nprobe, ef_search=ef_search, filings=filings)
+            return [self._document(i) for i in ids]
+        except Exception as e:
+            logger.error(f"Error during retrieval: {e}")
+            return []
+
+    def retrieve_batch(self, queries: List[str], k: int = 5, filters: Optional[Dict[str, Any]] = None,
+                       nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                       hybrid: bool = True, filings: Optional[int] = None) -> List[List[Document]]:
+        """
+        Retrieve documents for many queries: one batched embedding pass and one multi-row FAISS search
+
+        Args:
+            queries: Search queries
+            k: Number of results per query
+            filters / nprobe / ef_search / filings: As for search_ids, shared by every query
+            hybrid: Fuse BM25 hits in when a lexical index is loaded
+
+        Returns:
+            Relevant documents per query, best first
+        """
+        vector_ids = self.search_ids_batch(self.embed_queries(queries), k=k, filters=filters,
+                                           nprobe=nprobe, ef_search=ef_search, filings=filings)
+        if hybrid and self.lexical_index is not None:
+            lexical_ids = self.lexical_ids_batch(queries, k=k, filters=filters)
+            vector_ids = [self.fuse([v, l], k) for v, l in zip(vector_ids, lexical_ids)]
+        return [self.documents(ids) for ids in vector_ids]
+
+    def clear_caches(self):
+        """Drop memoized embeddings and search hits (e.g. after the index changes)."""
+        self.embedding_cache.clear()
+        self.search_cache.clear()
+        self._filter_index = None
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the retrieval caches."""
+        return {
+            self.embedding_cache.name: self.embedding_cache.stats(),
+            self.search_cache.name: self.search_cache.stats(),
+        }
+
     def get_retrieval_stats(self) -> Dict[str, Any]:
         """
         Get statistics about the retrieval system
@@ -434,11 +784,17 @@ class RetrievalSystem:
         
         try:
             # Get basic stats
+            index_info = describe_index(self.vectorstore.index)
             stats = {
-                "total_documents": self.vectorstore.index.ntotal,
+                "total_documents": len(self.vectorstore.index_to_docstore_id),
+                "deleted_pending_compaction": len(self.deleted_ids),
                 "embedding_dimension": self.vectorstore.index.d,
-                "index_type": type(self.vectorstore.index).__name__,
+                **index_info,
                 "has_bm25": self.bm25_retriever is not None,
+                "lexical_index": self.lexical_index.stats() if self.lexical_index is not None else None,
+                "coarse_index": self.coarse_index.stats() if self.coarse_index is not None else None,
+                "coarse_filings": self.coarse_filings,
+                "catalog": self.catalog.stats() if self.catalog is not None else None,
                 "has_ensemble": self.ensemble_retriever is not None
             }
             
@@ -448,38 +804,302 @@ class RetrievalSystem:
             logger.error(f"Error getting retrieval stats: {e}")
             return {"error": str(e)} 
 
-def process_and_embed_file(filename: str, content: str = None):
-    from langchain.embeddings import HuggingFaceEmbeddings
-    from langchain.vectorstores import FAISS
-    from langchain.docstore.document import Document
+def load_vectorstore(index_dir: str, embeddings, mmap: bool = False) -> FAISS:
+    """
+    Load a LangChain FAISS vector store saved with save_local
+
+    Args:
+        index_dir: Directory containing index.faiss and index.pkl
+        embeddings: Embedding function for queries
+        mmap: Memory-map the index read-only instead of copying it onto the heap.
+            Mapped pages live in the OS page cache, so every process that opens
+            the same file (e.g. pre-forked workers) shares one copy.
+
+    Returns:
+        FAISS vector store
+    """
+    # Query-time defaults chosen at build time (nprobe / efSearch) live next to the index
+    params = load_index_params(index_dir)
+    if not mmap:
+        vectorstore = FAISS.load_local(index_dir, embeddings=embeddings, allow_dangerous_deserialization=True)
+        apply_search_defaults(vectorstore.index, nprobe=params.get("nprobe"), ef_search=params.get("ef_search"))
+        return vectorstore
+
+    index = read_index_mmap(os.path.join(index_dir, "index.faiss"), refine=bool(params.get("refine")))
+    apply_search_defaults(index, nprobe=params.get("nprobe"), ef_search=params.get("ef_search"))
+    with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    logger.info(f"Memory-mapped FAISS index with {index.ntotal} vectors from {index_dir}")
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+
+
+
+
+# ---- Index updates (versioned snapshots) ----
+def _read_store(index_dir: str):
+    """Writable (heap) copy of a saved store: (index, docstore, index_to_docstore_id)."""
+    index = faiss.read_index(os.path.join(index_dir, "index.faiss"))
+    with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return index, docstore, index_to_docstore_id
+
+
+def _write_store(index_dir: str, index: Optional[faiss.Index], docstore, index_to_docstore_id: Dict[int, str]):
+    """Write the files FAISS.save_local writes (index None: the caller links index.faiss unchanged)."""
+    if index is not None:
+        faiss.write_index(index, os.path.join(index_dir, "index.faiss"))
+    with open(os.path.join(index_dir, "index.pkl"), "wb") as f:
+        pickle.dump((docstore, index_to_docstore_id), f)
+
+
+def _write_catalog(out_dir: str, parent_dir: Optional[str], docstore, index_to_docstore_id: Dict[int, str]):
+    """Chunk catalog of a new snapshot (rebuilt from the docstore, so deleted chunks drop out)."""
+    params = ChunkCatalog(catalog_dir(parent_dir)).params if parent_dir and catalog_exists(parent_dir) else {}
+    kwargs = {"section_size": params["section_size"]} if "section_size" in params else {}
+    build_chunk_catalog(catalog_metadata(docstore, index_to_docstore_id), catalog_dir(out_dir), **kwargs)
+
+
+def _next_id(index_dir: str, index_to_docstore_id: Dict[int, str], tombstones: np.ndarray) -> int:
+    """First unused chunk id; ids are never reused, so cached hits cannot point at a different chunk."""
+    next_id = read_manifest(index_dir).get("next_id")
+    if next_id is None:
+        next_id = max(max(index_to_docstore_id, default=-1), int(tombstones.max()) if len(tombstones) else -1) + 1
+    return int(next_id)
+
+
+def _require_parent(parent_dir: Optional[str]) -> str:
+    if parent_dir is None:
+        raise FileNotFoundError("❌ No FAISS index to update; build one with build_langchain_faiss.py first")
+    return parent_dir
+
+
+def add_documents(documents: List[Document], embeddings, snapshots: Optional[SnapshotManager] = None) -> Tuple[str, List[int]]:
+    """
+    Embed documents and publish a snapshot with them added
+
+    The live snapshot is never modified: the new one gets a fresh index.faiss /
+    index.pkl, everything else is hard-linked. New chunks become searchable
+    lexically, and join their filing's coarse group, at the next compaction.
 
+    Args:
+        documents: Chunks to add
+        embeddings: Embedding model (the one the index was built with)
+        snapshots: Snapshot root (default: the API's index root)
+
+    Returns:
+        (published snapshot directory, chunk ids assigned to the documents)
+    """
+    snapshots = snapshots or SnapshotManager(get_faiss_index_root())
+    # Embedding is the slow part and needs no lock
+    vectors = np.array(embeddings.embed_documents([doc.page_content for doc in documents]), dtype=np.float32)
+    vectors = vectors.reshape(len(documents), -1)
+    added: List[int] = []
+
+    def write(out_dir: str, parent_dir: Optional[str]) -> Dict[str, Any]:
+        parent_dir = _require_parent(parent_dir)
+        index, docstore, index_to_docstore_id = _read_store(parent_dir)
+        index = to_id_map(index)
+        tombstones = load_tombstones(parent_dir)
+        first_id = _next_id(parent_dir, index_to_docstore_id, tombstones)
+        ids = np.arange(first_id, first_id + len(documents), dtype=np.int64)
+        index.add_with_ids(vectors, ids)
+        docstore_ids = [str(uuid.uuid4()) for _ in documents]
+        docstore.add(dict(zip(docstore_ids, documents)))
+        index_to_docstore_id.update(zip(ids.tolist(), docstore_ids))
+        _write_store(out_dir, index, docstore, index_to_docstore_id)
+        _write_catalog(out_dir, parent_dir, docstore, index_to_docstore_id)
+        carry_over(parent_dir, out_dir, [INDEX_PARAMS_FILE, TOMBSTONES_FILE, LEXICAL_DIR, COARSE_DIR])
+        added.extend(ids.tolist())
+        return {
+            "next_id": first_id + len(documents),
+            "ntotal": int(index.ntotal),
+            "live": len(index_to_docstore_id),
+            "tombstones": len(tombstones),
+            "lexical_pending": read_manifest(parent_dir).get("lexical_pending", 0) + len(documents),
+            "added": len(documents),
+        }
+
+    return snapshots.publish(write, "add"), added
+
+
+def delete_documents(chunk_ids: Iterable[int] = (), source: Optional[str] = None,
+                     snapshots: Optional[SnapshotManager] = None) -> Tuple[str, List[int]]:
+    """
+    Publish a snapshot without the given chunks
+
+    Only the docstore is rewritten: the vectors stay in index.faiss (hard-linked)
+    as tombstones that searches skip, until compact_index drops them.
+
+    Args:
+        chunk_ids: Chunk (FAISS) ids to delete
+        source: Also delete every chunk whose "source" or "file" metadata is this name
+        snapshots: Snapshot root (default: the API's index root)
+
+    Returns:
+        (published snapshot directory, deleted chunk ids)
+
+    Raises:
+        LookupError: Nothing matched (no snapshot is published)
+    """
+    snapshots = snapshots or SnapshotManager(get_faiss_index_root())
+    requested = {int(chunk_id) for chunk_id in chunk_ids}
+    deleted: List[int] = []
+
+    def write(out_dir: str, parent_dir: Optional[str]) -> Dict[str, Any]:
+        parent_dir = _require_parent(parent_dir)
+        with open(os.path.join(parent_dir, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        targets = requested & index_to_docstore_id.keys()
+        if source:
+            for chunk_id, docstore_id in index_to_docstore_id.items():
+                metadata = getattr(docstore.search(docstore_id), "metadata", None) or {}
+                if source in (metadata.get("source"), metadata.get("file")):
+                    targets.add(chunk_id)
+        if not targets:
+            raise LookupError("No matching chunks to delete")
+
+        tombstones = load_tombstones(parent_dir)
+        next_id = _next_id(parent_dir, index_to_docstore_id, tombstones)
+        docstore.delete([index_to_docstore_id.pop(chunk_id) for chunk_id in sorted(targets)])
+        tombstones = np.union1d(tombstones, np.array(sorted(targets), dtype=np.int64))
+        _write_store(out_dir, None, docstore, index_to_docstore_id)
+        _write_catalog(out_dir, parent_dir, docstore, index_to_docstore_id)
+        carry_over(parent_dir, out_dir, ["index.faiss", INDEX_PARAMS_FILE, LEXICAL_DIR, COARSE_DIR])
+        save_tombstones(out_dir, tombstones)
+        deleted.extend(sorted(targets))
+        manifest = read_manifest(parent_dir)
+        return {
+            "next_id": next_id,
+            "ntotal": manifest.get("ntotal", len(index_to_docstore_id) + len(tombstones)),
+            "live": len(index_to_docstore_id),
+            "tombstones": len(tombstones),
+            "lexical_pending": manifest.get("lexical_pending", 0),
+            "deleted": len(targets),
+        }
+
+    return snapshots.publish(write, "delete"), deleted
+
+
+def compact_index(snapshots: Optional[SnapshotManager] = None, index_spec: Optional[str] = None) -> str:
+    """
+    Publish a snapshot with tombstoned vectors removed and the lexical and coarse indexes rebuilt
+
+    Flat, scalar / product quantized and IVF indexes drop the ids in place
+    (IVF keeps its trained centroids); HNSW and refined indexes cannot remove,
+    so they are rebuilt from their stored vectors with the spec they were built with.
+
+    Args:
+        snapshots: Snapshot root (default: the API's index root)
+        index_spec: Rebuild with this spec instead (e.g. to switch index type)
+
+    Returns:
+        Published snapshot directory
+
+    Raises:
+        LookupError: Nothing is pending (no snapshot is published)
+    """
+    snapshots = snapshots or SnapshotManager(get_faiss_index_root())
+
+    def write(out_dir: str, parent_dir: Optional[str]) -> Dict[str, Any]:
+        parent_dir = _require_parent(parent_dir)
+        tombstones = load_tombstones(parent_dir)
+        if index_spec is None and not len(tombstones) and not read_manifest(parent_dir).get("lexical_pending"):
+            # e.g. another worker compacted while this one waited for the lock
+            raise LookupError("Nothing to compact")
+        index, docstore, index_to_docstore_id = _read_store(parent_dir)
+        index = to_id_map(index)
+        next_id = _next_id(parent_dir, index_to_docstore_id, tombstones)
+        params = load_index_params(parent_dir)
+        live = np.array(sorted(index_to_docstore_id), dtype=np.int64)
+
+        rebuild = index_spec is not None
+        if not rebuild and len(tombstones):
+            rebuild = not remove_ids(index, tombstones)
+        if rebuild:
+            spec = IndexSpec.parse(index_spec) if index_spec else IndexSpec(**params["spec"]) if "spec" in params else IndexSpec()
+            index, params = build_index(stored_vectors(index, live), spec, ids=live)
+        elif params:
+            params = {**params, "ntotal": int(index.ntotal)}
+        _write_store(out_dir, index, docstore, index_to_docstore_id)
+        _write_catalog(out_dir, parent_dir, docstore, index_to_docstore_id)
+        if params:
+            save_index_params(out_dir, params)
+
+        if lexical_index_exists(parent_dir):
+            lexical_params = LexicalIndex(lexical_dir(parent_dir)).params
+            texts = [docstore.search(index_to_docstore_id[chunk_id]).page_content for chunk_id in live]
+            build_lexical_index(texts, lexical_dir(out_dir), k1=lexical_params.get("k1", 1.2),
+                                b=lexical_params.get("b", 0.75), chunk_ids=live)
+        if coarse_index_exists(parent_dir):
+            # Regroup so uploaded chunks join their filings and removed ids leave the groups
+            names = []
+            for chunk_id in live:
+                metadata = getattr(docstore.search(index_to_docstore_id[chunk_id]), "metadata", None) or {}
+                names.append(metadata.get("file") or metadata.get("source") or "")
+            build_coarse_index(stored_vectors(index, live), names, coarse_dir(out_dir), chunk_ids=live,
+                               metric=index.metric_type,
+                               section_size=CoarseIndex(coarse_dir(parent_dir)).params["section_size"])
+        return {
+            "next_id": next_id,
+            "ntotal": int(index.ntotal),
+            "live": len(index_to_docstore_id),
+            "tombstones": 0,
+            "lexical_pending": 0,
+            "removed": len(tombstones),
+            "rebuilt": rebuild,
+        }
+
+    return snapshots.publish(write, "compact")
+
+
+def process_and_embed_file(filename: str, content=None, embeddings=None,
+                           snapshots: Optional[SnapshotManager] = None) -> str:
+    """
+    Chunk an uploaded file and add it to the index as a new snapshot
+
+    Args:
+        filename: Uploaded file name; chunks are named "<stem>_chunk_<i>.txt" so
+            ticker / form / date filters work for files named like the corpus
+        content: PDF bytes, or the document text
+        embeddings: Embedding model (default: load MiniLM, as the index was built with)
+        snapshots: Snapshot root (default: the API's index root)
+
+    Returns:
+        Directory of the published snapshot
+    """
     ext = os.path.splitext(filename)[-1].lower()
 
     # 📝 Extract content if PDF
     if ext == ".pdf":
-        temp_dir = "backend/temp_uploads"
-        os.makedirs(temp_dir, exist_ok=True)  # Ensure folder exists
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        file_path = f"{temp_dir}/{unique_filename}"
-        try:
-            with open(file_path, "wb") as f:
-                f.write(content.encode() if isinstance(content, str) else content)
-
-            doc = fitz.open(file_path)
+        data = content.encode() if isinstance(content, str) else content
+        with fitz.open(stream=data, filetype="pdf") as doc:
             content = "\n".join(page.get_text() for page in doc)
-            doc.close()
-        finally:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-
-    elif not content:
+    elif isinstance(content, bytes):
+        content = content.decode("utf-8")
+    if not content:
         raise ValueError("No content provided for non-PDF file")
 
-    # 📄 Chunk & embed
+    # 📄 Chunk (also appended to the chunk store, so a full rebuild keeps the upload)
+    snapshots = snapshots or SnapshotManager(get_faiss_index_root())
+    stem = os.path.splitext(os.path.basename(filename))[0]
     chunks = [content[i:i+500] for i in range(0, len(content), 500)]
-    docs = [Document(page_content=chunk, metadata={"source": filename}) for chunk in chunks]
+    docs = []
+    # The writer lock also serialises concurrent uploads appending to the store
+    with snapshots.lock(), ChunkStoreWriter(CHUNK_STORE_DIR) as store:
+        for i, chunk in enumerate(chunks):
+            chunk_name = f"{stem}_chunk_{i}.txt"
+            store.add(chunk_name, chunk)
+            docs.append(Document(page_content=chunk, metadata={
+                "source": filename, "file": chunk_name, "chunk_number": i,
+                "start_char": i * 500, "end_char": i * 500 + len(chunk),
+            }))
 
-    embedder = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    vectorstore = FAISS.load_local("embeddings/finsight_index.faiss", embeddings=embedder)
-    vectorstore.add_documents(docs)
-    vectorstore.save_local("embeddings/finsight_index.faiss") 
\ No newline at end of file
+    embedder = embeddings or HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    snapshot_dir, ids = add_documents(docs, embedder, snapshots=snapshots)
+    print(f"✅ Indexed {len(ids)} chunks of {filename} into {snapshot_dir}")
+    return snapshot_dir
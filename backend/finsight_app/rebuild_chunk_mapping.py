@@ -1,17 +1,24 @@
 import os
 import re
 import pickle
-from backend.finsight_app.path_utils import PROCESSED_DATA_DIR, EMBEDDINGS_DIR
+from backend.finsight_app.path_utils import PROCESSED_DATA_DIR, EMBEDDINGS_DIR, CHUNK_STORE_DIR
+from backend.finsight_app.chunk_store import ChunkStore, store_exists
 
 PROCESSED_DIR = PROCESSED_DATA_DIR
 MAPPING_PATH = os.path.join(EMBEDDINGS_DIR, 'chunk_mapping.pkl')
 
 # Regex to extract ticker from any chunked file (10k, 10q, company_info, financial_data, stock_data, etc.)
-CHUNK_RE = re.compile(r"([A-Za-z]+)_(?:10k|10q|company_info|financial_data|stock_data).*_chunk_\\d+\\.txt", re.IGNORECASE)
+CHUNK_RE = re.compile(r"([A-Za-z]+)_(?:10-?k|10-?q|company_info|financial_data|stock_data).*_chunk_\d+\.txt", re.IGNORECASE)
 
 chunk_mapping = []
 
-for fname in os.listdir(PROCESSED_DIR):
+# Chunk names in store order (legacy layout: one .txt file per chunk)
+if store_exists(CHUNK_STORE_DIR):
+    chunk_names = ChunkStore(CHUNK_STORE_DIR).names
+else:
+    chunk_names = os.listdir(PROCESSED_DIR)
+
+for fname in chunk_names:
     match = CHUNK_RE.match(fname)
     if match:
         ticker = match.group(1).upper()
@@ -0,0 +1,146 @@
+"""
+FinSight Copilot - Reranking Service
+Dynamic micro-batching of CrossEncoder scoring across concurrent requests
+"""
+
+import asyncio
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from finsight_app.executors import BoundedExecutor, model_executor
+from finsight_app.metrics import MODEL_SECONDS
+
+Pair = Tuple[str, str]
+
+
+class RerankBatcher:
+    """
+    Collects (query, chunk) pairs from concurrent requests and scores them together.
+
+    The first request to arrive opens a batching window of `window_ms`;
+    pairs from every request that arrives before it closes (or until
+    `max_batch_size` pairs are waiting) go through a single batched forward
+    pass. Pairs are sorted by token length first so each internal batch is
+    padded as little as possible, and scores are dispatched back to the
+    waiting requests in their original order.
+    """
+
+    def __init__(
+        self,
+        reranker,
+        window_ms: float = 5.0,
+        max_batch_size: int = 64,
+        predict_batch_size: int = 32,
+        executor: BoundedExecutor = model_executor,
+    ):
+        """
+        Initialize the batcher
+
+        Args:
+            reranker: CrossEncoder (anything with predict(pairs, batch_size=...))
+            window_ms: How long to wait for more requests after the first one
+            max_batch_size: Flush immediately once this many pairs are waiting
+            predict_batch_size: Batch size for the model's internal mini-batches
+            executor: Executor the forward pass runs on
+        """
+        self.reranker = reranker
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.predict_batch_size = predict_batch_size
+        self.executor = executor
+
+        self._pending: List[Tuple[List[Pair], asyncio.Future]] = []
+        self._pending_pairs = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.batches = 0
+        self.pairs_scored = 0
+
+    # ---- Model side (runs on the executor) ----
+    def _token_lengths(self, pairs: Sequence[Pair]) -> List[int]:
+        tokenizer = getattr(self.reranker, "tokenizer", None)
+        if tokenizer is None:
+            return [len(query) + len(text) for query, text in pairs]
+        encoded = tokenizer(
+            [query for query, _ in pairs],
+            [text for _, text in pairs],
+            truncation=True,
+            max_length=getattr(self.reranker, "max_length", None) or 512
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def _predict_sorted(self, pairs: List[Pair]) -> np.ndarray:
+        order = np.argsort(self._token_lengths(pairs), kind="stable")
+        start = time.perf_counter()
+        sorted_scores = self.reranker.predict(
+            [list(pairs[i]) for i in order],
+            batch_size=self.predict_batch_size,
+            show_progress_bar=False
+        )
+        MODEL_SECONDS.observe(time.perf_counter() - start, model="reranker")
+        scores = np.empty(len(pairs), dtype=np.float32)
+        scores[order] = np.asarray(sorted_scores, dtype=np.float32).reshape(-1)
+        return scores
+
+    # ---- Batching side (runs on the event loop) ----
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self._pending_pairs = 0
+        asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[Tuple[List[Pair], asyncio.Future]]):
+        pairs = [pair for request_pairs, _ in batch for pair in request_pairs]
+        try:
+            scores = await self.executor.run(self._predict_sorted, pairs)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.pairs_scored += len(pairs)
+        offset = 0
+        for request_pairs, future in batch:
+            if not future.done():
+                future.set_result(scores[offset:offset + len(request_pairs)].tolist())
+            offset += len(request_pairs)
+
+    async def score(self, pairs: Sequence[Pair]) -> List[float]:
+        """
+        Score (query, chunk) pairs, batched with other concurrent callers
+
+        Args:
+            pairs: (query, chunk text) pairs
+
+        Returns:
+            One relevance score per pair, in input order
+        """
+        if not pairs:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(([tuple(pair) for pair in pairs], future))
+        self._pending_pairs += len(pairs)
+
+        if self._pending_pairs >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def stats(self) -> dict:
+        """Batching counters for health and metrics endpoints."""
+        return {
+            "batches": self.batches,
+            "pairs_scored": self.pairs_scored,
+            "avg_batch_size": round(self.pairs_scored / self.batches, 2) if self.batches else 0.0,
+            "pending_pairs": self._pending_pairs,
+        }
@@ -2,55 +2,79 @@ import faiss
 import pickle
 from sentence_transformers import SentenceTransformer
 import os
+import time
 import numpy as np
 from backend.finsight_app.path_utils import (
-    get_faiss_index_dir, 
+    get_faiss_index_root, 
     DATA_DIR, 
     EMBEDDINGS_DIR, 
-    PROCESSED_DATA_DIR
+    PROCESSED_DATA_DIR,
+    CHUNK_STORE_DIR
 )
+from backend.finsight_app.chunk_store import ChunkStore, read_chunk, store_exists
+from backend.finsight_app.filtered_search import ChunkFilterIndex, filtered_search
+try:
+    # Same module object as the API server's /metrics registry when backend/ is on sys.path
+    from finsight_app.metrics import INDEX_SEARCH_SECONDS, MODEL_SECONDS
+except ImportError:
+    from backend.finsight_app.metrics import INDEX_SEARCH_SECONDS, MODEL_SECONDS
+
+
+def _timed_encode(model, texts):
+    start = time.perf_counter()
+    embeddings = model.encode(texts)
+    MODEL_SECONDS.observe(time.perf_counter() - start, model="embedding")
+    return embeddings
+
+
+def _timed_search(index, query_embedding, k):
+    start = time.perf_counter()
+    result = index.search(query_embedding, k)
+    INDEX_SEARCH_SECONDS.observe(time.perf_counter() - start, index="chunks")
+    return result
+
 
 class RetrievalSystem:
     def __init__(self, model_name="all-MiniLM-L6-v2"):
-        self.index_dir = get_faiss_index_dir()
+        self.index_dir = get_faiss_index_root()
         self.model = SentenceTransformer(model_name)
         self.index = faiss.read_index(os.path.join(self.index_dir, "index.faiss"))
         with open(os.path.join(self.index_dir, "chunk_mapping.pkl"), "rb") as f:
             self.chunk_files = pickle.load(f)
+        # Chunk texts are slices of one memory-mapped blob instead of a file open per hit
+        self.chunk_store = ChunkStore(CHUNK_STORE_DIR) if store_exists(CHUNK_STORE_DIR) else None
+        # Per-company / form / filing-date ids, so filtered searches only score matching chunks
+        self.filter_index = ChunkFilterIndex(self.chunk_files)
 
     def search(self, query, top_k=5):
-        query_embedding = self.model.encode([query])
-        distances, indices = self.index.search(query_embedding, top_k)
-        results = []
-
-        for idx in indices[0]:
-            meta = self.chunk_files[idx]
-            file_path = os.path.join(PROCESSED_DATA_DIR, meta["file"])
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            results.append(content)
-
-        return results
-
-    def search_by_company(self, query, company, top_k=5):
-        query_embedding = self.model.encode([query])
-        distances, indices = self.index.search(query_embedding, top_k * 2)  # get more and filter
-        results = []
-        count = 0
-        for idx in indices[0]:
-            meta = self.chunk_files[idx]
-            if meta["company"] == company:
-                file_path = os.path.join(PROCESSED_DATA_DIR, meta["file"])
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                results.append(content)
-                count += 1
-                if count >= top_k:
-                    break
-        return results
+        query_embedding = _timed_encode(self.model, [query])
+        distances, indices = _timed_search(self.index, query_embedding, top_k)
+        return [self._chunk_text(idx) for idx in indices[0] if idx != -1]
+
+    def search_batch(self, queries, top_k=5):
+        # One batched encode and one multi-row index scan for every query
+        query_embeddings = _timed_encode(self.model, list(queries))
+        distances, indices = _timed_search(self.index, query_embeddings, top_k)
+        return [[self._chunk_text(idx) for idx in row if idx != -1] for row in indices]
+
+    def _chunk_text(self, idx):
+        meta = self.chunk_files[idx]
+        name = meta["file"] if isinstance(meta, dict) else meta
+        return read_chunk(name, self.chunk_store, PROCESSED_DATA_DIR)
+
+    def search_by_company(self, query, company, top_k=5, form=None, date_from=None, date_to=None):
+        filters = {"company": company, "form": form, "date_from": date_from, "date_to": date_to}
+        allowed = self.filter_index.select(filters)
+        if allowed is None:
+            return self.search(query, top_k)
+        query_embedding = np.asarray(_timed_encode(self.model, [query]), dtype=np.float32)
+        start = time.perf_counter()
+        distances, indices = filtered_search(self.index, query_embedding, top_k, allowed)
+        INDEX_SEARCH_SECONDS.observe(time.perf_counter() - start, index="chunks")
+        return [self._chunk_text(idx) for idx in indices]
 
 # Global constants using new path structure
-EMBEDDINGS_PATH = get_faiss_index_dir()
+EMBEDDINGS_PATH = get_faiss_index_root()
 MODEL_NAME = 'all-MiniLM-L6-v2'
 
 # Load model, index, and mapping once - with error handling
@@ -80,34 +104,30 @@ except Exception as e:
     print(f"⚠️ Error loading FAISS index: {e}")
     index = None
 
-# Preload chunk texts - with error handling
-chunk_texts = {}
-if mapping and os.path.exists(PROCESSED_DATA_DIR):
-    for fname in mapping:
-        path = os.path.join(PROCESSED_DATA_DIR, fname)
-        if os.path.exists(path):
-            try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    chunk_texts[fname] = f.read()
-            except Exception as e:
-                print(f"⚠️ Error loading chunk {fname}: {e}")
-        else:
-            print(f"⚠️ Chunk file not found: {path}")
+# Map the chunk store instead of preloading every chunk text onto the heap
+try:
+    chunk_store = ChunkStore(CHUNK_STORE_DIR) if store_exists(CHUNK_STORE_DIR) else None
+except Exception as e:
+    print(f"⚠️ Error opening chunk store: {e}")
+    chunk_store = None
 
 def retrieve_context(query, k=3):
     if not index or not mapping:
         print("⚠️ Index or mapping not available")
         return []
     
-    query_emb = model.encode([query])
-    D, I = index.search(query_emb, k)
+    query_emb = _timed_encode(model, [query])
+    D, I = _timed_search(index, query_emb, k)
     results = []
     for idx in I[0]:
         if idx < len(mapping):
             fname = mapping[idx]
             print(f"Retrieved chunk idx: {idx}, file: {fname}")
-            if fname in chunk_texts:
-                results.append(chunk_texts[fname])
+            text = read_chunk(fname, chunk_store, PROCESSED_DATA_DIR)
+            if text is not None:
+                results.append(text)
+            else:
+                print(f"⚠️ Chunk not found: {fname}")
     return results
 
 CHUNK_MAPPING_FILE = os.path.join(EMBEDDINGS_DIR, "chunk_mapping.pkl") 
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+FinSight Copilot - Request Coalescing
+Single-flight execution of identical in-flight questions, including streamed answers
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from finsight_app.memo import normalize_query
+
+T = TypeVar("T")
+
+
+def flight_key(question: str, scope: str) -> str:
+    """Coalescing key: the normalised question plus every option that changes the answer."""
+    return f"{normalize_query(question)}|{scope}"
+
+
+class _Broadcast:
+    """Replay buffer shared by every subscriber of one streamed flight."""
+
+    def __init__(self):
+        self.events: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self):
+        await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical requests onto one execution.
+
+    The first caller for a key starts the work; callers arriving while it
+    is still running attach to it instead of starting their own. For plain
+    calls every waiter receives the same result (or exception). For streams
+    each subscriber first replays the events produced so far and then
+    follows the live stream, so late joiners still get the full answer.
+    The key is released as soon as the execution finishes, so results are
+    never served stale — that is the answer cache's job.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self.executions = {"call": 0, "stream": 0}
+        self.coalesced = {"call": 0, "stream": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `fn()` once per key among concurrent callers
+
+        Args:
+            key: Coalescing key (see flight_key)
+            fn: Coroutine factory doing the actual work
+
+        Returns:
+            The shared result
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+            self.executions["call"] += 1
+        else:
+            self.coalesced["call"] += 1
+        # Shield so one caller disconnecting does not cancel the work for the others
+        return await asyncio.shield(task)
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Iterate `factory()` once per key and broadcast its items to every concurrent subscriber
+
+        The producer is cancelled if every subscriber goes away before it finishes.
+
+        Args:
+            key: Coalescing key (see flight_key)
+            factory: Async iterator factory doing the actual work
+
+        Yields:
+            Every item of the shared stream, from the beginning
+        """
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = _Broadcast()
+            self._streams[key] = flight
+            flight.task = asyncio.ensure_future(self._produce(key, flight, factory))
+            self.executions["stream"] += 1
+        else:
+            self.coalesced["stream"] += 1
+
+        flight.subscribers += 1
+        position = 0
+        try:
+            while True:
+                while position < len(flight.events):
+                    yield flight.events[position]
+                    position += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                flight.task.cancel()
+
+    async def _produce(self, key: str, flight: _Broadcast, factory: Callable[[], AsyncIterator[T]]):
+        try:
+            async for item in factory():
+                flight.events.append(item)
+                flight.notify()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._streams.get(key) is flight:
+                del self._streams[key]
+            flight.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        """Execution and coalescing counters for health and metrics endpoints."""
+        return {
+            "executions": dict(self.executions),
+            "coalesced": dict(self.coalesced),
+            "saved_executions": sum(self.coalesced.values()),
+            "in_flight": len(self._calls) + len(self._streams),
+        }
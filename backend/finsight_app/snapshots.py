@@ -0,0 +1,242 @@
+"""
+FinSight Copilot - Index Snapshots
+Immutable, versioned index directories with an atomically switched CURRENT pointer
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialised within one process
+    fcntl = None
+
+try:
+    # Same module object as the API server when backend/ is on sys.path
+    from finsight_app.path_utils import CURRENT_SNAPSHOT_FILE, SNAPSHOTS_SUBDIR
+except ImportError:
+    from backend.finsight_app.path_utils import CURRENT_SNAPSHOT_FILE, SNAPSHOTS_SUBDIR
+
+MANIFEST_FILE = "snapshot.json"
+TOMBSTONES_FILE = "tombstones.npy"
+LOCK_FILE = ".write.lock"
+
+# Writer: (new snapshot dir, parent snapshot dir or None) -> manifest fields
+SnapshotWriter = Callable[[str, Optional[str]], Optional[Dict[str, Any]]]
+
+
+def link_or_copy(src: str, dst: str):
+    """Hard-link an unchanged file into a new snapshot (copy where links are not supported)."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def carry_over(parent_dir: Optional[str], out_dir: str, names: List[str]):
+    """Link files / directories that a write does not change from the parent snapshot."""
+    if parent_dir is None:
+        return
+    for name in names:
+        src = os.path.join(parent_dir, name)
+        if os.path.isdir(src):
+            shutil.copytree(src, os.path.join(out_dir, name), copy_function=link_or_copy)
+        elif os.path.exists(src):
+            link_or_copy(src, os.path.join(out_dir, name))
+
+
+def read_manifest(index_dir: str) -> Dict[str, Any]:
+    """Manifest of a snapshot directory, or {} (e.g. a pre-snapshot index)."""
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except OSError:
+        return {}
+
+
+def load_tombstones(index_dir: str) -> np.ndarray:
+    """Sorted ids deleted since the last compaction (still in index.faiss, gone from the docstore)."""
+    path = os.path.join(index_dir, TOMBSTONES_FILE)
+    if not os.path.exists(path):
+        return np.empty(0, dtype=np.int64)
+    return np.load(path)
+
+
+def save_tombstones(index_dir: str, ids: np.ndarray):
+    if len(ids):
+        np.save(os.path.join(index_dir, TOMBSTONES_FILE), np.unique(np.asarray(ids, dtype=np.int64)))
+
+
+class SnapshotManager:
+    """
+    Versioned index snapshots under one root.
+
+    Every write builds a complete new directory (unchanged files are
+    hard-linked from the parent), renames it into place and then replaces
+    the CURRENT pointer with os.replace, so readers see either the old or
+    the new snapshot, never a half-written one. Snapshots are never
+    modified after publishing. Writers are serialised with a file lock,
+    which also covers pre-forked workers sharing the root.
+    """
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root: Index root (path_utils.get_faiss_index_root())
+        """
+        self.root = root
+        self.snapshots_dir = os.path.join(root, SNAPSHOTS_SUBDIR)
+        self._thread_lock = threading.Lock()
+
+    # ---- Reading ----
+    def current(self) -> Optional[str]:
+        """Name of the live snapshot, or None before the first publish."""
+        try:
+            with open(os.path.join(self.root, CURRENT_SNAPSHOT_FILE), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.snapshots_dir, name)
+
+    def base_dir(self) -> Optional[str]:
+        """Directory new writes start from: the live snapshot, else a pre-snapshot index in the root."""
+        name = self.current()
+        if name is not None:
+            return self.path(name)
+        if os.path.exists(os.path.join(self.root, "index.faiss")):
+            return self.root
+        return None
+
+    def list(self) -> List[str]:
+        """Published snapshot names, oldest first."""
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        return sorted(name for name in os.listdir(self.snapshots_dir) if name.startswith("v"))
+
+    def manifest(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """Manifest of a snapshot (default: the live one), or {} if there is none."""
+        name = name or self.current()
+        return read_manifest(self.path(name)) if name is not None else {}
+
+    # ---- Writing ----
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Exclusive writer lock (threads and processes)."""
+        os.makedirs(self.root, exist_ok=True)
+        with self._thread_lock, open(os.path.join(self.root, LOCK_FILE), "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _next_name(self) -> str:
+        versions = [int(name[1:]) for name in self.list() if name[1:].isdigit()]
+        return f"v{max(versions, default=0) + 1:06d}"
+
+    def _point(self, name: str):
+        tmp = os.path.join(self.root, CURRENT_SNAPSHOT_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.root, CURRENT_SNAPSHOT_FILE))
+
+    def publish(self, write: SnapshotWriter, operation: str) -> str:
+        """
+        Build a new snapshot from the live one and make it current
+
+        Args:
+            write: Writes the new snapshot's files given (new dir, parent dir or None)
+                and returns manifest fields (e.g. ntotal, next_id)
+            operation: What produced the snapshot (build, add, delete, compact)
+
+        Returns:
+            Directory of the published snapshot
+        """
+        with self.lock():
+            parent_dir = self.base_dir()
+            name = self._next_name()
+            tmp_dir = os.path.join(self.snapshots_dir, f".{name}.tmp")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            try:
+                start = time.perf_counter()
+                fields = write(tmp_dir, parent_dir) or {}
+                manifest = {
+                    "version": name,
+                    "parent": self.current(),
+                    "operation": operation,
+                    "created_at": time.time(),
+                    "write_seconds": round(time.perf_counter() - start, 3),
+                    **fields,
+                }
+                with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+                    json.dump(manifest, f, indent=2)
+                final_dir = self.path(name)
+                os.rename(tmp_dir, final_dir)
+            except BaseException:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+            self._point(name)
+        print(f"📸 Published index snapshot {name} ({operation})")
+        return final_dir
+
+    def publish_derived(self, build: Callable[[str, str], None], replaces: List[str], operation: str) -> str:
+        """
+        Publish a copy of the live snapshot with derived files added or rebuilt (e.g. a side index)
+
+        Every other file is hard-linked from the parent and its manifest fields
+        (ntotal, next_id, ...) carry over, so the published snapshot is never touched.
+
+        Args:
+            build: Writes the derived files given (new dir, parent dir); reads the index from the parent
+            replaces: Top-level names build writes (not carried over)
+            operation: Manifest operation name
+
+        Returns:
+            Directory of the published snapshot
+
+        Raises:
+            FileNotFoundError: There is no index under the root yet
+        """
+        skip = {MANIFEST_FILE, LOCK_FILE, SNAPSHOTS_SUBDIR, CURRENT_SNAPSHOT_FILE, *replaces}
+
+        def write(out_dir: str, parent_dir: Optional[str]) -> Dict[str, Any]:
+            if parent_dir is None:
+                raise FileNotFoundError(f"No index under {self.root} to derive from")
+            carry_over(parent_dir, out_dir, [name for name in os.listdir(parent_dir)
+                                             if name not in skip and not name.startswith(".")])
+            build(out_dir, parent_dir)
+            own = ("version", "parent", "operation", "created_at", "write_seconds")
+            return {key: value for key, value in read_manifest(parent_dir).items() if key not in own}
+
+        return self.publish(write, operation)
+
+    def prune(self, keep: int = 3) -> List[str]:
+        """
+        Delete all but the newest `keep` snapshots (never the live one)
+
+        Processes still serving an older snapshot keep working: its mapped
+        files stay valid until they are closed.
+
+        Returns:
+            Names of the deleted snapshots
+        """
+        current = self.current()
+        names = self.list()
+        removed = [name for name in names[:max(0, len(names) - keep)] if name != current]
+        for name in removed:
+            shutil.rmtree(self.path(name), ignore_errors=True)
+        return removed
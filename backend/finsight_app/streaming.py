@@ -0,0 +1,98 @@
+"""
+FinSight Copilot - Streaming Helpers
+Server-sent-event formatting and async iteration over blocking token streams
+"""
+
+import asyncio
+import json
+import threading
+from typing import Any, AsyncIterator, Iterator, Optional
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",  # stop nginx from buffering the stream
+}
+
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Format one server-sent event
+
+    Args:
+        event: Event name (sources, token, done, error)
+        data: JSON-serialisable payload
+
+    Returns:
+        SSE frame terminated by a blank line
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class _End:
+    """Marks the end of a drained iterator, carrying its exception if it failed."""
+
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+async def iterate_blocking(iterator: Iterator[Any], name: str = "stream") -> AsyncIterator[Any]:
+    """
+    Consume a blocking iterator without stalling the event loop
+
+    One dedicated thread drains the iterator into an asyncio.Queue for the
+    lifetime of the stream. Waiting for the next token from a model or an
+    HTTP stream therefore never blocks other requests, never holds a worker
+    of the shared executors, and cannot be rejected with ExecutorSaturated
+    once the stream has started.
+
+    If the consumer stops early, the thread exits after the item it is
+    waiting for (callers unblock it, e.g. by cancelling the streamer).
+
+    Args:
+        iterator: Blocking iterator (e.g. a TextIteratorStreamer)
+        name: Thread name suffix, for debugging
+
+    Yields:
+        Items from the iterator
+
+    Raises:
+        Whatever the iterator raised
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # Event loop closed: nobody is listening any more
+            stop.set()
+
+    def drain():
+        error = None
+        try:
+            for item in iterator:
+                if stop.is_set():
+                    break
+                put(item)
+        except Exception as e:
+            error = e
+        finally:
+            close = getattr(iterator, "close", None)
+            if stop.is_set() and callable(close):
+                close()
+            put(_End(error))
+
+    threading.Thread(target=drain, name=f"finsight-{name}", daemon=True).start()
+    try:
+        while True:
+            item = await queue.get()
+            if isinstance(item, _End):
+                if item.error is not None:
+                    raise item.error
+                return
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,330 @@
+"""
+FinSight Copilot - Stub Components
+Deterministic stand-ins for the embedding model, local LLM, reranker and Gemini API,
+with configurable latencies, for load tests and benchmarks without models or network
+"""
+
+import json
+import queue
+import random
+import socket
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+WORDS = ("revenue net sales iphone services margin operating income risk factors supply chain "
+         "dividends share repurchase cash flow segment americas europe china fiscal quarter "
+         "guidance liquidity debt capital expenditures research development competition tariffs").split()
+TICKERS = ("AAPL", "MSFT", "GOOGL", "AMZN", "NVDA", "META", "TSLA", "JPM")
+FORMS = ("10-K", "10-Q")
+
+
+def _seed(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def _sleep_ms(ms: float):
+    if ms > 0:
+        time.sleep(ms / 1000.0)
+
+
+def synthetic_filing_text(rng: random.Random, sentences: int = 8) -> str:
+    """A paragraph of filing-like sentences."""
+    return " ".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+def synthetic_corpus(num_chunks: int = 2000, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Synthetic chunk texts with filing-style metadata
+
+    Returns:
+        List of {"text", "metadata"} dicts
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(num_chunks):
+        ticker = rng.choice(TICKERS)
+        form = rng.choice(FORMS)
+        year = rng.randint(2019, 2024)
+        corpus.append({
+            "text": f"{ticker} {form} {year}. " + synthetic_filing_text(rng),
+            "metadata": {"source": f"{ticker}_{form}_{year}-12-31.txt", "chunk": i},
+        })
+    return corpus
+
+
+def synthetic_questions(count: int = 50, seed: int = 0) -> List[str]:
+    """Distinct analyst-style questions."""
+    rng = random.Random(seed)
+    templates = (
+        "What was {t}'s {a} in {y}?",
+        "How did {t} describe {a} risks in its {y} filing?",
+        "Summarise {t}'s {a} trend between {y} and {z}.",
+        "What drove changes in {t} {a} in fiscal {y}?",
+    )
+    questions = set()
+    while len(questions) < count:
+        year = rng.randint(2019, 2023)
+        questions.add(rng.choice(templates).format(
+            t=rng.choice(TICKERS), a=" ".join(rng.sample(WORDS, 2)), y=year, z=year + 1
+        ))
+    return sorted(questions)
+
+
+class StubEmbeddings:
+    """
+    Hashed set-of-words embeddings (LangChain Embeddings interface).
+
+    Texts sharing words get similar vectors, so retrieval over a stub
+    corpus still returns plausible neighbours. Each distinct word counts
+    once, so words every chunk repeats do not drown out the rare ones.
+    """
+
+    def __init__(self, dimension: int = 384, latency_ms: float = 2.0, per_text_ms: float = 0.5):
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+        self.per_text_ms = per_text_ms
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in {word.strip(".,?'") for word in text.lower().split()}:
+            h = _seed(word)
+            vector[h % self.dimension] += 1.0 if (h >> 16) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        _sleep_ms(self.latency_ms)
+        return self._vector(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        _sleep_ms(self.latency_ms + self.per_text_ms * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def __call__(self, text: str) -> List[float]:
+        return self.embed_query(text)
+
+
+class StubCrossEncoder:
+    """
+    Synthetic reranker: fixed per-call overhead plus a per-pair cost.
+
+    Scores are the share of query words found in the chunk, so reranking
+    a stub corpus still moves relevant chunks up.
+    """
+
+    def __init__(self, call_overhead_ms: float = 15.0, per_pair_ms: float = 1.0):
+        self.call_overhead_ms = call_overhead_ms
+        self.per_pair_ms = per_pair_ms
+
+    @staticmethod
+    def _words(text: str) -> set:
+        return {word.strip(".,?'").lower() for word in text.split()}
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        _sleep_ms(self.call_overhead_ms + self.per_pair_ms * len(pairs))
+        scores = []
+        for query, text in pairs:
+            query_words = self._words(query)
+            scores.append(len(query_words & self._words(text)) / len(query_words) if query_words else 0.0)
+        return scores
+
+
+class StubGenerationStream:
+    """GenerationStream look-alike: run() produces tokens on a worker, iteration consumes them."""
+
+    def __init__(self, pieces: List[str], first_token_ms: float, per_token_ms: float):
+        self.pieces = pieces
+        self.first_token_ms = first_token_ms
+        self.per_token_ms = per_token_ms
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._cancelled = threading.Event()
+
+    def run(self):
+        try:
+            _sleep_ms(self.first_token_ms)
+            for piece in self.pieces:
+                if self._cancelled.is_set():
+                    break
+                _sleep_ms(self.per_token_ms)
+                self._queue.put(piece)
+        finally:
+            self.end()
+
+    def end(self):
+        self._queue.put(None)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            piece = self._queue.get()
+            if piece is None:
+                return
+            yield piece
+
+
+class StubLLM:
+    """
+    LocalHuggingFaceEngine look-alike with deterministic answers.
+
+    Latency is `first_token_ms + per_token_ms * tokens`. A deterministic
+    `invalid_rate` share of prompts returns an empty answer, exercising the
+    Gemini fallback path.
+    """
+
+    def __init__(self, first_token_ms: float = 50.0, per_token_ms: float = 5.0, tokens: int = 40,
+                 invalid_rate: float = 0.0):
+        self.first_token_ms = first_token_ms
+        self.per_token_ms = per_token_ms
+        self.tokens = tokens
+        self.invalid_rate = invalid_rate
+        self.model = None
+        self.tokenizer = None
+        self.scheduler = None
+
+    def _pieces(self, prompt: str, max_tokens: int) -> List[str]:
+        seed = _seed(prompt)
+        if (seed % 1000) < self.invalid_rate * 1000:
+            return []
+        rng = random.Random(seed)
+        return [rng.choice(WORDS) + " " for _ in range(min(self.tokens, max_tokens))]
+
+    def generate(self, prompt: str, max_tokens: int = 512, temperature: float = 0.3, **kwargs) -> Dict[str, Any]:
+        pieces = self._pieces(prompt, max_tokens)
+        _sleep_ms(self.first_token_ms + self.per_token_ms * len(pieces))
+        return {
+            "choices": [{"text": "".join(pieces), "finish_reason": "length"}],
+            "usage": {"completion_tokens": len(pieces)},
+        }
+
+    def stream_generate(self, prompt: str, max_tokens: int = 512, temperature: float = 0.3) -> StubGenerationStream:
+        return StubGenerationStream(self._pieces(prompt, max_tokens), self.first_token_ms, self.per_token_ms)
+
+    def test_connection(self) -> bool:
+        return True
+
+
+class StubIngestor:
+    """
+    Stand-in for rag_utils.process_and_embed_file: chunks and embeds with the
+    stub embeddings and keeps the vectors in memory instead of publishing an index snapshot
+    """
+
+    def __init__(self, embeddings: StubEmbeddings, chunk_size: int = 500):
+        self.embeddings = embeddings
+        self.chunk_size = chunk_size
+        self.files = 0
+        self.chunks = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, filename: str, content: str = None, embeddings=None):
+        if not content:
+            raise ValueError("No content provided for non-PDF file")
+        chunks = [content[i:i + self.chunk_size] for i in range(0, len(content), self.chunk_size)]
+        self.embeddings.embed_documents(chunks)
+        with self._lock:
+            self.files += 1
+            self.chunks += len(chunks)
+
+
+def build_stub_vectorstore(embeddings: StubEmbeddings, num_chunks: int = 2000, seed: int = 0):
+    """LangChain FAISS store over a synthetic corpus."""
+    from langchain_community.vectorstores import FAISS
+
+    corpus = synthetic_corpus(num_chunks, seed)
+    vectors = [embeddings._vector(item["text"]) for item in corpus]
+    return FAISS.from_embeddings(
+        [(item["text"], vector) for item, vector in zip(corpus, vectors)],
+        embeddings,
+        metadatas=[item["metadata"] for item in corpus],
+    )
+
+
+def create_stub_gemini_app(latency_ms: float = 300.0, chunk_ms: float = 20.0, chunks: int = 5, error_rate: float = 0.0,
+                           script: Sequence[int] = (), retry_after: Optional[float] = None):
+    """
+    ASGI app speaking the Gemini REST API subset used by gemini_client
+
+    Serves POST /models/<model>:generateContent and :streamGenerateContent
+    (?alt=sse). A deterministic `error_rate` share of requests gets HTTP 503.
+    `script` scripts the status of the next requests, one code each (200
+    answers normally); tests can extend app.state.script while serving.
+    app.state.requests records (target, status) of every request.
+
+    Args:
+        script: Status codes for the first requests, e.g. (429, 503) then normal answers
+        retry_after: Retry-After seconds sent with scripted errors (None: no header)
+    """
+    import asyncio
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, StreamingResponse
+    from starlette.routing import Route
+
+    counter = {"requests": 0}
+    scripted = deque(script)
+    log: List[tuple] = []
+
+    def payload(text: str) -> Dict[str, Any]:
+        return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}]}
+
+    async def handle(request):
+        target = request.path_params["target"]
+        body = await request.json()
+        prompt = "".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+        counter["requests"] += 1
+        status = scripted.popleft() if scripted else 200
+        if status == 200 and error_rate and (counter["requests"] % max(1, int(1 / error_rate))) == 0:
+            status = 503
+        log.append((target, status))
+        if status != 200:
+            await asyncio.sleep(latency_ms / 1000.0)
+            headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+            return JSONResponse({"error": {"code": status, "message": "stub overloaded"}}, status_code=status,
+                                headers=headers)
+
+        rng = random.Random(_seed(prompt))
+        pieces = [" ".join(rng.choice(WORDS) for _ in range(6)) + " " for _ in range(chunks)]
+        if target.endswith(":streamGenerateContent"):
+            async def events():
+                await asyncio.sleep(latency_ms / 1000.0)
+                for piece in pieces:
+                    yield f"data: {json.dumps(payload(piece))}\r\n\r\n"
+                    await asyncio.sleep(chunk_ms / 1000.0)
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep((latency_ms + chunk_ms * chunks) / 1000.0)
+        return JSONResponse(payload("".join(pieces)))
+
+    app = Starlette(routes=[Route("/models/{target:path}", handle, methods=["POST"])])
+    app.state.script = scripted
+    app.state.requests = log
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_in_thread(app, port: int):
+    """Run an ASGI app with uvicorn on a background thread; returns the server (set should_exit to stop it)."""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, name=f"stub-server-{port}", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"Server on port {port} failed to start")
+        time.sleep(0.05)
+    return server
@@ -1,14 +1,23 @@
-from fastapi import UploadFile, File, APIRouter
+from fastapi import UploadFile, File, APIRouter, Request
+from finsight_app.executors import io_executor, ExecutorSaturated
 from finsight_app.rag_utils import process_and_embed_file
 
 router = APIRouter()
 
 @router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(request: Request, file: UploadFile = File(...)):
     content = await file.read()
     filename = file.filename
     try:
-        process_and_embed_file(filename, content.decode())
+        # PDFs are parsed from the raw bytes; the index update is published as a new snapshot
+        if not filename.lower().endswith(".pdf"):
+            content = content.decode()
+        embeddings = request.app.state.registry.peek("embeddings")
+        index_dir = await io_executor.run(process_and_embed_file, filename, content, embeddings=embeddings)
+        if isinstance(index_dir, str):
+            await request.app.state.index_published(index_dir)
         return {"status": "success", "message": f"{filename} processed and indexed."}
+    except ExecutorSaturated:
+        raise
     except Exception as e:
-        return {"status": "error", "message": str(e)} 
\ No newline at end of file
+        return {"status": "error", "message": str(e)}
@@ -0,0 +1,162 @@
+"""
+FinSight Copilot - Background Warm-up
+Loads heavy components concurrently after startup and tracks their readiness
+"""
+
+import asyncio
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class ComponentNotReady(Exception):
+    """Raised when a request needs a component that has not finished loading."""
+
+    def __init__(self, name: str, retry_after: int = 5):
+        super().__init__(f"{name} is still loading, retry later")
+        self.name = name
+        self.retry_after = retry_after
+
+
+@dataclass
+class ComponentState:
+    """Load state of one registered component."""
+    name: str
+    loader: Callable[[], Any]
+    required: bool = True
+    depends_on: tuple = ()
+    status: str = "pending"  # pending, loading, ready, failed
+    value: Any = None
+    error: Optional[str] = None
+    started_at: Optional[float] = None
+    duration: Optional[float] = None
+    event: asyncio.Event = field(default=None, repr=False)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "required": self.required,
+            "load_seconds": round(self.duration, 3) if self.duration is not None else None,
+            "error": self.error,
+        }
+
+
+class ComponentRegistry:
+    """
+    Registry of lazily loaded components.
+
+    Loaders are plain blocking callables. `warm_up()` runs them concurrently
+    on a private thread pool (a loader only waits for its own dependencies)
+    and records per-component status and load duration. Request handlers use
+    `get()` for components they cannot work without and `peek()` for
+    optional ones that have a degraded path.
+    """
+
+    def __init__(self):
+        self._components: Dict[str, ComponentState] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, loader: Callable[[], Any], required: bool = True, depends_on: Iterable[str] = ()):
+        """
+        Register a component
+
+        Args:
+            name: Component name
+            loader: Blocking callable returning the loaded component
+            required: Whether the service is "ready" only once this component is
+            depends_on: Components that must be ready before this loader runs
+        """
+        self._components[name] = ComponentState(name=name, loader=loader, required=required, depends_on=tuple(depends_on))
+
+    # ---- Loading ----
+    async def _load(self, state: ComponentState, pool: ThreadPoolExecutor):
+        try:
+            for dependency in state.depends_on:
+                dep = self._components[dependency]
+                await dep.event.wait()
+                if dep.status != "ready":
+                    raise RuntimeError(f"dependency {dependency} failed to load")
+
+            state.status = "loading"
+            state.started_at = time.time()
+            start = time.perf_counter()
+            print(f"⏳ Loading {state.name}...")
+            state.value = await asyncio.get_running_loop().run_in_executor(pool, state.loader)
+            state.duration = time.perf_counter() - start
+            state.status = "ready"
+            print(f"✅ {state.name} ready in {state.duration:.1f}s")
+        except Exception as e:
+            if state.started_at is not None:
+                state.duration = time.time() - state.started_at
+            state.status = "failed"
+            state.error = str(e)
+            print(f"⚠️ Failed to load {state.name}: {e}")
+            traceback.print_exc()
+        finally:
+            state.event.set()
+
+    async def warm_up(self):
+        """Load every pending component concurrently and wait for all of them."""
+        pending = [state for state in self._components.values() if state.status == "pending"]
+        if not pending:
+            return
+        for state in self._components.values():
+            if state.event is None:
+                state.event = asyncio.Event()
+            if state.status != "pending":
+                state.event.set()
+
+        with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="finsight-warmup") as pool:
+            await asyncio.gather(*(self._load(state, pool) for state in pending))
+
+    def start(self) -> asyncio.Task:
+        """Kick off warm-up in the background (call from a running event loop)."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.warm_up())
+        return self._task
+
+    def load_all(self):
+        """Blocking warm-up, for scripts and launchers without a running loop."""
+        asyncio.run(self.warm_up())
+
+    async def stop(self):
+        """Cancel a warm-up that is still running."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    # ---- Access ----
+    def get(self, name: str) -> Any:
+        """Return a ready component or raise ComponentNotReady."""
+        state = self._components[name]
+        if state.status != "ready":
+            raise ComponentNotReady(name)
+        return state.value
+
+    def peek(self, name: str) -> Any:
+        """Return a ready component or None (for optional components)."""
+        state = self._components.get(name)
+        return state.value if state is not None and state.status == "ready" else None
+
+    def set(self, name: str, value: Any):
+        """Replace a component's value and mark it ready (e.g. hot reload, stubs)."""
+        state = self._components[name]
+        state.value = value
+        state.status = "ready"
+        state.error = None
+        if state.event is not None:
+            state.event.set()
+
+    def is_ready(self, name: str) -> bool:
+        state = self._components.get(name)
+        return state is not None and state.status == "ready"
+
+    @property
+    def ready(self) -> bool:
+        """True once every required component has loaded."""
+        return all(state.status == "ready" for state in self._components.values() if state.required)
+
+    def describe(self) -> Dict[str, Dict[str, Any]]:
+        """Per-component status and load duration for the /ready endpoint."""
+        return {name: state.describe() for name, state in self._components.items()}
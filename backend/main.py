@@ -1,5 +1,7 @@
 import os
+import time
 import asyncio
+from typing import List, Optional
 from fastapi import FastAPI
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
@@ -9,25 +11,240 @@ from dotenv import load_dotenv
 load_dotenv()  # Load .env
 load_dotenv('.env.local')  # Load .env.local
 
-from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from llama_cpp import Llama
 from sentence_transformers import CrossEncoder
-import google.generativeai as genai
-import requests
 from fastapi import Request
-from fastapi.responses import JSONResponse
-
-from finsight_app.prompts import FinSightPrompts, PromptType, PromptConfig
-from finsight_app.rag_utils import RetrievalSystem
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from contextlib import asynccontextmanager
+
+from finsight_app.executors import model_executor, io_executor, ExecutorSaturated
+from finsight_app.warmup import ComponentRegistry, ComponentNotReady
+from finsight_app.rerank_service import RerankBatcher
+from finsight_app.streaming import format_sse, SSE_HEADERS
+from finsight_app.rag_orchestrator import RAGOrchestrator, RAGOptions
+from finsight_app.answer_cache import SemanticAnswerCache
+from finsight_app.single_flight import SingleFlight, flight_key
+from finsight_app.gemini_client import get_gemini_client, CircuitOpen
+from finsight_app import metrics
+from finsight_app.process_memory import read_smaps_rollup
+from finsight_app.prompts import FinSightPrompts
+from finsight_app.rag_utils import RetrievalSystem, compact_index, delete_documents, load_vectorstore as open_vectorstore
+from finsight_app.lexical_index import LexicalIndex, lexical_dir, lexical_index_exists
+from finsight_app.coarse_index import CoarseIndex, coarse_dir, coarse_index_exists
+from finsight_app.chunk_catalog import ChunkCatalog, catalog_dir, catalog_exists
+from finsight_app.snapshots import SnapshotManager, load_tombstones, read_manifest
 from finsight_app.upload import router as upload_router
-from finsight_app.path_utils import get_faiss_index_dir
+from finsight_app.path_utils import get_faiss_index_dir, get_faiss_index_root
 from routes.chat_history import router as chat_history_router
 from routes.trading import router as trading_router
 
 
+# ==== Components (loaded in the background after startup) ====
+registry = ComponentRegistry()
+
+def load_embeddings():
+    return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+
+# Snapshot directory the live vectorstore / retriever were loaded from
+serving_index_dir: Optional[str] = None
+
+def load_vectorstore(index_dir: Optional[str] = None):
+    faiss_index_path = index_dir or get_faiss_index_dir()
+    index_file_path = os.path.join(faiss_index_path, "index.faiss")
+    if not os.path.exists(index_file_path):
+        raise FileNotFoundError(f"❌ FAISS index file missing at {index_file_path}")
+    print(f"✅ FAISS index found at: {index_file_path}")
+    return open_vectorstore(
+        faiss_index_path,
+        registry.get("embeddings"),
+        mmap=os.getenv("FINSIGHT_FAISS_MMAP", "true").lower() == "true",
+    )
+
+def load_lexical_index(index_dir: str):
+    # Built with the FAISS store (build_langchain_faiss.py); memory-mapped, so no rebuild at startup
+    if os.getenv("FINSIGHT_HYBRID", "true").lower() != "true" or not lexical_index_exists(index_dir):
+        print("⚠️ No lexical index loaded, retrieval is vector-only")
+        return None
+    return LexicalIndex(lexical_dir(index_dir))
+
+# Opt-in: pick a value with benchmark_retrieval.py --coarse-filings on the real corpus first
+COARSE_FILINGS = int(os.getenv("FINSIGHT_COARSE_FILINGS", "0"))
+
+def load_coarse_index(index_dir: str):
+    # Filing-level section means saved with the FAISS store. Loaded even when off by default (a few hundred
+    # rows per thousand chunks), so a request can opt in with "filings": n
+    if not coarse_index_exists(index_dir):
+        return None
+    return CoarseIndex(coarse_dir(index_dir))
+
+def load_chunk_catalog(index_dir: str):
+    # Memory-mapped metadata columns saved with the snapshot; without one, filters build columns from the docstore
+    if not catalog_exists(index_dir):
+        return None
+    return ChunkCatalog(catalog_dir(index_dir))
+
+def build_retriever(vectorstore, index_dir: str):
+    return RetrievalSystem(
+        vectorstore=vectorstore,
+        embed_cache_size=int(os.getenv("FINSIGHT_EMBED_CACHE_SIZE", "2048")),
+        search_cache_size=int(os.getenv("FINSIGHT_SEARCH_CACHE_SIZE", "2048")),
+        # Unset: keep the defaults saved with the index at build time (index_params.json)
+        nprobe=int(os.getenv("FINSIGHT_NPROBE")) if os.getenv("FINSIGHT_NPROBE") else None,
+        ef_search=int(os.getenv("FINSIGHT_EF_SEARCH")) if os.getenv("FINSIGHT_EF_SEARCH") else None,
+        lexical_index=load_lexical_index(index_dir),
+        rrf_k=int(os.getenv("FINSIGHT_RRF_K", "60")),
+        deleted_ids=load_tombstones(index_dir),
+        coarse_index=load_coarse_index(index_dir),
+        coarse_filings=COARSE_FILINGS,
+        catalog=load_chunk_catalog(index_dir),
+    )
+
+def load_live_vectorstore():
+    global serving_index_dir
+    serving_index_dir = get_faiss_index_dir()
+    return load_vectorstore(serving_index_dir)
+
+def load_retriever():
+    return build_retriever(registry.get("vectorstore"), serving_index_dir or get_faiss_index_dir())
+
+def load_llm():
+    from finsight_app.local_hf_engine import LocalHuggingFaceEngine
+
+    llm = LocalHuggingFaceEngine("microsoft/DialoGPT-medium")
+    if llm.model is None:
+        raise RuntimeError("Local Hugging Face model failed to load, will use Gemini fallback")
+    if os.getenv("FINSIGHT_CONTINUOUS_BATCHING", "true").lower() == "true":
+        llm.enable_continuous_batching(max_batch_size=int(os.getenv("FINSIGHT_MAX_BATCH_SIZE", "8")))
+    # A short generation warms up the kernels before the first real request
+    if os.getenv("FINSIGHT_WARMUP_TEST_GENERATION", "true").lower() == "true" and not llm.test_connection():
+        raise RuntimeError("Local Hugging Face model test failed, will use Gemini fallback")
+    return llm
+
+def load_reranker():
+    return CrossEncoder("cross-encoder/qnli-distilroberta-base")
+
+def load_rerank_service():
+    return RerankBatcher(
+        registry.get("reranker"),
+        window_ms=float(os.getenv("FINSIGHT_RERANK_WINDOW_MS", "5")),
+        max_batch_size=int(os.getenv("FINSIGHT_RERANK_MAX_BATCH", "64")),
+    )
+
+def load_gemini():
+    if not GEMINI_API_KEY:
+        raise RuntimeError("No Gemini API key found in environment variables")
+    print(f"✅ Gemini API key configured: {GEMINI_API_KEY[:10]}...")
+    return get_gemini_client()
+
+registry.register("embeddings", load_embeddings)
+registry.register("vectorstore", load_live_vectorstore, depends_on=["embeddings"])
+registry.register("retriever", load_retriever, depends_on=["vectorstore"])
+# Optional components: requests degrade (no rerank / Gemini only) until they are ready
+registry.register("llm", load_llm, required=False)
+registry.register("reranker", load_reranker, required=False)
+if os.getenv("FINSIGHT_RERANK_BATCHING", "true").lower() == "true":
+    registry.register("rerank_service", load_rerank_service, required=False, depends_on=["reranker"])
+registry.register("gemini", load_gemini, required=False)
+
+
+# ==== Index Snapshots (hot reload) ====
+snapshots = SnapshotManager(get_faiss_index_root())
+SNAPSHOT_POLL_SECONDS = float(os.getenv("FINSIGHT_SNAPSHOT_POLL_SECONDS", "2"))
+SNAPSHOTS_KEEP = int(os.getenv("FINSIGHT_SNAPSHOTS_KEEP", "3"))
+COMPACT_RATIO = float(os.getenv("FINSIGHT_COMPACT_RATIO", "0.2"))
+
+_reload_lock = asyncio.Lock()
+_compaction: Optional[asyncio.Task] = None
+
+async def reload_index(index_dir: str) -> bool:
+    """
+    Load a published snapshot beside the live one and swap it in
+
+    Requests already running keep the retriever they started with, so the
+    swap never interrupts them; the old snapshot is released when they finish.
+
+    Returns:
+        True if the snapshot was swapped in, False if it was already live
+    """
+    global serving_index_dir
+    async with _reload_lock:
+        if index_dir == serving_index_dir or not registry.is_ready("retriever"):
+            return False
+        start = time.perf_counter()
+        vectorstore = await io_executor.run(load_vectorstore, index_dir)
+        retriever = await io_executor.run(build_retriever, vectorstore, index_dir)
+        registry.set("vectorstore", vectorstore)
+        registry.set("retriever", retriever)
+        serving_index_dir = index_dir
+        print(f"🔄 Serving index snapshot {os.path.basename(index_dir)} (loaded in {time.perf_counter() - start:.2f}s)")
+    maybe_compact()
+    return True
+
+async def index_published(index_dir: str):
+    """Swap to a snapshot this process just published and drop old ones."""
+    await reload_index(index_dir)
+    snapshots.prune(SNAPSHOTS_KEEP)
+
+def needs_compaction() -> bool:
+    """True when tombstones (and chunks missing from the lexical index) pass FINSIGHT_COMPACT_RATIO of the index."""
+    if serving_index_dir is None:
+        return False
+    manifest = read_manifest(serving_index_dir)
+    pending = manifest.get("tombstones", 0)
+    if lexical_index_exists(serving_index_dir):
+        pending += manifest.get("lexical_pending", 0)
+    return pending > 0 and pending >= COMPACT_RATIO * max(manifest.get("ntotal", 0), 1)
+
+async def compact() -> Optional[str]:
+    """Publish a compacted snapshot and swap to it (None if another writer already compacted)."""
+    try:
+        # Own thread rather than the bounded io pool: an HNSW rebuild can take minutes
+        index_dir = await asyncio.to_thread(compact_index, snapshots)
+    except LookupError:
+        return None
+    await index_published(index_dir)
+    return index_dir
+
+def maybe_compact():
+    global _compaction
+    if COMPACT_RATIO <= 0 or (_compaction is not None and not _compaction.done()) or not needs_compaction():
+        return
+    print("🧹 Compacting index snapshot in the background...")
+    _compaction = asyncio.ensure_future(compact())
+
+async def watch_snapshots():
+    """Poll the CURRENT pointer and hot-swap snapshots published by other processes (build scripts, workers)."""
+    failed = None
+    while True:
+        await asyncio.sleep(SNAPSHOT_POLL_SECONDS)
+        index_dir = get_faiss_index_dir()
+        # None: the vectorstore was injected (load tests), not loaded from a snapshot
+        if serving_index_dir is None or index_dir in (serving_index_dir, failed):
+            continue
+        try:
+            await reload_index(index_dir)
+        except Exception as e:
+            failed = index_dir
+            print(f"⚠️ Failed to load index snapshot {index_dir}, still serving {serving_index_dir}: {e}")
+
+
 # ==== FastAPI Init ====
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    registry.start()
+    watcher = asyncio.ensure_future(watch_snapshots()) if SNAPSHOT_POLL_SECONDS > 0 else None
+    yield
+    if watcher is not None:
+        watcher.cancel()
+    await registry.stop()
+    await get_gemini_client().aclose()
+    model_executor.shutdown()
+    io_executor.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+# For routers that cannot import main (upload publishes snapshots)
+app.state.registry = registry
+app.state.index_published = index_published
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Consider restricting in production
@@ -36,154 +253,177 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ==== Load Embedding Model ====
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-# ==== Load FAISS Vectorstore Safely ====
-faiss_index_path = get_faiss_index_dir()
-index_file_path = os.path.join(faiss_index_path, "index.faiss")
-assert os.path.exists(index_file_path), f"❌ FAISS index file missing at {index_file_path}"
-print(f"✅ FAISS index found at: {index_file_path}")
-
-vectorstore = FAISS.load_local(faiss_index_path, embeddings=embedding_model, allow_dangerous_deserialization=True)
-retriever = RetrievalSystem(vectorstore=vectorstore)
-
-# ==== Load Local Hugging Face LLM Engine ====
-from finsight_app.local_hf_engine import LocalHuggingFaceEngine
-
-# ✅ Initialize Local Hugging Face LLM Engine
-try:
-    llm = LocalHuggingFaceEngine("microsoft/DialoGPT-medium")
-    print("✅ Local Hugging Face LLM Engine initialized")
-    
-    # Test connection
-    if llm.test_connection():
-        print("✅ Local Hugging Face model loaded successfully")
-    else:
-        print("⚠️ Local Hugging Face model failed to load, will use Gemini fallback")
-        
-except Exception as e:
-    print(f"⚠️ Failed to initialize Local Hugging Face LLM: {e}")
-    print("🔄 Will use Gemini fallback for all requests")
-    llm = None
+# Errors that mean "try again shortly" rather than "this request failed"
+RETRYABLE_ERRORS = (ExecutorSaturated, ComponentNotReady)
+
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request: Request, exc: ExecutorSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"error": f"❌ Server is busy ({exc.name} queue full). Please try again shortly."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(ComponentNotReady)
+async def component_not_ready_handler(request: Request, exc: ComponentNotReady):
+    return JSONResponse(
+        status_code=503,
+        content={"error": f"❌ Server is warming up ({exc.name} not loaded yet). Please try again shortly."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 # ==== Prompt System ====
 prompt_builder = FinSightPrompts()
 
-# ==== Load Reranker (Faster Model) ====
-reranker = CrossEncoder("cross-encoder/qnli-distilroberta-base")
-
 # ==== Gemini API Fallback ====
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or "YOUR_GEMINI_API_KEY"
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-    print(f"✅ Gemini API key configured: {GEMINI_API_KEY[:10]}...")
-else:
-    print("⚠️ No Gemini API key found in environment variables")
 
-def gemini_fallback(question: str):
+GEMINI_DEADLINE = float(os.getenv("GEMINI_DEADLINE", "15"))
+
+async def gemini_fallback(question: str):
     try:
         if not GEMINI_API_KEY:
             return "❌ Gemini API key not configured. Please set GEMINI_API_KEY environment variable."
         
         print(f"🔮 Calling Gemini API with question: {question[:50]}...")
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        res = model.generate_content(question)
+        start = time.perf_counter()
+        text = await get_gemini_client().generate_text(question, deadline=GEMINI_DEADLINE)
+        metrics.MODEL_SECONDS.observe(time.perf_counter() - start, model="gemini")
         
-        if res and res.text:
-            answer = res.text.strip()
+        if text:
+            answer = text.strip()
             print(f"✅ Gemini response: {answer[:100]}...")
             if not answer:
+                metrics.GEMINI_REQUESTS_TOTAL.inc(outcome="empty")
                 return "Sorry, no analysis is available for this stock at the moment. Please try a different ticker or try again later."
+            metrics.GEMINI_REQUESTS_TOTAL.inc(outcome="ok")
             return answer
         else:
             print("❌ Gemini returned empty response")
+            metrics.GEMINI_REQUESTS_TOTAL.inc(outcome="empty")
             return "Sorry, no analysis is available for this stock at the moment. Please try a different ticker or try again later."
             
     except Exception as e:
         print(f"❌ Gemini API error: {str(e)}")
+        metrics.GEMINI_REQUESTS_TOTAL.inc(outcome="error")
         return f"❌ Gemini API error: {str(e)}"
 
 
-# ==== Rerank Function ====
-def rerank(question, chunks, top_k=3):
-    pairs = [[question, chunk.page_content if hasattr(chunk, 'page_content') else str(chunk)] for chunk in chunks]
-    scores = reranker.predict(pairs)
-    ranked = sorted(zip(chunks, scores), key=lambda x: x[1], reverse=True)
-    print("\n🔎 RERANKED CHUNKS (top 3):")
-    for i, (chunk, score) in enumerate(ranked[:top_k]):
-        print(f"[{i+1}] Score: {score:.4f} | {chunk.page_content[:200]}...\n")
-    return [chunk for chunk, score in ranked[:top_k]]
+async def gemini_stream(question: str):
+    """Yield Gemini answer text pieces as they arrive (server-sent events upstream)."""
+    if not GEMINI_API_KEY:
+        yield "❌ Gemini API key not configured. Please set GEMINI_API_KEY environment variable."
+        return
+    try:
+        print(f"🔮 Streaming Gemini API with question: {question[:50]}...")
+        start = time.perf_counter()
+        async for text in get_gemini_client().stream_text(question, deadline=GEMINI_DEADLINE):
+            yield text
+        metrics.MODEL_SECONDS.observe(time.perf_counter() - start, model="gemini")
+        metrics.GEMINI_REQUESTS_TOTAL.inc(outcome="ok")
+    except Exception as e:
+        print(f"❌ Gemini API error: {str(e)}")
+        metrics.GEMINI_REQUESTS_TOTAL.inc(outcome="error")
+        yield f"❌ Gemini API error: {str(e)}"
+
+
+# ==== Semantic Answer Cache ====
+answer_cache = None
+if os.getenv("FINSIGHT_ANSWER_CACHE", "true").lower() == "true":
+    answer_cache = SemanticAnswerCache(
+        threshold=float(os.getenv("FINSIGHT_ANSWER_CACHE_THRESHOLD", "0.92")),
+        ttl_seconds=float(os.getenv("FINSIGHT_ANSWER_CACHE_TTL", "3600")),
+        max_entries=int(os.getenv("FINSIGHT_ANSWER_CACHE_SIZE", "512")),
+    )
+
+# ==== RAG Orchestrator ====
+rag = RAGOrchestrator(
+    components=registry,
+    prompt_builder=prompt_builder,
+    fallback=gemini_fallback,
+    fallback_stream=gemini_stream,
+    answer_cache=answer_cache,
+    rerank_cache_size=int(os.getenv("FINSIGHT_RERANK_CACHE_SIZE", "8192")),
+    context_window=int(os.getenv("FINSIGHT_CONTEXT_WINDOW", "1024")),
+    duplicate_threshold=float(os.getenv("FINSIGHT_DUPLICATE_THRESHOLD", "0.8")),
+)
+
+# ==== Request Coalescing ====
+coalescer = SingleFlight() if os.getenv("FINSIGHT_SINGLE_FLIGHT", "true").lower() == "true" else None
+
+async def answer_question(question: str, options: RAGOptions):
+    """Run the pipeline, sharing one execution among identical concurrent questions."""
+    if coalescer is None:
+        return await rag.run(question, options)
+    return await coalescer.do(flight_key(question, options.cache_scope()), lambda: rag.run(question, options))
+
+def stream_question(question: str, options: RAGOptions):
+    """Stream the pipeline's events, broadcasting one execution to identical concurrent streams."""
+    if coalescer is None:
+        return rag.stream(question, options)
+    return coalescer.stream(flight_key(question, options.cache_scope()), lambda: rag.stream(question, options))
 
 
 # ==== Request Schema ====
 class AskRequest(BaseModel):
     question: str
+    timings: bool = False
 
 class ChatRequest(BaseModel):
     query: str
+    timings: bool = False
+
+class SearchOptionsRequest(BaseModel):
+    k: int = 5
+    rerank: bool = False
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    filings: Optional[int] = None  # two-stage search breadth; 0 searches every chunk
+    company: Optional[List[str]] = None
+    form: Optional[List[str]] = None
+    date_from: Optional[str] = None  # "YYYY", "YYYY-MM" or "YYYY-MM-DD", inclusive
+    date_to: Optional[str] = None
+    hybrid: bool = True
+    timings: bool = False
+
+    def filters(self) -> Optional[dict]:
+        filters = {"company": self.company, "form": self.form, "date_from": self.date_from, "date_to": self.date_to}
+        return {key: value for key, value in filters.items() if value} or None
+
+    def options(self) -> RAGOptions:
+        # Over-fetch when reranking so the cross-encoder has candidates to reorder
+        k = 3 * self.k if self.rerank else self.k
+        return RAGOptions(k=k, top_k=self.k, rerank=self.rerank, nprobe=self.nprobe, ef_search=self.ef_search,
+                          filings=self.filings, filters=self.filters(), hybrid=self.hybrid)
+
+
+class SearchRequest(SearchOptionsRequest):
+    query: str
+
+
+class SearchBatchRequest(SearchOptionsRequest):
+    queries: List[str]
+
+
+def build_response(key: str, result, include_timings: bool) -> dict:
+    response = {key: result.answer}
+    if result.cached:
+        response["cached"] = True
+    if include_timings:
+        response["timings"] = result.timings
+    return response
 
 
 # ==== POST /ask ====
 @app.post("/ask")
 async def ask(request: AskRequest):
     try:
-        question = request.question
-        print(f"\n📥 QUESTION: {question}")
-        
-        context_chunks = retriever.retrieve(question, k=3)
-        reranked_chunks = rerank(question, context_chunks, top_k=3)
-        # Step 2: Limit context size and deduplicate sentences
-        from collections import OrderedDict
-        def dedup_and_truncate(chunks, max_chars=800):
-            seen = OrderedDict()
-            total = 0
-            for chunk in chunks:
-                for sentence in chunk.page_content.split('. '):
-                    sentence = sentence.strip()
-                    if sentence and sentence not in seen:
-                        if total + len(sentence) + 2 > max_chars:
-                            break
-                        seen[sentence] = True
-                        total += len(sentence) + 2  # +2 for '. '
-                if total >= max_chars:
-                    break
-            return '. '.join(seen.keys())[:max_chars]
-        context = dedup_and_truncate(reranked_chunks, max_chars=800)
-
-        if not context.strip() or ("apple" in context.lower() and "startup" in question.lower()):
-            print("\n⚡ Using Gemini fallback!")
-            return {"answer": gemini_fallback(question)}
-
-        prompt = prompt_builder.build_prompt(
-            PromptType.RAG_FINANCIAL,
-            question=question,
-            context=context,
-            config=PromptConfig()
-        )
-        print(f"Prompt length: {len(prompt)}")
-
-        # Try Hugging Face LLM first, fallback to Gemini
-        try:
-            if llm is not None:
-                print("🚀 Generating response with Hugging Face LLM...")
-                response = llm.generate(prompt, max_tokens=200, temperature=0.1)
-                answer = response["choices"][0]["text"].strip()
-                print(f"✅ HF LLM response: {answer[:100]}...")
-                print(f"⏱️ Response time: {response.get('response_time', 'N/A')}s")
-            else:
-                print("🔄 Hugging Face LLM not available, using Gemini fallback!")
-                answer = gemini_fallback(question)
-        except Exception as e:
-            print(f"\n⚠️ Hugging Face LLM failed: {e}, using Gemini fallback!")
-            answer = gemini_fallback(question)
-
-        # Fallback if answer is empty or just whitespace
-        if not answer or not answer.strip() or answer.strip() in ["...", "❌", "❌ Sorry, I couldn't generate a response. Please try again."]:
-            answer = "Sorry, no analysis is available for this stock at the moment. Please try a different ticker or try again later."
-
-        return {"answer": answer}
+        print(f"\n📥 QUESTION: {request.question}")
+        result = await answer_question(request.question, RAGOptions(k=3, top_k=3))
+        return build_response("answer", result, request.timings)
 
+    except RETRYABLE_ERRORS:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -192,35 +432,13 @@ async def ask(request: AskRequest):
 
 # ==== GET /ask (for testing) ====
 @app.get("/ask")
-async def ask_get(question: str):
+async def ask_get(question: str, timings: bool = False):
     try:
-        context_chunks = retriever.retrieve(question, k=1)
-        context = "\n\n".join([chunk.page_content for chunk in context_chunks])
-
-        prompt = prompt_builder.build_prompt(
-            PromptType.RAG_FINANCIAL,
-            question=question,
-            context=context,
-            config=PromptConfig()
-        )
-        
-        # Try Hugging Face LLM first, fallback to Gemini
-        try:
-            if llm is not None:
-                print("🚀 Generating response with Hugging Face LLM...")
-                response = llm.generate(prompt, max_tokens=200, temperature=0.1)
-                answer = response["choices"][0]["text"].strip()
-                print(f"✅ HF LLM response: {answer[:100]}...")
-            else:
-                print("🔄 Hugging Face LLM not available, using Gemini fallback!")
-                answer = gemini_fallback(question)
-                    
-        except Exception as e:
-            print(f"\n⚠️ Hugging Face LLM failed: {e}, using Gemini fallback!")
-            answer = gemini_fallback(question)
-
-        return {"response": answer}
+        result = await answer_question(question, RAGOptions(k=1, top_k=1, rerank=False))
+        return build_response("response", result, timings)
 
+    except RETRYABLE_ERRORS:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -231,93 +449,200 @@ async def ask_get(question: str):
 @app.post("/chat")
 async def chat_endpoint(request: ChatRequest):
     try:
-        query = request.query
-        print(f"\n💬 CHAT QUERY: {query}")
-        
-        # Use existing RAG pipeline
-        context_chunks = retriever.retrieve(query, k=3)
-        reranked_chunks = rerank(query, context_chunks, top_k=3)
-        
-        # Deduplicate and truncate context
-        from collections import OrderedDict
-        def dedup_and_truncate(chunks, max_chars=800):
-            seen = OrderedDict()
-            total = 0
-            for chunk in chunks:
-                for sentence in chunk.page_content.split('. '):
-                    sentence = sentence.strip()
-                    if sentence and sentence not in seen:
-                        if total + len(sentence) + 2 > max_chars:
-                            break
-                        seen[sentence] = True
-                        total += len(sentence) + 2  # +2 for '. '
-                if total >= max_chars:
-                    break
-            return '. '.join(seen.keys())[:max_chars]
-        
-        context = dedup_and_truncate(reranked_chunks, max_chars=800)
-
-        # If no context or specific conditions, use Gemini fallback
-        if not context.strip():
-            print("\n⚡ No context found, using Gemini fallback!")
-            answer = gemini_fallback(query)
-            if not answer or not answer.strip():
-                answer = "Sorry, no analysis is available for this stock at the moment. Please try a different ticker or try again later."
-            return {"answer": answer}
-
-        # Build prompt and generate response
-        prompt = prompt_builder.build_prompt(
-            PromptType.RAG_FINANCIAL,
-            question=query,
-            context=context,
-            config=PromptConfig()
-        )
-        print(f"Prompt length: {len(prompt)}")
-
-        # Try Hugging Face LLM first, fallback to Gemini if answer is empty or invalid
-        try:
-            if llm is not None:
-                print("🚀 Generating response with Hugging Face LLM...")
-                response = llm.generate(prompt, max_tokens=200, temperature=0.1)
-                answer = response["choices"][0]["text"].strip()
-                if not answer or not answer.strip() or answer.strip() in ["...", "❌", "❌ Sorry, I couldn't generate a response. Please try again."]:
-                    print("⚡ HF LLM returned empty or invalid answer, using Gemini fallback!")
-                    answer = gemini_fallback(query)
-            else:
-                print("🔄 Hugging Face LLM not available, using Gemini fallback!")
-                answer = gemini_fallback(query)
-        except Exception as e:
-            print(f"\n⚠️ Hugging Face LLM failed: {e}, using Gemini fallback!")
-            answer = gemini_fallback(query)
-
-        print(f"🎯 Final answer: {answer[:100]}...")
-        print(f"Returning answer to frontend: {answer}")
-        if not answer or not answer.strip():
-            answer = "Sorry, no analysis is available for this stock at the moment. Please try a different ticker or try again later."
-        return {"answer": answer}
+        print(f"\n💬 CHAT QUERY: {request.query}")
+        result = await answer_question(request.query, RAGOptions(k=3, top_k=3))
+        print(f"🎯 Final answer: {result.answer[:100]}...")
+        return build_response("answer", result, request.timings)
 
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
-        # Fallback to Gemini for any errors
+        # Fallback to Gemini for any errors (including components still warming up)
         try:
-            answer = gemini_fallback(request.query)
+            answer = await gemini_fallback(request.query)
             return {"answer": answer}
+        except ExecutorSaturated:
+            raise
         except:
             return {"answer": "❌ Sorry, I'm having trouble processing your request right now. Please try again."}
 
 
+# ==== Streaming (SSE) ====
+async def stream_answer(question: str):
+    """Stream the orchestrator's events as server-sent events."""
+    try:
+        async for event, payload in stream_question(question, RAGOptions(k=3, top_k=3)):
+            yield format_sse(event, payload)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        yield format_sse("error", {"error": f"❌ Failed to generate answer: {str(e)}"})
+
+
+# ==== POST /chat/stream ====
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    registry.get("retriever")  # 503 before the stream starts if still warming up
+    print(f"\n💬 CHAT STREAM QUERY: {request.query}")
+    return StreamingResponse(stream_answer(request.query), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+# ==== POST /ask/stream ====
+@app.post("/ask/stream")
+async def ask_stream(request: AskRequest):
+    registry.get("retriever")  # 503 before the stream starts if still warming up
+    print(f"\n📥 STREAM QUESTION: {request.question}")
+    return StreamingResponse(stream_answer(request.question), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+# ==== POST /search (retrieval only, no generation) ====
+@app.post("/search")
+async def search(request: SearchRequest):
+    result = await rag.search(request.query, request.options())
+    response = {"results": result.hits()}
+    if request.timings:
+        response["timings"] = result.timings
+    return response
+
+
+# ==== POST /search/batch ====
+MAX_SEARCH_BATCH = int(os.getenv("FINSIGHT_MAX_SEARCH_BATCH", "256"))
+
+@app.post("/search/batch")
+async def search_batch(request: SearchBatchRequest):
+    if len(request.queries) > MAX_SEARCH_BATCH:
+        return JSONResponse(
+            status_code=413,
+            content={"error": f"At most {MAX_SEARCH_BATCH} queries per batch, got {len(request.queries)}"},
+        )
+    results = await rag.search_batch(request.queries, request.options())
+    response = {"results": [{"query": query, "results": result.hits()} for query, result in zip(request.queries, results)]}
+    if request.timings and results:
+        response["timings"] = results[0].timings
+    return response
+
+
+# ==== Index Snapshots ====
+class DeleteRequest(BaseModel):
+    chunk_ids: List[int] = []
+    source: Optional[str] = None  # file name given at upload (or a chunk file name)
+
+
+@app.post("/index/delete")
+async def index_delete(request: DeleteRequest):
+    if not request.chunk_ids and not request.source:
+        return JSONResponse(status_code=400, content={"error": "Give chunk_ids or source"})
+    try:
+        index_dir, deleted = await io_executor.run(delete_documents, request.chunk_ids, request.source, snapshots)
+    except LookupError as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    await index_published(index_dir)
+    return {"deleted": deleted, "snapshot": os.path.basename(index_dir)}
+
+
+@app.post("/index/compact")
+async def index_compact():
+    index_dir = await compact()
+    if index_dir is None:
+        return {"status": "nothing to compact", "snapshot": snapshots.current()}
+    return {"status": "compacted", "snapshot": os.path.basename(index_dir)}
+
+
+@app.get("/index/snapshots")
+async def index_snapshots():
+    return {
+        "current": snapshots.current(),
+        "serving": os.path.basename(serving_index_dir) if serving_index_dir else None,
+        "snapshots": [snapshots.manifest(name) for name in snapshots.list()],
+    }
+
+
 # ==== Health Check Endpoint ====
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    llm = registry.peek("llm")
     return {
         "status": "healthy",
         "service": "FinSight Copilot API",
-        "llm_available": llm is not None,
+        "llm_available": registry.is_ready("llm"),
         "gemini_configured": bool(GEMINI_API_KEY),
-        "faiss_loaded": True
+        "faiss_loaded": registry.is_ready("vectorstore"),
+        "executors": {
+            "model": model_executor.stats(),
+            "io": io_executor.stats(),
+        },
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "stage_caches": rag.cache_stats(),
+        "rerank_batching": rag.rerank_service.stats() if rag.rerank_service else None,
+        "generation_batching": llm.scheduler.stats() if llm is not None and llm.scheduler else None,
+        "single_flight": coalescer.stats() if coalescer else None,
+        "gemini_client": get_gemini_client().stats()
+    }
+
+# ==== Metrics ====
+def _executor_metric(field: str):
+    return lambda: {(executor.name,): getattr(executor, field) for executor in (model_executor, io_executor)}
+
+def _cache_hit_ratios():
+    ratios = {(name,): stats["hit_ratio"] for name, stats in rag.cache_stats().items()}
+    if answer_cache is not None:
+        ratios[("answer",)] = answer_cache.stats()["hit_ratio"]
+    return ratios
+
+def _faiss_index_size():
+    vectorstore = registry.peek("vectorstore")
+    return vectorstore.index.ntotal if vectorstore is not None else None
+
+def _scheduler_metric(field: str):
+    def collect():
+        llm = registry.peek("llm")
+        return getattr(llm.scheduler, field) if llm is not None and llm.scheduler else None
+    return collect
+
+# Gauges are computed at scrape time, so they cost nothing on the request path
+metrics.REGISTRY.gauge("finsight_executor_in_flight", "Tasks admitted to each bounded executor (running or queued)",
+                       ["executor"], callback=_executor_metric("in_flight"))
+metrics.REGISTRY.gauge("finsight_executor_queue_depth", "Tasks waiting for a free worker in each bounded executor",
+                       ["executor"], callback=_executor_metric("queue_depth"))
+metrics.REGISTRY.gauge("finsight_cache_hit_ratio", "Hit ratio of each hot-path cache", ["cache"], callback=_cache_hit_ratios)
+metrics.REGISTRY.gauge("finsight_faiss_index_vectors", "Number of vectors in the loaded FAISS index", callback=_faiss_index_size)
+metrics.REGISTRY.gauge("finsight_generation_active", "Sequences in the running generation batch", callback=_scheduler_metric("active"))
+metrics.REGISTRY.gauge("finsight_generation_waiting", "Prompts waiting to join the generation batch", callback=_scheduler_metric("waiting"))
+metrics.REGISTRY.gauge("finsight_process_memory_bytes", "This process's memory: uss (unique), pss (proportional), shared, rss",
+                       ["kind"], callback=lambda: {(kind,): value for kind, value in (read_smaps_rollup() or {}).items()})
+metrics.REGISTRY.gauge("finsight_component_ready", "Whether each warm-up component has loaded (1) or not (0)", ["component"],
+                       callback=lambda: {(name,): int(state["status"] == "ready") for name, state in registry.describe().items()})
+
+def _single_flight_requests():
+    if coalescer is None:
+        return {}
+    stats = coalescer.stats()
+    samples = {(kind, "executed"): count for kind, count in stats["executions"].items()}
+    samples.update({(kind, "coalesced"): count for kind, count in stats["coalesced"].items()})
+    return samples
+
+metrics.REGISTRY.gauge("finsight_single_flight_requests", "Requests that ran the pipeline vs. attached to an identical in-flight one",
+                       ["kind", "role"], callback=_single_flight_requests)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics in the text exposition format"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+# ==== Readiness Probe ====
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: per-component load state and load durations"""
+    body = {
+        "ready": registry.ready,
+        "components": registry.describe()
     }
+    if not registry.ready:
+        return JSONResponse(status_code=503, content=body, headers={"Retry-After": "5"})
+    return body
 
 # ==== Test Gemini Endpoint ====
 @app.get("/test-gemini")
@@ -325,7 +650,7 @@ async def test_gemini():
     """Test if Gemini API is working"""
     try:
         test_question = "What is 2+2? Answer briefly."
-        answer = gemini_fallback(test_question)
+        answer = await gemini_fallback(test_question)
         return {
             "status": "success",
             "question": test_question,
@@ -348,18 +673,25 @@ app.include_router(chat_history_router)
 # ==== Trading Route ====
 app.include_router(trading_router)
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or "YOUR_GEMINI_API_KEY"
-GEMINI_MODEL = "gemini-1.5-flash"  # Use the correct Gemini model
-GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
-
 @app.post("/api/gemini")
-async def gemini_proxy(req: Request):
+async def gemini_proxy(req: Request, stream: bool = False):
+    """
+    Pass a request body through to Gemini over the shared connection pool
+
+    The upstream response is relayed chunk by chunk as it arrives; with
+    `?stream=true` it uses streamGenerateContent and relays server-sent events.
+    """
     body = await req.json()
     try:
-        response = requests.post(GEMINI_API_URL, json=body)
-        return JSONResponse(content=response.json(), status_code=response.status_code)
+        upstream = await get_gemini_client().open_stream(body, sse=stream, deadline=GEMINI_DEADLINE)
+    except CircuitOpen as e:
+        return JSONResponse(content={"error": str(e)}, status_code=503, headers={"Retry-After": str(int(e.retry_after))})
     except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=500)
+        return JSONResponse(content={"error": str(e)}, status_code=getattr(e, "status_code", None) or 500)
+
+    media_type = upstream.headers.get("content-type", "text/event-stream" if stream else "application/json")
+    return StreamingResponse(upstream.aiter_bytes(), status_code=upstream.status_code, media_type=media_type,
+                             headers=SSE_HEADERS if stream else None)
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark CrossEncoder reranking: one predict() per request vs. micro-batching.
+
+Simulates N concurrent users, each sending rerank requests of a few
+(query, chunk) pairs back to back, and reports throughput and latency for
+both strategies at every concurrency level.
+
+Usage:
+    python backend/scripts/benchmark_reranker.py                 # real qnli-distilroberta-base
+    python backend/scripts/benchmark_reranker.py --stub          # synthetic model, no download
+    python backend/scripts/benchmark_reranker.py --users 1 8 32 --requests 20 --json out.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+# Make finsight_app importable when run from the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from finsight_app.executors import BoundedExecutor
+from finsight_app.rerank_service import RerankBatcher
+from finsight_app.stubs import StubCrossEncoder, WORDS
+
+
+def make_pairs(rng: random.Random, pairs_per_request: int):
+    query = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+    return [(query, " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 200))))
+            for _ in range(pairs_per_request)]
+
+
+async def run_level(strategy: str, reranker, users: int, requests_per_user: int, pairs_per_request: int, args) -> dict:
+    executor = BoundedExecutor(f"bench-{strategy}", max_workers=args.workers, max_queue=10_000)
+    batcher = RerankBatcher(reranker, window_ms=args.window_ms, max_batch_size=args.max_batch, executor=executor)
+    latencies = []
+
+    async def user(seed: int):
+        rng = random.Random(seed)
+        for _ in range(requests_per_user):
+            pairs = make_pairs(rng, pairs_per_request)
+            start = time.perf_counter()
+            if strategy == "batched":
+                await batcher.score(pairs)
+            else:
+                await executor.run(reranker.predict, [list(pair) for pair in pairs])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(seed) for seed in range(users)))
+    elapsed = time.perf_counter() - start
+    executor.shutdown(wait=True)
+
+    total_requests = users * requests_per_user
+    latencies.sort()
+    return {
+        "strategy": strategy,
+        "users": users,
+        "requests": total_requests,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(total_requests / elapsed, 2),
+        "pairs_per_s": round(total_requests * pairs_per_request / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2),
+        "batches": batcher.batches if strategy == "batched" else total_requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reranker micro-batching")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32], help="Concurrency levels")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per user")
+    parser.add_argument("--pairs", type=int, default=3, help="(query, chunk) pairs per request")
+    parser.add_argument("--window-ms", type=float, default=5.0, help="Batching window")
+    parser.add_argument("--max-batch", type=int, default=64, help="Max pairs per batched forward pass")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("FINSIGHT_MODEL_WORKERS", "2")), help="Model executor workers")
+    parser.add_argument("--stub", action="store_true", help="Use a synthetic reranker instead of the real model")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.stub:
+        reranker = StubCrossEncoder()
+    else:
+        from sentence_transformers import CrossEncoder
+        reranker = CrossEncoder("cross-encoder/qnli-distilroberta-base")
+        reranker.predict([["warm up", "warm up"]])
+
+    results = []
+    print(f"{'strategy':<10} {'users':>5} {'req/s':>9} {'pairs/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'batches':>8}")
+    for users in args.users:
+        for strategy in ("direct", "batched"):
+            row = asyncio.run(run_level(strategy, reranker, users, args.requests, args.pairs, args))
+            results.append(row)
+            print(f"{row['strategy']:<10} {row['users']:>5} {row['requests_per_s']:>9} {row['pairs_per_s']:>9} "
+                  f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['batches']:>8}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"✅ Results saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
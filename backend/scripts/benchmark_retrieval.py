@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Offline retrieval benchmark: recall@k, MRR and search latency per index configuration.
+
+Loads the chunk vectors from the FAISS index in get_faiss_index_dir() (or
+builds a synthetic corpus), rebuilds them into every requested index spec
+(flat, IVF, IVF-PQ, HNSW, scalar quantized, optionally with float32 refine, or
+any index_factory string, see index_specs) and runs a labelled question set against each, with and
+without cross-encoder reranking, at every k. Queries are searched one at a
+time, as the API does, so latencies are per-request latencies.
+
+Every configuration is also scored against exact float32 search over the
+same corpus: `recall_drop` is the loss versus flat at the same k, and rows
+beyond --recall-tolerance are flagged, so compressed indexes are accepted on a
+measured recall budget. `hot_mb` is the index memory that must stay resident
+(a refine stage's float32 store is memory-mapped and only read for candidates).
+
+--coarse-filings adds two-stage rows (see coarse_index): a coarse index of
+per-filing section means picks each query's top filings and only their chunks
+are searched, so FINSIGHT_COARSE_FILINGS can be chosen on measured recall.
+
+Labelled set format (JSON list or JSONL), one entry per question:
+    {"question": "What was Apple's iPhone revenue in 2023?", "relevant": ["AAPL_10-K_2023_chunk_12.txt"]}
+`relevant` entries match a chunk's docstore id, metadata source/file, or
+chunk_mapping.pkl file name.
+
+Usage:
+    python backend/scripts/benchmark_retrieval.py --synthetic                  # no index or models needed
+    python backend/scripts/benchmark_retrieval.py --labels labels.jsonl --k 1 5 10 --rerank both
+    python backend/scripts/benchmark_retrieval.py --synthetic --index-specs flat hnsw:M=16 "IVF256,SQ8" --json out.json
+    python backend/scripts/benchmark_retrieval.py --synthetic --index-specs flat sqfp16 sq8 sq8:refine=4 --recall-tolerance 0.01
+    python backend/scripts/benchmark_retrieval.py --labels labels.jsonl --index-specs flat ivf-flat --coarse-filings 4 8 16
+"""
+
+import argparse
+import itertools
+import json
+import os
+import pickle
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+# Make finsight_app importable when run from the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from finsight_app.coarse_index import CoarseIndex, build_coarse_index
+from finsight_app.filtered_search import filtered_search_batch
+from finsight_app.index_specs import IndexSpec, build_index, enable_reconstruct, search_parameters, stored_vectors
+from finsight_app.path_utils import get_faiss_index_dir
+from finsight_app.stubs import StubCrossEncoder, StubEmbeddings, WORDS, synthetic_corpus
+
+
+class Corpus:
+    """Chunk vectors plus, per chunk, the keys a labelled set may use to refer to it."""
+
+    def __init__(self, vectors: np.ndarray, keys: List[Tuple[str, ...]], texts: List[str], metric: int,
+                 names: Optional[List[str]] = None):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.keys = keys
+        self.texts = texts
+        self.metric = metric
+        # Chunk file name / source per chunk: what the coarse index groups into filings
+        self.names = names or [""] * len(self.vectors)
+
+    def relevant_ids(self, labels: Sequence[str]) -> set:
+        wanted = set(labels)
+        return {i for i, keys in enumerate(self.keys) if wanted.intersection(keys)}
+
+
+# ---- Data ----
+def load_index_corpus(index_dir: str) -> Corpus:
+    """Reconstruct the stored vectors and chunk keys from a saved index directory."""
+    index = faiss.read_index(os.path.join(index_dir, "index.faiss"))
+    langchain_store = os.path.join(index_dir, "index.pkl")
+    mapping = os.path.join(index_dir, "chunk_mapping.pkl")
+    if os.path.exists(langchain_store):
+        with open(langchain_store, "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        # Chunk ids of live chunks: snapshots may have gaps (deleted / compacted ids)
+        chunk_ids = sorted(index_to_docstore_id)
+        vectors = stored_vectors(index, np.array(chunk_ids, dtype=np.int64))
+        keys: List[Tuple[str, ...]] = []
+        texts, names = [], []
+        for i in chunk_ids:
+            docstore_id = index_to_docstore_id[i]
+            doc = docstore.search(docstore_id)
+            metadata = getattr(doc, "metadata", None) or {}
+            keys.append(tuple(str(key) for key in (docstore_id, metadata.get("source"), metadata.get("file")) if key))
+            texts.append(getattr(doc, "page_content", ""))
+            names.append(str(metadata.get("file") or metadata.get("source") or ""))
+        return Corpus(vectors, keys, texts, index.metric_type, names)
+
+    vectors = stored_vectors(index)
+    keys = [(str(i),) for i in range(index.ntotal)]
+    if os.path.exists(mapping):
+        with open(mapping, "rb") as f:
+            file_names = pickle.load(f)
+        keys = [(name,) for name in file_names]
+        return Corpus(vectors, keys, [""] * index.ntotal, index.metric_type, list(file_names))
+    return Corpus(vectors, keys, [""] * index.ntotal, index.metric_type)
+
+
+def load_labels(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def synthetic_data(num_chunks: int, num_queries: int, seed: int, embeddings: StubEmbeddings):
+    """
+    Synthetic corpus and labels: each question is a handful of words from one
+    chunk plus unrelated words, so that chunk is the single relevant answer.
+    """
+    rng = random.Random(seed + 1)
+    # Filing boilerplate shares one small vocabulary; a few rarer terms per chunk
+    # (names, products, figures) are what make a chunk findable
+    vocabulary = ["".join(rng.choice("bcdfghjklmnpqrstvwxz") + rng.choice("aeiou") for _ in range(3))
+                  for _ in range(max(1000, num_chunks // 2))]
+    corpus = synthetic_corpus(num_chunks, seed)
+    terms = [rng.sample(vocabulary, 6) for _ in corpus]
+    texts = [item["text"] + " " + " ".join(chunk_terms) for item, chunk_terms in zip(corpus, terms)]
+    vectors = np.array(embeddings.embed_documents(texts), dtype=np.float32)
+    keys = [(str(item["metadata"]["chunk"]),) for item in corpus]
+    names = [item["metadata"]["source"] for item in corpus]
+
+    labels = []
+    for _ in range(num_queries):
+        target = rng.randrange(num_chunks)
+        question = rng.sample(terms[target], 3) + rng.sample(texts[target].split()[:3], 2) + rng.sample(WORDS, 4)
+        rng.shuffle(question)
+        labels.append({"question": " ".join(question), "relevant": [str(target)]})
+    return Corpus(vectors, keys, texts, faiss.METRIC_L2, names), labels
+
+
+# ---- Indexes ----
+def sweep_settings(index: faiss.Index, args) -> List[Tuple[str, Dict[str, Any]]]:
+    """Query-time knob values to sweep for an index: (label, search_parameters kwargs)."""
+    if faiss.try_extract_index_ivf(index) is not None:
+        nlist = faiss.extract_index_ivf(index).nlist
+        settings = [(f"nprobe={n}", {"nprobe": n}) for n in args.nprobe if n <= nlist]
+    elif search_parameters(index, ef_search=1) is not None:
+        settings = [(f"efSearch={ef}", {"ef_search": ef}) for ef in args.ef_search]
+    else:
+        settings = [("exact", {})]
+    if isinstance(faiss.downcast_index(index), faiss.IndexRefine) and args.k_factor:
+        settings = [(f"{label},kf={kf:g}", {**knobs, "k_factor": kf}) for label, knobs in settings for kf in args.k_factor]
+    return settings
+
+
+def memory_mb(index: faiss.Index) -> Tuple[float, float]:
+    """(serialized size, part that stays resident) in MB; a refine stage's float32 store is mapped, not resident."""
+    total = faiss.serialize_index(index).nbytes
+    hot = total
+    inner = faiss.downcast_index(index)
+    if isinstance(inner, faiss.IndexRefine):
+        hot = faiss.serialize_index(inner.base_index).nbytes
+    return round(total / 1e6, 2), round(hot / 1e6, 2)
+
+
+# ---- Measurement ----
+def percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def evaluate(index, corpus: Corpus, queries: np.ndarray, questions: List[str], relevant: List[set],
+             k: int, params=None, reranker=None, rerank_depth: int = 20, coarse: Optional[CoarseIndex] = None,
+             filings: int = 0, knobs: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """recall@k, MRR@k and per-query latency of one configuration (two-stage when coarse and filings are given)."""
+    latencies, recalls, reciprocal_ranks = [], [], []
+    depth = max(k, rerank_depth) if reranker else k
+    for vector, question, wanted in zip(queries, questions, relevant):
+        start = time.perf_counter()
+        query = vector.reshape(1, -1)
+        if coarse is not None and filings > 0:
+            # As RetrievalSystem.search_ids_batch: the query's top filings, then only their chunks
+            candidates = coarse.select(query, filings, min_chunks=depth)[0]
+            hits = [filtered_search_batch(index, query, depth, candidates, nprobe=(knobs or {}).get("nprobe"),
+                                          ef_search=(knobs or {}).get("ef_search"))[0][1]]
+        else:
+            _, hits = index.search(query, depth, params=params)
+        ids = [int(i) for i in hits[0] if i != -1]
+        if reranker is not None and len(ids) > 1:
+            scores = reranker.predict([[question, corpus.texts[i]] for i in ids])
+            ids = [i for _, i in sorted(zip(scores, ids), key=lambda pair: pair[0], reverse=True)]
+        ids = ids[:k]
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        recalls.append(len(wanted.intersection(ids)) / len(wanted))
+        rank = next((position for position, i in enumerate(ids, 1) if i in wanted), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    return {
+        "recall": round(statistics.mean(recalls), 4),
+        "mrr": round(statistics.mean(reciprocal_ranks), 4),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "qps": round(len(latencies) / (sum(latencies) / 1000), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality vs. latency per FAISS index type")
+    source = parser.add_argument_group("data")
+    source.add_argument("--synthetic", action="store_true", help="Synthetic corpus and labels with stub embeddings")
+    source.add_argument("--index-dir", default=None, help="Saved index directory (default: get_faiss_index_dir())")
+    source.add_argument("--labels", help="Labelled question -> chunk set (JSON or JSONL)")
+    source.add_argument("--corpus", type=int, default=20000, help="Synthetic corpus size")
+    source.add_argument("--queries", type=int, default=500, help="Synthetic labelled questions")
+    source.add_argument("--seed", type=int, default=0)
+    source.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+
+    sweep = parser.add_argument_group("configurations")
+    sweep.add_argument("--index-specs", nargs="+", default=["flat", "ivf-flat", "hnsw"],
+                       help='Index specs to compare, e.g. flat ivf-flat:nlist=256 ivf-pq hnsw:M=16 sq8:refine=4 "IVF256,SQ8"')
+    sweep.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    sweep.add_argument("--nprobe", type=int, nargs="+", default=[1, 8, 32], help="IVF nprobe values to sweep")
+    sweep.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 128], help="HNSW efSearch values to sweep")
+    sweep.add_argument("--k-factor", type=float, nargs="+", default=[],
+                       help="float32 re-ranking depths to sweep for refined specs (default: the spec's refine=)")
+    sweep.add_argument("--recall-tolerance", type=float, default=0.02,
+                       help="Largest acceptable recall@k loss versus exact float32 search")
+    sweep.add_argument("--coarse-filings", type=int, nargs="+", default=[],
+                       help="Also run two-stage search over this many top filings (FINSIGHT_COARSE_FILINGS values)")
+    sweep.add_argument("--rerank", choices=["off", "on", "both"], default="off")
+    sweep.add_argument("--rerank-depth", type=int, default=20, help="Candidates fetched for the reranker")
+    sweep.add_argument("--stub-reranker", action="store_true", help="Word-overlap reranker instead of the cross-encoder")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        embedder = StubEmbeddings(latency_ms=0, per_text_ms=0)
+        corpus, labels = synthetic_data(args.corpus, args.queries, args.seed, embedder)
+        embed = lambda texts: np.array(embedder.embed_documents(texts), dtype=np.float32)
+    else:
+        if not args.labels:
+            parser.error("--labels is required unless --synthetic is given")
+        corpus = load_index_corpus(args.index_dir or get_faiss_index_dir())
+        labels = load_labels(args.labels)
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(args.embedding_model)
+        embed = lambda texts: model.encode(texts, batch_size=64, convert_to_numpy=True).astype(np.float32)
+
+    questions, relevant = [], []
+    for entry in labels:
+        wanted = corpus.relevant_ids(entry["relevant"])
+        if wanted:
+            questions.append(entry["question"])
+            relevant.append(wanted)
+    if not questions:
+        sys.exit("❌ No labelled question matches a chunk in the index")
+    print(f"📦 {len(corpus.vectors)} chunks, {len(questions)} labelled questions "
+          f"({len(labels) - len(questions)} skipped: relevant chunks not in the index)")
+    queries = embed(questions)
+    if corpus.metric == faiss.METRIC_INNER_PRODUCT:
+        faiss.normalize_L2(queries)
+
+    reranker = None
+    if args.rerank != "off":
+        if args.stub_reranker or args.synthetic:
+            reranker = StubCrossEncoder(call_overhead_ms=0, per_pair_ms=0)
+        else:
+            from sentence_transformers import CrossEncoder
+            reranker = CrossEncoder("cross-encoder/qnli-distilroberta-base")
+    rerank_modes = {"off": [False], "on": [True], "both": [False, True]}[args.rerank]
+
+    metric = "ip" if corpus.metric == faiss.METRIC_INNER_PRODUCT else "l2"
+    built = []
+    for text in args.index_specs:
+        spec = IndexSpec.parse(text)
+        spec.metric = metric
+        index, params = build_index(corpus.vectors, spec, seed=args.seed)
+        built.append((params["factory"], index, params))
+
+    # Exact float32 search is the reference every configuration's recall is held to
+    exact = faiss.IndexFlat(corpus.vectors.shape[1], corpus.metric)
+    exact.add(corpus.vectors)
+    baseline = {
+        (use_rerank, k): evaluate(exact, corpus, queries, questions, relevant, k,
+                                  reranker=reranker if use_rerank else None, rerank_depth=args.rerank_depth)["recall"]
+        for use_rerank in rerank_modes for k in args.k
+    }
+    float32_mb = round(corpus.vectors.nbytes / 1e6, 2)
+
+    coarse = None
+    coarse_tmp = None
+    filing_modes = [0]
+    if args.coarse_filings:
+        coarse_tmp = tempfile.TemporaryDirectory(prefix="finsight-coarse-")
+        build_coarse_index(corpus.vectors, corpus.names, coarse_tmp.name, metric=corpus.metric)
+        coarse = CoarseIndex(coarse_tmp.name)
+        filing_modes += [n for n in args.coarse_filings if 0 < n < len(coarse.filings)]
+        for _, index, _ in built:
+            # The fine stage scans small candidate sets exactly, which needs reconstruct on IVF
+            enable_reconstruct(index, sequential=True)
+
+    results = []
+    print(f"{'index':<20} {'setting':<26} {'rerank':<6} {'k':>3} {'recall':>7} {'drop':>7} {'mrr':>7} "
+          f"{'hot MB':>8} {'p50 ms':>8} {'p99 ms':>8} {'qps':>8}")
+    for factory, index, build_params in built:
+        size_mb, hot_mb = memory_mb(index)
+        for base_label, knobs in sweep_settings(index, args):
+            params = search_parameters(index, **knobs)
+            for filings in filing_modes:
+                label = f"{base_label},filings={filings}" if filings else base_label
+                for use_rerank, k in itertools.product(rerank_modes, args.k):
+                    row = evaluate(index, corpus, queries, questions, relevant, k, params=params,
+                                   reranker=reranker if use_rerank else None, rerank_depth=args.rerank_depth,
+                                   coarse=coarse, filings=filings, knobs=knobs)
+                    drop = round(baseline[(use_rerank, k)] - row["recall"], 4)
+                    row.update({"index": factory, "setting": label, "filings": filings, "rerank": use_rerank, "k": k,
+                                "build_s": build_params["build_seconds"], "size_mb": size_mb, "hot_mb": hot_mb,
+                                "compression": round(float32_mb / max(hot_mb, 1e-9), 2), "recall_drop": drop,
+                                "within_tolerance": drop <= args.recall_tolerance})
+                    results.append(row)
+                    flag = "" if row["within_tolerance"] else "  ⚠️ over tolerance"
+                    print(f"{factory:<20} {label:<26} {'yes' if use_rerank else 'no':<6} {k:>3} {row['recall']:>7} "
+                          f"{drop:>7} {row['mrr']:>7} {hot_mb:>8} {row['p50_ms']:>8} {row['p99_ms']:>8} {row['qps']:>8}{flag}")
+
+    print(f"\n📏 float32 vectors: {float32_mb} MB; recall tolerance {args.recall_tolerance} vs. exact search")
+    for factory, index, _ in built:
+        rows = [row for row in results if row["index"] == factory]
+        passing = [row for row in rows if row["within_tolerance"]]
+        verdict = (f"✅ within tolerance ({len(passing)}/{len(rows)} settings)" if passing
+                   else "❌ over tolerance at every setting")
+        print(f"  {factory:<20} {rows[0]['hot_mb']:>8} MB resident ({rows[0]['compression']}x)  {verdict}")
+
+    if coarse_tmp is not None:
+        coarse_tmp.cleanup()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "config": vars(args),
+                "corpus_size": len(corpus.vectors),
+                "exact_recall": {f"k={k}{',rerank' if use_rerank else ''}": recall for (use_rerank, k), recall in baseline.items()},
+                "questions": len(questions),
+                "results": results,
+            }, f, indent=2)
+        print(f"✅ Results saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for the RAG endpoints (/ask, /chat, /search, /upload).
+
+By default the app is started in-process with deterministic stub
+components (finsight_app.stubs) in place of the embedding model, local LLM,
+reranker and Gemini API, each with configurable latency, so numbers are
+reproducible on any machine and comparable across commits. Use --url to
+drive an already running server instead.
+
+Each endpoint is driven in its own phase, either closed-loop (--concurrency
+users sending back to back) or open-loop (--rate requests/s with Poisson
+arrivals, at most --concurrency outstanding). Latency percentiles,
+throughput and error rate per endpoint are printed and written as JSON.
+
+Usage:
+    python backend/scripts/loadtest.py                                   # stubs, all endpoints
+    python backend/scripts/loadtest.py --endpoints ask search --concurrency 32 --duration 20
+    python backend/scripts/loadtest.py --rate 50 --llm-first-token-ms 80 --json run.json
+    python backend/scripts/loadtest.py --url http://127.0.0.1:8000 --endpoints search
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# Make finsight_app (and main) importable when run from the repo root
+sys.path.insert(0, BACKEND_DIR)
+
+from finsight_app.stubs import (
+    StubCrossEncoder, StubEmbeddings, StubIngestor, StubLLM,
+    build_stub_vectorstore, create_stub_gemini_app, free_port, serve_in_thread, synthetic_filing_text,
+    synthetic_questions,
+)
+
+ENDPOINTS = ("ask", "chat", "search", "upload")
+
+
+# ---- Stubbed in-process server ----
+def start_stubbed_app(args) -> str:
+    """Start main:app with stub components and a stub Gemini server; returns the base URL."""
+    gemini_port = free_port()
+    serve_in_thread(
+        create_stub_gemini_app(latency_ms=args.gemini_ms, chunk_ms=args.gemini_chunk_ms, error_rate=args.gemini_error_rate),
+        gemini_port,
+    )
+
+    # main reads its configuration at import time
+    os.environ["GEMINI_API_KEY"] = "stub"
+    os.environ["GEMINI_API_BASE"] = f"http://127.0.0.1:{gemini_port}"
+    os.environ["FINSIGHT_ANSWER_CACHE"] = "true" if args.answer_cache else "false"
+    os.environ["FINSIGHT_SINGLE_FLIGHT"] = "true" if args.single_flight else "false"
+
+    import main
+    import finsight_app.upload as upload
+
+    embeddings = StubEmbeddings(latency_ms=args.embed_ms)
+    main.registry.set("embeddings", embeddings)
+    main.registry.set("vectorstore", build_stub_vectorstore(embeddings, num_chunks=args.corpus, seed=args.seed))
+    main.registry.set("reranker", StubCrossEncoder(call_overhead_ms=args.rerank_ms, per_pair_ms=args.rerank_pair_ms))
+    main.registry.set("llm", StubLLM(
+        first_token_ms=args.llm_first_token_ms,
+        per_token_ms=args.llm_token_ms,
+        tokens=args.llm_tokens,
+        invalid_rate=args.llm_invalid_rate,
+    ))
+    upload.process_and_embed_file = StubIngestor(embeddings)
+
+    port = free_port()
+    serve_in_thread(main.app, port)
+    return f"http://127.0.0.1:{port}"
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with contextlib.suppress(httpx.HTTPError):
+            if (await client.get("/ready")).status_code == 200:
+                return
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+
+# ---- Requests ----
+def request_factory(endpoint: str, args) -> Callable[[random.Random], Dict[str, Any]]:
+    """Build httpx request kwargs for one call to an endpoint."""
+    questions = synthetic_questions(args.distinct_questions, seed=args.seed)
+
+    if endpoint == "ask":
+        return lambda rng: {"method": "POST", "url": "/ask", "json": {"question": rng.choice(questions)}}
+    if endpoint == "chat":
+        return lambda rng: {"method": "POST", "url": "/chat", "json": {"query": rng.choice(questions)}}
+    if endpoint == "search":
+        return lambda rng: {"method": "POST", "url": "/search",
+                            "json": {"query": rng.choice(questions), "k": args.search_k, "rerank": args.search_rerank}}
+    if endpoint == "upload":
+        def upload(rng: random.Random):
+            text = "\n\n".join(synthetic_filing_text(rng) for _ in range(args.upload_paragraphs))
+            name = f"loadtest_{rng.randrange(10**9)}.txt"
+            return {"method": "POST", "url": "/upload", "files": {"file": (name, text.encode("utf-8"), "text/plain")}}
+        return upload
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+
+def is_error(response: httpx.Response) -> bool:
+    """HTTP errors, plus the 200 responses the app uses to report failures."""
+    if response.status_code >= 400:
+        return True
+    with contextlib.suppress(ValueError):
+        body = response.json()
+        if isinstance(body, dict):
+            answer = str(body.get("answer", ""))
+            return "error" in body or body.get("status") == "error" or answer.startswith("❌")
+    return False
+
+
+async def timed_call(client: httpx.AsyncClient, request: Dict[str, Any], samples: List[Dict[str, Any]]):
+    start = time.perf_counter()
+    try:
+        response = await client.request(**request)
+        status, error = response.status_code, is_error(response)
+    except httpx.HTTPError as e:
+        status, error = type(e).__name__, True
+    samples.append({"latency": time.perf_counter() - start, "status": status, "error": error})
+
+
+# ---- Load patterns ----
+async def closed_loop(client, make_request, args, seed: int) -> List[Dict[str, Any]]:
+    """--concurrency users, each sending its next request as soon as the previous one returns."""
+    samples: List[Dict[str, Any]] = []
+    stop_at = time.perf_counter() + args.duration
+    remaining = [args.requests] if args.requests else None
+
+    async def user(user_seed: int):
+        rng = random.Random(user_seed)
+        while time.perf_counter() < stop_at:
+            if remaining is not None:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            await timed_call(client, make_request(rng), samples)
+
+    await asyncio.gather(*(user(seed * 1000 + i) for i in range(args.concurrency)))
+    return samples
+
+
+async def open_loop(client, make_request, args, seed: int) -> List[Dict[str, Any]]:
+    """Poisson arrivals at --rate requests/s; arrivals beyond --concurrency outstanding are dropped as errors."""
+    samples: List[Dict[str, Any]] = []
+    rng = random.Random(seed)
+    outstanding = set()
+    stop_at = time.perf_counter() + args.duration
+    sent = 0
+    next_arrival = time.perf_counter()
+    while time.perf_counter() < stop_at and (not args.requests or sent < args.requests):
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        next_arrival += rng.expovariate(args.rate)
+        sent += 1
+        if len(outstanding) >= args.concurrency:
+            samples.append({"latency": 0.0, "status": "client_overload", "error": True})
+            continue
+        task = asyncio.ensure_future(timed_call(client, make_request(rng), samples))
+        outstanding.add(task)
+        task.add_done_callback(outstanding.discard)
+    if outstanding:
+        await asyncio.gather(*outstanding)
+    return samples
+
+
+# ---- Reporting ----
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(-(-q * len(sorted_values) // 100)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(endpoint: str, samples: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(sample["latency"] * 1000 for sample in samples if sample["status"] != "client_overload")
+    errors = sum(1 for sample in samples if sample["error"])
+    status_codes: Dict[str, int] = {}
+    for sample in samples:
+        status_codes[str(sample["status"])] = status_codes.get(str(sample["status"]), 0) + 1
+    ok = len(samples) - errors
+    return {
+        "endpoint": endpoint,
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            "max": round(latencies[-1], 2) if latencies else 0.0,
+        },
+        "status_codes": status_codes,
+    }
+
+
+def git_commit() -> Optional[str]:
+    with contextlib.suppress(Exception):
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    return None
+
+
+async def run(args, base_url: str, out) -> List[Dict[str, Any]]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        await wait_until_ready(client)
+        results = []
+        print(f"{'endpoint':<8} {'reqs':>6} {'err %':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}", file=out)
+        for index, endpoint in enumerate(args.endpoints):
+            make_request = request_factory(endpoint, args)
+            warmup_rng = random.Random(args.seed)
+            for _ in range(args.warmup):
+                await timed_call(client, make_request(warmup_rng), [])
+
+            pattern = open_loop if args.rate else closed_loop
+            start = time.perf_counter()
+            samples = await pattern(client, make_request, args, seed=args.seed + index)
+            row = summarize(endpoint, samples, time.perf_counter() - start)
+            results.append(row)
+            latency = row["latency_ms"]
+            print(f"{endpoint:<8} {row['requests']:>6} {row['error_rate'] * 100:>6.2f} {row['throughput_rps']:>8} "
+                  f"{latency['p50']:>8} {latency['p95']:>8} {latency['p99']:>8}", file=out)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the FinSight RAG endpoints")
+    parser.add_argument("--url", help="Target a running server instead of starting a stubbed one in-process")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=16, help="Closed loop: concurrent users; open loop: max outstanding")
+    parser.add_argument("--rate", type=float, help="Open loop: mean arrival rate in requests/s (Poisson)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per endpoint")
+    parser.add_argument("--requests", type=int, help="Also stop each endpoint after this many requests")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests per endpoint")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--distinct-questions", type=int, default=200, help="Question pool size (repeats hit caches)")
+    parser.add_argument("--search-k", type=int, default=5)
+    parser.add_argument("--search-rerank", action="store_true")
+    parser.add_argument("--upload-paragraphs", type=int, default=10)
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own request logging")
+
+    stubs = parser.add_argument_group("stub latencies (in-process mode)")
+    stubs.add_argument("--corpus", type=int, default=2000, help="Synthetic chunks in the stub index")
+    stubs.add_argument("--embed-ms", type=float, default=2.0)
+    stubs.add_argument("--rerank-ms", type=float, default=15.0)
+    stubs.add_argument("--rerank-pair-ms", type=float, default=1.0)
+    stubs.add_argument("--llm-first-token-ms", type=float, default=50.0)
+    stubs.add_argument("--llm-token-ms", type=float, default=5.0)
+    stubs.add_argument("--llm-tokens", type=int, default=40)
+    stubs.add_argument("--llm-invalid-rate", type=float, default=0.0, help="Share of prompts answered empty (forces fallback)")
+    stubs.add_argument("--gemini-ms", type=float, default=300.0)
+    stubs.add_argument("--gemini-chunk-ms", type=float, default=20.0)
+    stubs.add_argument("--gemini-error-rate", type=float, default=0.0)
+    stubs.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache on")
+    stubs.add_argument("--single-flight", action="store_true", help="Keep request coalescing on")
+    args = parser.parse_args()
+    if args.duration <= 0:
+        parser.error("--duration must be positive")
+
+    out = sys.stdout
+    # The app logs every request with print(); keep it out of the report unless asked
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with quiet:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            print("🚀 Starting stubbed FinSight API in-process...", file=out)
+            base_url = start_stubbed_app(args)
+        results = asyncio.run(run(args, base_url, out))
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "target": args.url or "in-process stubs",
+        "config": {key: value for key, value in vars(args).items() if key not in ("json", "verbose")},
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results saved to {args.json}", file=out)
+    else:
+        print(json.dumps(report, indent=2), file=out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""
+FinSight Copilot - Test Configuration
+Puts backend/ on sys.path so tests import finsight_app like the API server does
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
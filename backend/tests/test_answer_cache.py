@@ -0,0 +1,58 @@
+"""
+FinSight Copilot - Semantic Answer Cache Tests
+Similar questions that differ in a year, amount or company must not share answers
+"""
+
+import pytest
+
+from finsight_app.answer_cache import SemanticAnswerCache, company_names, key_terms
+
+NAMES = frozenset({"aapl", "apple", "msft", "microsoft"})
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SemanticAnswerCache(threshold=0.9, index_dir=str(tmp_path), names=NAMES)
+
+
+def test_key_terms():
+    assert key_terms("What was AAPL revenue in 2023?", NAMES) == {"aapl", "2023"}
+    assert key_terms("How much did Microsoft's cloud earn in Q3 FY2024?", NAMES) == {"microsoft", "q3", "fy2024"}
+    assert key_terms("Net sales of $383,285 million, up 3.5%", NAMES) == {"net", "383285", "3.5"}
+    assert key_terms("risk factors in the 10-K", NAMES) == {"10k"}
+    assert key_terms("what was apple revenue", NAMES) == {"apple"}
+    # Paraphrases keep their terms
+    assert key_terms("Apple revenue in 2023", NAMES) == key_terms("what was apple's revenue for 2023?", NAMES)
+
+
+def test_paraphrase_hits(cache):
+    cache.store([1.0, 0.0], "AAPL 2023 revenue was $383.3B", ["AAPL_10-K_2023_chunk_1.txt"],
+                question="What was AAPL revenue in 2023?")
+    hit = cache.lookup([0.99, 0.05], question="AAPL revenue in 2023")
+    assert hit is not None and hit.answer.startswith("AAPL 2023")
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("question", [
+    "What was AAPL revenue in 2022?",       # different year
+    "What was MSFT revenue in 2023?",       # different ticker
+    "what was microsoft revenue in 2023",   # different company, lower case
+    "What was AAPL revenue in Q3 2023?",    # narrower period
+])
+def test_different_figures_miss(cache, question):
+    cache.store([1.0, 0.0], "AAPL 2023 revenue was $383.3B", [], question="What was AAPL revenue in 2023?")
+    # Embeddings nearly identical: only the key terms tell the questions apart
+    assert cache.lookup([1.0, 0.001], question=question) is None
+    assert cache.stats()["term_mismatches"] == 1
+
+
+def test_scope_still_applies(cache):
+    cache.store([1.0, 0.0], "answer", [], scope="a", question="AAPL revenue 2023")
+    assert cache.lookup([1.0, 0.0], scope="b", question="AAPL revenue 2023") is None
+    assert cache.lookup([1.0, 0.0], scope="a", question="AAPL revenue 2023") is not None
+
+
+def test_company_names_from_data_dir(tmp_path):
+    (tmp_path / "AAPL_company_info.json").write_text('{"ticker": "AAPL", "name": "Apple Inc."}')
+    (tmp_path / "combined_company_info.json").write_text('[{"ticker": "AAPL"}]')
+    assert company_names(str(tmp_path)) == {"aapl", "apple"}
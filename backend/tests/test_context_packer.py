@@ -0,0 +1,40 @@
+"""
+FinSight Copilot - Context Packer Tests
+Near-duplicate detection across chunk-overlap fragments
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from finsight_app.context_packer import ContextPacker, jaccard, shingles
+
+SENTENCE = "Net sales rose 3.5% to $383,285 million in fiscal 2022, driven by iPhone and Services"
+
+
+@pytest.mark.parametrize("variant", [
+    SENTENCE + ".",                                                 # trailing period
+    SENTENCE.replace("2022,", "2022 ,"),                            # detached comma
+    SENTENCE.replace("2022,", "2022") + " .",                       # dropped comma, spaced period
+    SENTENCE.upper(),                                               # case
+])
+def test_punctuation_only_differences_are_duplicates(variant):
+    assert jaccard(shingles(SENTENCE), shingles(variant)) == 1.0
+
+
+def test_numbers_keep_their_separators():
+    # "3.5%" and "35%" are different figures
+    assert jaccard(shingles("margin rose 3.5% this year"), shingles("margin rose 35% this year")) < 0.5
+    assert shingles("$383,285 million") != shingles("$383 285 million")
+
+
+def test_pack_drops_overlap_fragment():
+    chunks = [
+        SimpleNamespace(page_content=f"{SENTENCE}. Gross margin was 43.3%."),
+        # Next chunk of the same filing repeats the overlap with different punctuation spacing
+        SimpleNamespace(page_content=f"{SENTENCE.replace('2022,', '2022 ,')} . Services grew 14%."),
+    ]
+    packed = ContextPacker(duplicate_threshold=0.8).pack(chunks, None, budget=500)
+    assert packed.duplicates_dropped == 1
+    assert packed.text.count("Net sales rose") == 1
+    assert "Services grew 14%." in packed.text
@@ -0,0 +1,404 @@
+"""
+FinSight Copilot - Gemini Client Tests
+GeminiClient retries, deadlines, circuit breaker and chunked passthrough
+against the stub Gemini server (finsight_app.stubs) on a local port
+"""
+
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from finsight_app import gemini_client, llm_engine
+from finsight_app.gemini_client import CircuitBreaker, CircuitOpen, GeminiClient, GeminiError, text_body
+from finsight_app.stubs import WORDS, create_stub_gemini_app, free_port, serve_in_thread
+
+
+@pytest.fixture
+def stub_gemini():
+    """Start a stub Gemini server; returns (app, base_url). Options are create_stub_gemini_app's."""
+    servers = []
+
+    def start(**options):
+        options.setdefault("latency_ms", 0)
+        options.setdefault("chunk_ms", 0)
+        app = create_stub_gemini_app(**options)
+        port = free_port()
+        servers.append(serve_in_thread(app, port))
+        return app, f"http://127.0.0.1:{port}"
+
+    yield start
+    for server in servers:
+        server.should_exit = True
+
+
+@pytest.fixture
+def backoff_ceilings(monkeypatch):
+    """Record the jitter ceilings the client draws its backoff from; every draw returns 1ms."""
+    ceilings = []
+
+    def uniform(low, high):
+        ceilings.append((low, high))
+        return 0.001
+
+    monkeypatch.setattr(gemini_client.random, "uniform", uniform)
+    return ceilings
+
+
+def make_client(base_url: str, **options) -> GeminiClient:
+    options.setdefault("backoff_base", 0.01)
+    return GeminiClient(api_key="stub", base_url=base_url, **options)
+
+
+def is_stub_text(text: str) -> bool:
+    return bool(text.split()) and all(word in WORDS for word in text.split())
+
+
+# ---- Retries ----
+@pytest.mark.parametrize("statuses", [(429,), (500, 503), (429, 502)])
+def test_sync_retries_retryable_status_with_jittered_backoff(stub_gemini, backoff_ceilings, statuses):
+    app, base_url = stub_gemini(script=statuses)
+    client = make_client(base_url, max_retries=2)
+
+    assert is_stub_text(client.generate_text_sync("apple revenue"))
+    assert [status for _, status in app.state.requests] == [*statuses, 200]
+    # Full jitter: uniform in [0, base * 2^attempt]
+    assert backoff_ceilings == [(0, 0.01 * 2 ** attempt) for attempt in range(len(statuses))]
+    assert client.stats()["retries"] == len(statuses)
+    assert client.stats()["circuit"] == "closed"
+    client.close()
+
+
+def test_async_retries_retryable_status_with_jittered_backoff(stub_gemini, backoff_ceilings):
+    app, base_url = stub_gemini(script=(503, 429))
+    client = make_client(base_url, max_retries=2)
+
+    async def run():
+        try:
+            return await client.generate_text("apple revenue")
+        finally:
+            await client.aclose()
+
+    assert is_stub_text(asyncio.run(run()))
+    assert len(app.state.requests) == 3
+    assert backoff_ceilings == [(0, 0.01), (0, 0.02)]
+
+
+def test_backoff_ceiling_is_capped(stub_gemini, backoff_ceilings):
+    _, base_url = stub_gemini(script=(503, 503, 503))
+    client = make_client(base_url, max_retries=3, backoff_base=0.01, backoff_max=0.015)
+
+    client.generate_text_sync("apple revenue")
+    assert backoff_ceilings == [(0, 0.01), (0, 0.015), (0, 0.015)]
+    client.close()
+
+
+def test_retry_after_header_replaces_jitter(stub_gemini, backoff_ceilings):
+    _, base_url = stub_gemini(script=(429,), retry_after=0.3)
+    client = make_client(base_url, max_retries=1)
+
+    start = time.monotonic()
+    assert is_stub_text(client.generate_text_sync("apple revenue"))
+    assert time.monotonic() - start >= 0.3
+    assert backoff_ceilings == []
+    client.close()
+
+
+def test_client_errors_are_not_retried(stub_gemini):
+    app, base_url = stub_gemini(script=(400,))
+    client = make_client(base_url, max_retries=2)
+
+    with pytest.raises(GeminiError) as error:
+        client.generate_text_sync("apple revenue")
+    assert error.value.status_code == 400
+    assert len(app.state.requests) == 1
+    assert client.stats()["circuit"] == "closed"
+    client.close()
+
+
+def test_exhausted_retries_raise_last_status(stub_gemini, backoff_ceilings):
+    app, base_url = stub_gemini(script=(503, 503, 503))
+    client = make_client(base_url, max_retries=2)
+
+    with pytest.raises(GeminiError) as error:
+        client.generate_text_sync("apple revenue")
+    assert error.value.status_code == 503
+    assert len(app.state.requests) == 3
+    assert client.stats()["failures"] == 1
+    client.close()
+
+
+# ---- Deadlines ----
+def test_sync_deadline_cuts_retries_short(stub_gemini):
+    # Every retry would wait 0.3s; a 0.5s deadline leaves room for one
+    app, base_url = stub_gemini(script=(503,) * 10, retry_after=0.3)
+    client = make_client(base_url, max_retries=10)
+
+    start = time.monotonic()
+    with pytest.raises(GeminiError) as error:
+        client.generate_text_sync("apple revenue", deadline=0.5)
+    assert time.monotonic() - start < 0.5
+    assert error.value.status_code == 503
+    assert len(app.state.requests) == 2
+    assert client.stats()["retries"] == 1
+    client.close()
+
+
+def test_async_deadline_cuts_retries_short(stub_gemini):
+    app, base_url = stub_gemini(script=(503,) * 10, retry_after=0.3)
+    client = make_client(base_url, max_retries=10)
+
+    async def run():
+        try:
+            await client.generate_text("apple revenue", deadline=0.5)
+        finally:
+            await client.aclose()
+
+    start = time.monotonic()
+    with pytest.raises(GeminiError):
+        asyncio.run(run())
+    assert time.monotonic() - start < 0.5
+    assert len(app.state.requests) == 2
+
+
+def test_deadline_times_out_slow_upstream(stub_gemini):
+    app, base_url = stub_gemini(latency_ms=1000)
+    client = make_client(base_url, max_retries=5)
+
+    start = time.monotonic()
+    with pytest.raises(GeminiError) as error:
+        client.generate_text_sync("apple revenue", deadline=0.3)
+    assert time.monotonic() - start < 0.8
+    assert error.value.status_code == 504
+    assert len(app.state.requests) == 1
+    client.close()
+
+
+# ---- Circuit breaker ----
+def test_breaker_opens_then_half_opens_then_closes(stub_gemini):
+    app, base_url = stub_gemini(script=(503, 503, 503))
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.3)
+    client = make_client(base_url, max_retries=0, breaker=breaker)
+
+    # Consecutive failures open the circuit
+    for _ in range(2):
+        with pytest.raises(GeminiError):
+            client.generate_text_sync("apple revenue")
+    assert breaker.state == "open"
+
+    # Open: fail fast without calling upstream
+    with pytest.raises(CircuitOpen) as rejected:
+        client.generate_text_sync("apple revenue")
+    assert rejected.value.status_code == 503
+    assert len(app.state.requests) == 2
+    assert client.stats()["rejected_open_circuit"] == 1
+
+    # Half-open: one trial call; its failure re-opens the circuit
+    time.sleep(0.35)
+    assert breaker.state == "half_open"
+    with pytest.raises(GeminiError):
+        client.generate_text_sync("apple revenue")
+    assert len(app.state.requests) == 3
+    assert breaker.state == "open"
+
+    # Half-open again: a successful trial closes it
+    time.sleep(0.35)
+    assert breaker.state == "half_open"
+    assert is_stub_text(client.generate_text_sync("apple revenue"))
+    assert breaker.state == "closed"
+    assert client.stats()["circuit"] == "closed"
+    assert is_stub_text(client.generate_text_sync("apple revenue"))
+    client.close()
+
+
+def test_half_open_admits_a_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    breaker.before_call()
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def open_then_half_open(client: GeminiClient, breaker: CircuitBreaker):
+    with pytest.raises(GeminiError):
+        client.generate_text_sync("apple revenue")
+    assert breaker.state == "open"
+    time.sleep(breaker.reset_timeout + 0.05)
+    assert breaker.state == "half_open"
+
+
+def test_cancelled_trial_frees_half_open_slot(stub_gemini):
+    # Second request fails with a long Retry-After: the trial is cancelled while it sleeps before retrying
+    app, base_url = stub_gemini(script=(503, 503), retry_after=5)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.2)
+    client = make_client(base_url, max_retries=0, breaker=breaker)
+    open_then_half_open(client, breaker)
+    client.max_retries = 2
+
+    async def run():
+        trial = asyncio.ensure_future(client.generate_text("apple revenue", deadline=30))
+        await asyncio.sleep(0.3)
+        assert len(app.state.requests) == 2
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        # The slot is free again: the next call is the new trial, and its success closes the circuit
+        assert breaker.state == "half_open"
+        text = await client.generate_text("apple revenue")
+        await client.aclose()
+        return text
+
+    assert is_stub_text(asyncio.run(run()))
+    assert breaker.state == "closed"
+
+
+def test_unexpected_error_in_trial_reopens_circuit(stub_gemini):
+    _, base_url = stub_gemini(script=(503,))
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.2)
+    client = make_client(base_url, max_retries=0, breaker=breaker)
+    open_then_half_open(client, breaker)
+
+    def undecodable(request):
+        raise httpx.DecodingError("bad gzip stream", request=request)
+
+    healthy = client.sync_client
+    client._sync_client = httpx.Client(base_url=base_url, transport=httpx.MockTransport(undecodable))
+    with pytest.raises(httpx.DecodingError):
+        client.generate_text_sync("apple revenue")
+    # Counted as a failed trial rather than leaving the trial in flight forever
+    assert breaker.state == "open"
+    assert client.stats()["failures"] == 2
+
+    client._sync_client.close()
+    client._sync_client = healthy
+    time.sleep(0.25)
+    assert is_stub_text(client.generate_text_sync("apple revenue"))
+    assert breaker.state == "closed"
+    client.close()
+
+
+def test_success_resets_consecutive_failures(stub_gemini):
+    _, base_url = stub_gemini(script=(503, 200, 503))
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    client = make_client(base_url, max_retries=0, breaker=breaker)
+
+    with pytest.raises(GeminiError):
+        client.generate_text_sync("apple revenue")
+    client.generate_text_sync("apple revenue")
+    with pytest.raises(GeminiError):
+        client.generate_text_sync("apple revenue")
+    assert breaker.failures == 1
+    assert breaker.state == "closed"
+    client.close()
+
+
+# ---- Chunked passthrough (/api/gemini) ----
+def test_open_stream_passes_sse_chunks_through(stub_gemini):
+    app, base_url = stub_gemini(chunks=4, chunk_ms=50, script=(503,))
+    client = make_client(base_url, max_retries=1)
+
+    async def run():
+        stream = await client.open_stream(text_body("apple revenue"), sse=True)
+        start = time.monotonic()
+        received = []
+        async for chunk in stream.aiter_bytes():
+            received.append((time.monotonic() - start, chunk))
+        await client.aclose()
+        return stream, received
+
+    stream, received = asyncio.run(run())
+    assert stream.status_code == 200
+    assert stream.headers["content-type"].startswith("text/event-stream")
+    # Retried before the first byte; streamGenerateContent?alt=sse upstream
+    assert [target for target, _ in app.state.requests] == ["gemini-1.5-flash:streamGenerateContent"] * 2
+
+    body = b"".join(chunk for _, chunk in received).decode()
+    events = [json.loads(line[len("data:"):]) for line in body.splitlines() if line.startswith("data:")]
+    assert len(events) == 4
+    assert all(is_stub_text(gemini_client.extract_text(event)) for event in events)
+    # Relayed as they arrive, not buffered into one body
+    assert len(received) >= 2
+    assert received[0][0] < received[-1][0] - 0.05
+    assert stream.response.is_closed
+
+
+def test_open_stream_without_sse_relays_json(stub_gemini):
+    app, base_url = stub_gemini()
+    client = make_client(base_url)
+
+    async def run():
+        stream = await client.open_stream(text_body("apple revenue"), model="gemini-pro", sse=False)
+        body = b"".join([chunk async for chunk in stream.aiter_bytes()])
+        await client.aclose()
+        return stream, body
+
+    stream, body = asyncio.run(run())
+    assert stream.status_code == 200
+    assert is_stub_text(gemini_client.extract_text(json.loads(body)))
+    assert app.state.requests == [("gemini-pro:generateContent", 200)]
+
+
+def test_open_stream_returns_client_errors_as_is(stub_gemini):
+    _, base_url = stub_gemini(script=(400,))
+    client = make_client(base_url)
+
+    async def run():
+        stream = await client.open_stream(text_body("apple revenue"))
+        body = b"".join([chunk async for chunk in stream.aiter_bytes()])
+        await client.aclose()
+        return stream, body
+
+    stream, body = asyncio.run(run())
+    assert stream.status_code == 400
+    assert json.loads(body)["error"]["code"] == 400
+
+
+def test_stream_text_yields_pieces(stub_gemini):
+    _, base_url = stub_gemini(chunks=3)
+    client = make_client(base_url)
+
+    async def run():
+        pieces = [piece async for piece in client.stream_text("apple revenue")]
+        await client.aclose()
+        return pieces
+
+    pieces = asyncio.run(run())
+    assert len(pieces) == 3
+    assert all(is_stub_text(piece) for piece in pieces)
+
+
+# ---- llm_engine.gemini_response ----
+def test_gemini_response_uses_shared_client(stub_gemini, monkeypatch):
+    app, base_url = stub_gemini(script=(503,))
+    client = make_client(base_url, max_retries=1)
+    monkeypatch.setattr(llm_engine, "GEMINI_API_KEY", "stub")
+    monkeypatch.setattr(gemini_client, "_client", client)
+
+    assert is_stub_text(llm_engine.gemini_response("apple revenue"))
+    assert len(app.state.requests) == 2
+    assert client.stats()["calls"] == 1
+    client.close()
+
+
+def test_gemini_response_reports_errors(stub_gemini, monkeypatch):
+    _, base_url = stub_gemini(script=(503, 503))
+    client = make_client(base_url, max_retries=1)
+    monkeypatch.setattr(llm_engine, "GEMINI_API_KEY", "stub")
+    monkeypatch.setattr(gemini_client, "_client", client)
+
+    answer = llm_engine.gemini_response("apple revenue")
+    assert answer.startswith("❌ Error generating Gemini response")
+    assert "503" in answer
+    client.close()
+
+
+def test_gemini_response_without_key(monkeypatch):
+    monkeypatch.setattr(llm_engine, "GEMINI_API_KEY", "")
+    assert "API key not configured" in llm_engine.gemini_response("apple revenue")
@@ -0,0 +1,104 @@
+"""
+FinSight Copilot - RAG Orchestrator Tests
+Retrieval paths of RAGOrchestrator against a stub retriever (no models or index)
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from finsight_app.prompts import FinSightPrompts
+from finsight_app.rag_orchestrator import RAGOptions, RAGOrchestrator
+from finsight_app.warmup import ComponentNotReady, ComponentRegistry
+
+CORPUS = [f"chunk {i} revenue services margin" for i in range(10)]
+
+
+class StubRetriever:
+    """The RetrievalSystem surface the orchestrator calls, over a fixed corpus; records every call."""
+
+    def __init__(self, lexical: bool = False):
+        self.lexical_index = object() if lexical else None
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append("embed_query")
+        return [float(len(text)), 1.0]
+
+    def embed_queries(self, texts):
+        self.calls.append("embed_queries")
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def search_ids(self, embedding, k=5, filters=None, nprobe=None, ef_search=None, filings=None):
+        self.calls.append("search_ids")
+        return self.search_ids_batch([embedding], k=k)[0]
+
+    def search_ids_batch(self, embeddings, k=5, filters=None, nprobe=None, ef_search=None, filings=None):
+        self.calls.append("search_ids_batch")
+        return [[(int(embedding[0]) + i) % len(CORPUS) for i in range(k)] for embedding in embeddings]
+
+    def lexical_ids(self, query, k=5, filters=None):
+        self.calls.append("lexical_ids")
+        return list(range(k))
+
+    def lexical_ids_batch(self, queries, k=5, filters=None):
+        self.calls.append("lexical_ids_batch")
+        return [list(range(k)) for _ in queries]
+
+    def fuse(self, rankings, k):
+        self.calls.append("fuse")
+        fused = []
+        for ids in zip(*rankings):
+            fused.extend(i for i in ids if i not in fused)
+        return fused[:k]
+
+    def documents(self, ids):
+        return [SimpleNamespace(page_content=CORPUS[i], metadata={"file": f"AAPL_10-K_chunk_{i}.txt"}) for i in ids]
+
+    def retrieve_by_vector(self, embedding, k=5, filters=None, nprobe=None, ef_search=None, filings=None):
+        self.calls.append("retrieve_by_vector")
+        return self.documents(self.search_ids_batch([embedding], k=k)[0])
+
+
+def make_orchestrator(retriever=None):
+    registry = ComponentRegistry()
+    registry.register("retriever", lambda: None)
+    if retriever is not None:
+        registry.set("retriever", retriever)
+    return RAGOrchestrator(registry, FinSightPrompts(), fallback=lambda question: "fallback")
+
+
+@pytest.mark.parametrize("lexical", [False, True])
+def test_search_retrieves_through_registry(lexical):
+    retriever = StubRetriever(lexical=lexical)
+    orchestrator = make_orchestrator(retriever)
+
+    result = asyncio.run(orchestrator.search("apple revenue", RAGOptions(k=4, top_k=2, rerank=False)))
+
+    assert len(result.chunks) == 2
+    assert [hit["source"] for hit in result.hits()][0].startswith("AAPL_10-K_chunk_")
+    assert {"embed", "search", "total"} <= set(result.timings)
+    expected = {"search_ids", "lexical_ids", "fuse"} if lexical else {"retrieve_by_vector"}
+    assert expected <= set(retriever.calls)
+
+
+@pytest.mark.parametrize("lexical", [False, True])
+def test_search_batch_retrieves_through_registry(lexical):
+    retriever = StubRetriever(lexical=lexical)
+    orchestrator = make_orchestrator(retriever)
+    questions = ["apple revenue", "services margin", "risk"]
+
+    results = asyncio.run(orchestrator.search_batch(questions, RAGOptions(k=3, top_k=2, rerank=False)))
+
+    assert len(results) == len(questions)
+    assert all(len(result.chunks) == 2 for result in results)
+    assert retriever.calls.count("embed_queries") == 1
+    assert retriever.calls.count("search_ids_batch") == 1
+    assert ("lexical_ids_batch" in retriever.calls) == lexical
+
+
+def test_retrieve_while_warming_up_raises_not_ready():
+    orchestrator = make_orchestrator()
+    with pytest.raises(ComponentNotReady):
+        asyncio.run(orchestrator.search_batch(["apple revenue"]))
@@ -0,0 +1,69 @@
+"""
+FinSight Copilot - Index Snapshot Tests
+Derived side indexes are published as new snapshots, never written into a live one
+"""
+
+import os
+
+import pytest
+
+from finsight_app.snapshots import SnapshotManager, read_manifest
+
+
+def publish_build(snapshots: SnapshotManager) -> str:
+    def write(out_dir, parent_dir):
+        with open(os.path.join(out_dir, "index.faiss"), "w") as f:
+            f.write("vectors")
+        os.makedirs(os.path.join(out_dir, "lexical"))
+        with open(os.path.join(out_dir, "lexical", "postings.npy"), "w") as f:
+            f.write("old postings")
+        return {"ntotal": 3, "next_id": 3}
+
+    return snapshots.publish(write, "build")
+
+
+def test_publish_derived_leaves_parent_untouched(tmp_path):
+    snapshots = SnapshotManager(str(tmp_path))
+    parent = publish_build(snapshots)
+    before = sorted(os.listdir(parent))
+
+    def build(out_dir, parent_dir):
+        assert parent_dir == parent
+        os.makedirs(os.path.join(out_dir, "lexical"))
+        with open(os.path.join(out_dir, "lexical", "postings.npy"), "w") as f:
+            f.write("new postings")
+
+    derived = snapshots.publish_derived(build, ["lexical"], "lexical")
+
+    assert derived != parent
+    assert snapshots.current() == os.path.basename(derived)
+    assert sorted(os.listdir(parent)) == before
+    with open(os.path.join(parent, "lexical", "postings.npy")) as f:
+        assert f.read() == "old postings"
+    with open(os.path.join(derived, "lexical", "postings.npy")) as f:
+        assert f.read() == "new postings"
+    # Unchanged files are shared, not copied
+    assert os.path.samefile(os.path.join(parent, "index.faiss"), os.path.join(derived, "index.faiss"))
+
+    manifest = read_manifest(derived)
+    assert manifest["operation"] == "lexical"
+    assert manifest["parent"] == os.path.basename(parent)
+    assert (manifest["ntotal"], manifest["next_id"]) == (3, 3)
+
+
+def test_failed_derived_build_publishes_nothing(tmp_path):
+    snapshots = SnapshotManager(str(tmp_path))
+    parent = publish_build(snapshots)
+
+    def build(out_dir, parent_dir):
+        raise RuntimeError("build failed")
+
+    with pytest.raises(RuntimeError):
+        snapshots.publish_derived(build, ["coarse"], "coarse")
+    assert snapshots.list() == [os.path.basename(parent)]
+    assert snapshots.current() == os.path.basename(parent)
+
+
+def test_publish_derived_needs_an_index(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        SnapshotManager(str(tmp_path)).publish_derived(lambda out_dir, parent_dir: None, ["coarse"], "coarse")
@@ -0,0 +1,87 @@
+"""
+FinSight Copilot - Streaming Helper Tests
+iterate_blocking drains blocking token streams on their own thread
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from finsight_app.executors import io_executor
+from finsight_app.streaming import format_sse, iterate_blocking
+
+
+def slow_tokens(count: int, delay: float = 0.01):
+    for i in range(count):
+        time.sleep(delay)
+        yield f"token{i} "
+
+
+async def collect(iterator):
+    return [item async for item in iterate_blocking(iterator)]
+
+
+def test_yields_items_in_order():
+    assert asyncio.run(collect(slow_tokens(5))) == [f"token{i} " for i in range(5)]
+
+
+def test_iterator_errors_propagate():
+    def failing():
+        yield "partial"
+        raise ValueError("stream broke")
+
+    seen = []
+
+    async def run():
+        async for item in iterate_blocking(failing()):
+            seen.append(item)
+
+    with pytest.raises(ValueError, match="stream broke"):
+        asyncio.run(run())
+    assert seen == ["partial"]
+
+
+def test_blocked_stream_holds_no_executor_worker():
+    release = threading.Event()
+
+    def waiting():
+        yield "first"
+        release.wait(5)
+        yield "second"
+
+    async def run():
+        stream = iterate_blocking(waiting())
+        assert await stream.__anext__() == "first"
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.05)
+        # The pull blocked on the model is not an I/O task, so it cannot starve or be shed
+        assert io_executor.in_flight == 0
+        release.set()
+        assert await pending == "second"
+
+    asyncio.run(run())
+
+
+def test_early_exit_closes_the_iterator():
+    closed = threading.Event()
+
+    def endless():
+        try:
+            while True:
+                time.sleep(0.005)
+                yield "token"
+        finally:
+            closed.set()
+
+    async def run():
+        async for _ in iterate_blocking(endless()):
+            break
+
+    asyncio.run(run())
+    assert closed.wait(1)
+
+
+def test_format_sse():
+    assert format_sse("token", {"text": "hi"}) == 'event: token\ndata: {"text": "hi"}\n\n'
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Pre-forked multi-worker launcher for FinSight Copilot API
+Loads every model once in the master, then forks workers that share the
+weights copy-on-write and the FAISS index through a read-only memory map
+"""
+
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+# Must be set before torch / tokenizers spin up thread pools that would not survive fork
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+import uvicorn
+
+# Add backend to Python path
+backend_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+sys.path.insert(0, backend_path)
+
+HOST = os.getenv("FINSIGHT_HOST", "127.0.0.1")
+PORT = int(os.getenv("FINSIGHT_PORT", "8000"))
+WORKERS = int(os.getenv("FINSIGHT_WORKERS", "2"))
+MEMORY_REPORT_INTERVAL = float(os.getenv("FINSIGHT_MEMORY_REPORT_INTERVAL", "60"))
+
+
+def load_master():
+    """Import the app and load every component once, before any worker exists."""
+    # No generation thread and no warm-up generation in the master: a thread
+    # holding a lock at fork time deadlocks the child, and running torch kernels
+    # here would initialise intra-op thread pools the workers cannot use.
+    batching = os.getenv("FINSIGHT_CONTINUOUS_BATCHING", "true").lower() == "true"
+    os.environ["FINSIGHT_CONTINUOUS_BATCHING"] = "false"
+    os.environ["FINSIGHT_WARMUP_TEST_GENERATION"] = "false"
+
+    import main
+    print(f"⏳ Loading components once in master (pid {os.getpid()})...")
+    main.registry.load_all()
+    if not main.registry.ready:
+        print("❌ Required components failed to load, not forking workers")
+        sys.exit(1)
+
+    # Move everything loaded so far out of the collector's generations, so GC
+    # passes in the workers do not touch (and un-share) the parent's objects
+    gc.collect()
+    gc.freeze()
+    return main, batching
+
+
+def run_worker(main, sock: socket.socket, batching: bool, threads: int):
+    """Worker body: re-create per-process state, then serve on the shared socket."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    llm = main.registry.peek("llm")
+    if llm is not None:
+        llm.after_fork(num_threads=threads)
+        if batching:
+            llm.enable_continuous_batching(max_batch_size=int(os.getenv("FINSIGHT_MAX_BATCH_SIZE", "8")))
+    else:
+        import torch
+        torch.set_num_threads(threads)
+
+    config = uvicorn.Config(main.app, log_level="info", access_log=False)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def spawn(main, sock: socket.socket, batching: bool, threads: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(main, sock, batching, threads)
+        except BaseException as e:
+            print(f"❌ Worker {os.getpid()} crashed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    print(f"👷 Worker started (pid {pid})")
+    return pid
+
+
+def report_memory(workers):
+    from finsight_app.process_memory import memory_report, format_report
+
+    labels = {os.getpid(): "master"}
+    report = memory_report([os.getpid()] + list(workers))
+    if not report:
+        return
+    print("📊 Memory per process (USS = unique, shared = mapped by several processes)")
+    print(format_report(report, labels))
+
+
+def serve():
+    """Start the master, fork the workers and supervise them"""
+    print("🚀 Starting FinSight Copilot API (pre-fork)...")
+    print(f"📁 Backend path: {backend_path}")
+
+    main, batching = load_master()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((HOST, PORT))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    threads = max(1, (os.cpu_count() or 1) // WORKERS)
+    print(f"🌐 Listening on http://{HOST}:{PORT} with {WORKERS} workers x {threads} torch threads")
+
+    workers = set()
+    stopping = False
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for _ in range(WORKERS):
+        workers.add(spawn(main, sock, batching, threads))
+
+    next_report = time.monotonic() + 10
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            workers.discard(pid)
+            if not stopping:
+                print(f"⚠️ Worker {pid} exited ({status}), respawning")
+                time.sleep(1)  # do not spin if workers crash on start
+                workers.add(spawn(main, sock, batching, threads))
+            continue
+        if MEMORY_REPORT_INTERVAL > 0 and time.monotonic() >= next_report and not stopping:
+            report_memory(workers)
+            next_report = time.monotonic() + MEMORY_REPORT_INTERVAL
+        time.sleep(0.5)
+
+    sock.close()
+    print("👋 All workers stopped")
+
+
+if __name__ == "__main__":
+    serve()